@@ -91,7 +91,7 @@ DATABASES = {
     "default": dj_database_url.config(
         default=config("DATABASE_URL"),
         conn_max_age=600,
-        ssl_require=True,
+        ssl_require=config('DATABASE_SSL_REQUIRE', default=True, cast=bool),
     )
 }
 
@@ -134,6 +134,115 @@ ELD_SETTINGS = {
     'FUEL_STOP_INTERVAL_MILES': 1000,  # Average fuel stop interval
 }
 
+# Carrier and device identity for ELD output files (49 CFR 395 Subpart B)
+ELD_OUTPUT = {
+    'CARRIER_USDOT': config('ELD_CARRIER_USDOT', default=''),
+    'CARRIER_NAME': config('ELD_CARRIER_NAME', default=''),
+    'CARRIER_TIME_ZONE': config('ELD_CARRIER_TIME_ZONE', default='UTC'),
+    'CYCLE_RULE': '70_8',
+    'ELD_REGISTRATION_ID': config('ELD_REGISTRATION_ID', default=''),
+    'ELD_IDENTIFIER': config('ELD_IDENTIFIER', default=''),
+}
+
+# Background trip jobs (manage.py run_trip_worker), backoff is exponential with jitter
+TRIP_JOBS = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE_SECONDS': 5,
+    'BACKOFF_MAX_SECONDS': 15 * 60,
+    'POLL_INTERVAL_SECONDS': 1.0,
+    'LOCK_TIMEOUT_SECONDS': 10 * 60,  # running jobs older than this are considered abandoned
+}
+
+# Batch trip creation (POST /api/trips/batch/)
+BATCH_TRIPS = {
+    'MAX_TRIPS': 500,
+    'MAX_WORKERS': 16,  # concurrent ORS calls per batch
+}
+
+# Bulk duty event ingestion (POST /api/events/bulk/)
+EVENT_INGEST = {
+    'MAX_EVENTS': 10000,
+}
+
+# OpenRouteService; point ORS_BASE_URL at `manage.py run_fake_ors` to develop without the real service.
+# Rate limits follow the ORS plan and apply per process (trips.ors).
+ORS = {
+    'BASE_URL': config('ORS_BASE_URL', default='https://api.openrouteservice.org'),
+    'API_KEY': config('ORS_API_KEY', default=''),
+    'TIMEOUT_SECONDS': config('ORS_TIMEOUT_SECONDS', default=30, cast=int),
+    'POOL_SIZE': 20,
+    'RATE_LIMITS_PER_MINUTE': {
+        'geocode': config('ORS_GEOCODE_PER_MINUTE', default=100, cast=int),
+        'directions': config('ORS_DIRECTIONS_PER_MINUTE', default=40, cast=int),
+        'matrix': config('ORS_MATRIX_PER_MINUTE', default=40, cast=int),
+    },
+    'RATE_BURST': 10,
+    'MAX_QUEUE_SECONDS': 10,  # calls that would wait longer for a token fail fast
+    'MAX_RETRIES': 3,
+    'BACKOFF_BASE_SECONDS': 0.5,
+    'BACKOFF_MAX_SECONDS': 8,
+    'BREAKER_FAILURES': 5,
+    'BREAKER_RESET_SECONDS': 30,
+}
+
+# Routing backend (trips.routing): 'ors', 'offline', 'ors_then_offline' or 'offline_then_ors'.
+# The offline backend reads a graph file built with `manage.py build_road_graph`.
+ROUTING = {
+    'BACKEND': config('ROUTING_BACKEND', default='ors'),
+    'GRAPH_PATH': config('ROAD_GRAPH_PATH', default=str(BASE_DIR / 'data/road_graph.bin')),
+}
+
+# Multi-stop trips: stop order search and the travel matrix cache (in-process LRU in front of the
+# TravelMatrixCache table)
+STOP_ORDER = {
+    'MAX_WAYPOINTS': 25,
+    'MAX_ROUNDS': 200,  # improving moves applied after the nearest-neighbour order
+}
+TRAVEL_MATRIX = {
+    'MEMORY_MAX_ENTRIES': 10000,
+    'MEMORY_TTL_SECONDS': 6 * 60 * 60,
+    'DB_TTL_DAYS': 30,
+}
+
+# Geocoding cache (in-process LRU in front of the GeocodeCache table)
+GEOCODE_CACHE = {
+    'MEMORY_MAX_ENTRIES': 2048,
+    'MEMORY_TTL_SECONDS': 6 * 60 * 60,
+    'DB_TTL_DAYS': 90,
+}
+
+# Local memory by default; set CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache and
+# CACHE_LOCATION=/path/to/dir to share the response cache between worker processes on one host
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='eld-tracker'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# Serialized trip detail, daily log and route responses, keyed by trip version
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT_SECONDS': 10 * 60,
+}
+
+# Rendered daily log sheets (SVG/PDF), keyed by a hash of their content
+LOG_GRID = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT_SECONDS': 7 * 24 * 60 * 60,
+}
+
+# Live updates over server-sent events (trips.live), served by the ASGI application
+LIVE_EVENTS = {
+    'POLL_INTERVAL_SECONDS': 0.5,
+    'HEARTBEAT_SECONDS': 15,
+    'RETRY_MILLISECONDS': 3000,
+    'QUEUE_SIZE': 100,
+    'GAP_TIMEOUT_SECONDS': 10,
+    'RETENTION_SECONDS': 60 * 60,
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Driver, Trip, DailyLog, DutyEvents, Stop
+from .models import Driver, Trip, DailyLog, DutyEvents, Stop, GeocodeCache, TripJob
 
 # admin.py
 
@@ -23,8 +23,8 @@ class StopInline(admin.TabularInline):
 
 @admin.register(Trip)
 class TripAdmin(admin.ModelAdmin):
-    list_display = ['id', 'driver', 'current_location', 'pickup_location', 'dropoff_location', 'current_cycle_used', 'created_at']
-    list_filter = ['created_at', 'driver']
+    list_display = ['id', 'driver', 'current_location', 'pickup_location', 'dropoff_location', 'current_cycle_used', 'status', 'created_at']
+    list_filter = ['status', 'created_at', 'driver']
     search_fields = ['driver__user__username', 'pickup_location', 'dropoff_location']
     readonly_fields = ['id', 'created_at', 'updated_at']
     inlines = [StopInline, DailyLogInline]
@@ -88,6 +88,18 @@ class StopAdmin(admin.ModelAdmin):
     list_filter = ['stop_type', 'arrival_time']
     search_fields = ['trip__driver__user__username', 'location']
 
+@admin.register(TripJob)
+class TripJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'trip', 'kind', 'status', 'attempts', 'progress', 'run_after', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at', 'updated_at', 'finished_at', 'locked_at', 'locked_by']
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    list_display = ['normalized_query', 'label', 'latitude', 'longitude', 'updated_at']
+    search_fields = ['normalized_query', 'query', 'label']
+    readonly_fields = ['created_at', 'updated_at']
+
 admin.site.site_header = 'ELD Tracker Administration'
 admin.site.site_title = 'ELD Tracker'
 admin.site.index_title = 'Electronic Logging Device Management'
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Bulk trip creation for dispatch: dedupe addresses, geocode/route concurrently, persist in bulk."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+from .geocoding import geocoding_cache, normalize_address
+from .models import DailyLog, Driver, DutyEvents, Stop, Trip
+from .serializers import BatchTripSerializer
+from .routing import get_routing_client
+from .services import BULK_BATCH_SIZE, apply_route, build_trip_plan, route_stops, stop_order, trip_stops
+from .summaries import apply_log_deltas
+
+logger = logging.getLogger('eld_tracker')
+
+
+def _error(exc):
+    return f"{type(exc).__name__}: {exc}"
+
+
+def _address_key(text):
+    """Dedup key of an address: its cache key, or the text itself when it has none (never cached)."""
+    return normalize_address(text) or (text,)
+
+
+def _run_concurrently(func, items, max_workers):
+    """Maps func over items on a bounded thread pool. Returns {item: (result, error)}.
+
+    Only network calls run in the pool; all database access stays on the calling thread.
+    """
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, _error(e)
+
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return {item: (result, error) for item, result, error in pool.map(call, items)}
+
+
+def create_trips_in_bulk(items, client=None):
+    """Validates, routes and saves many trips. Returns per-item outcomes in input order.
+
+    Identical addresses are geocoded once and identical lanes are routed once, so wall time is
+    roughly the slowest geocode plus the slowest route, not the sum over the batch.
+    """
+    client = client or get_routing_client()
+    max_workers = settings.BATCH_TRIPS['MAX_WORKERS']
+    outcomes = [None] * len(items)
+
+    # 1. Validate every item, then resolve drivers in one query
+    valid = []  # (index, validated data)
+    for index, item in enumerate(items):
+        serializer = BatchTripSerializer(data=item)
+        if not serializer.is_valid():
+            outcomes[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+            continue
+        valid.append((index, dict(serializer.validated_data)))
+
+    default_driver = Driver.objects.first()
+    drivers = Driver.objects.in_bulk({data['driver_id'] for _, data in valid if 'driver_id' in data})
+
+    pending = []  # (index, trip)
+    for index, data in valid:
+        driver_id = data.pop('driver_id', None)
+        driver = drivers.get(driver_id) if driver_id else default_driver
+        if driver is None:
+            outcomes[index] = {'index': index, 'status': 'error', 'errors': {'driver_id': ['Unknown driver.']}}
+            continue
+        pending.append((index, Trip(driver=driver, status='ready', **data)))
+
+    # 2. Geocode each distinct address once: cache first, then ORS concurrently for the misses
+    texts = {}
+    for _, trip in pending:
+        for stop in trip_stops(trip):
+            texts.setdefault(_address_key(stop['location']), stop['location'])
+    coords = geocoding_cache.lookup_many([key for key in texts if isinstance(key, str)])
+
+    misses = [key for key in texts if key not in coords]
+    fetched = _run_concurrently(lambda key: geocoding_cache.fetch(client, texts[key]), misses, max_workers)
+    geocode_errors = {}
+    fresh = []
+    for key, (result, error) in fetched.items():
+        if result is None:
+            geocode_errors[key] = error or f"Could not geocode address: {texts[key]}"
+            continue
+        coords[key] = result[0]
+        if isinstance(key, str):
+            fresh.append((key, texts[key], result[0], result[1]))
+    if fresh:
+        geocoding_cache.store_many(fresh)
+
+    # 3. Route each distinct lane (the same stops at the same points, in the same order) once, concurrently
+    lanes = {}
+    routable = []
+    for index, trip in pending:
+        stops = trip_stops(trip)
+        keys = [_address_key(stop['location']) for stop in stops]
+        failed = [geocode_errors.get(key, f"Could not geocode address: {texts[key]}")
+                  for key in dict.fromkeys(keys) if key not in coords]
+        if failed:
+            outcomes[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': failed}}
+            continue
+        lane = (tuple((tuple(coords[key]), stop['type'], stop.get('load') or '') for key, stop in zip(keys, stops)),
+                trip.optimize_stop_order)
+        lanes.setdefault(lane, trip)
+        routable.append((index, trip, lane))
+
+    # Optimized stop orders come from the travel matrix, which uses its cache table, so they are worked
+    # out here; cached lanes cost no calls
+    orders, order_errors = {}, {}
+    for lane, trip in lanes.items():
+        try:
+            orders[lane] = stop_order(client, trip, trip_stops(trip), [list(point) for point, _, _ in lane[0]])
+        except Exception as e:
+            order_errors[lane] = _error(e)
+
+    def route_lane(lane):
+        trip = lanes[lane]
+        return route_stops(client, trip, trip_stops(trip), [list(point) for point, _, _ in lane[0]], orders[lane])
+
+    routes = _run_concurrently(route_lane, list(orders), max_workers)
+    routes.update({lane: (None, error) for lane, error in order_errors.items()})
+
+    # 4. Plan in memory, then persist everything in one transaction
+    trips, stops, logs, events = [], [], [], []
+    for index, trip, lane in routable:
+        route_data, error = routes[lane]
+        if error:
+            outcomes[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [error]}}
+            continue
+        # Trips sharing a lane may spell their addresses differently; keep each trip's own
+        own_stops = trip_stops(trip)
+        route_data = {**route_data, 'waypoints': [own_stops[i] for i in route_data['order']]}
+        apply_route(trip, route_data)
+        plan = build_trip_plan(trip, route_data)
+        trips.append(trip)
+        stops += plan.stops
+        logs += plan.daily_logs
+        events += plan.duty_events
+        outcomes[index] = {'index': index, 'status': 'created', 'trip_id': str(trip.id),
+                           'distance_miles': route_data['distance_miles'],
+                           'duration_hours': route_data['duration_hours']}
+
+    with transaction.atomic():
+        Trip.objects.bulk_create(trips, batch_size=BULK_BATCH_SIZE)
+        Stop.objects.bulk_create(stops, batch_size=BULK_BATCH_SIZE)
+        DailyLog.objects.bulk_create(logs, batch_size=BULK_BATCH_SIZE)
+        DutyEvents.objects.bulk_create(events, batch_size=BULK_BATCH_SIZE)
+        apply_log_deltas(logs)
+
+    logger.info("Batch trip creation: %s created, %s failed, %s addresses geocoded, %s lanes routed",
+                len(trips), len(items) - len(trips), len(misses), len(lanes))
+    return outcomes
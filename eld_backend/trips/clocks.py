@@ -0,0 +1,166 @@
+"""Per-driver HOS clocks (trips.hos_clock) persisted in DriverClock and kept current from duty events.
+
+A recorded event advances its driver's clock in O(1): lock the row, consume the interval, save.
+Anything that rewrites history behind the clock (an edit, a delete, an event older than the clock)
+only marks it stale, and the next read rebuilds it by replaying the driver's recent events. Events
+that start in the future are trip plans, not records, and are never consumed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .hos_calculator import HOSRules
+from .hos_clock import CYCLE_DAYS_KEPT, ClockState, clocks, consume
+from .live import driver_channel, publish_many
+from .models import DailyLog, Driver, DriverClock, DutyEvents
+from .summaries import cycle_rule
+
+# Replaying this much history rebuilds the cycle buckets and, for any driver who took a 10-hour
+# rest in the last couple of days, the shift clocks exactly
+REBUILD_LOOKBACK = timedelta(days=CYCLE_DAYS_KEPT + 2)
+
+# ClockState attribute -> DriverClock field
+STATE_FIELDS = {
+    'as_of': 'as_of',
+    'status': 'status',
+    'status_since': 'status_since',
+    'status_until': 'status_until',
+    'window_start': 'window_start',
+    'shift_driving': 'shift_driving_hours',
+    'since_break': 'since_break_hours',
+    'non_driving': 'non_driving_hours',
+    'off_duty': 'off_duty_hours',
+    'cycle_days': 'cycle_days',
+    'last_restart_at': 'last_restart_at',
+}
+
+
+def clock_rules(rule='70_8'):
+    return HOSRules.from_settings(settings.ELD_SETTINGS, rule)
+
+
+def clock_zone():
+    return ZoneInfo(settings.ELD_OUTPUT['CARRIER_TIME_ZONE'])
+
+
+def load_state(clock):
+    return ClockState(**{attr: getattr(clock, name) for attr, name in STATE_FIELDS.items()})
+
+
+def store_state(clock, state):
+    for attr, name in STATE_FIELDS.items():
+        setattr(clock, name, getattr(state, attr))
+    clock.stale = False
+    return clock
+
+
+def clock_data(state, remaining, now):
+    """Current status and remaining hours, as served by the clock endpoint and the live stream."""
+    status, since = state.status, state.status_since or state.as_of
+    if state.status_until is not None and state.status_until <= now:
+        status, since = '', state.status_until  # the open status ran out at its recorded end
+    return {
+        'status': status or 'off_duty',
+        'status_since': since,
+        **{name: round(value, 2) if isinstance(value, float) else value for name, value in remaining.items()},
+    }
+
+
+def _consume_recorded(state, status, start, end, now, rules, zone):
+    # An event still running at `now` stays open, and closes at its recorded end unless a later event
+    # comes first
+    if end is not None and end > now:
+        consume(state, status, start, None, rules, zone, until=end)
+    else:
+        consume(state, status, start, end, rules, zone)
+
+
+def rebuild_clocks(driver_ids=None, now=None):
+    """Rebuilds clocks from the last REBUILD_LOOKBACK of events, streamed in one ordered query.
+
+    Every driver in scope gets a clock, rested if it has no recent events. Returns the count.
+    """
+    now = now or timezone.now()
+    rules, zone = clock_rules(), clock_zone()
+    drivers = Driver.objects.all() if driver_ids is None else Driver.objects.filter(pk__in=driver_ids)
+    driver_ids = list(drivers.values_list('pk', flat=True))
+
+    rows = (
+        DutyEvents.objects.filter(daily_log__driver__in=driver_ids, start_time__gte=now - REBUILD_LOOKBACK,
+                                  start_time__lte=now)
+        .order_by('daily_log__driver_id', 'start_time', 'id')
+        .values_list('daily_log__driver_id', 'duty_event_status', 'start_time', 'end_time')
+        .iterator(chunk_size=2000)
+    )
+    states = defaultdict(ClockState)
+    for driver_id, status, start, end in rows:
+        _consume_recorded(states[driver_id], status, start, end, now, rules, zone)
+
+    rebuilt = [store_state(DriverClock(driver_id=driver_id), states[driver_id]) for driver_id in driver_ids]
+    with transaction.atomic():
+        DriverClock.objects.filter(driver__in=driver_ids).delete()
+        DriverClock.objects.bulk_create(rebuilt, batch_size=1000)
+    return len(rebuilt)
+
+
+def advance_clocks(events, now=None):
+    """Consumes newly recorded events into their drivers' clocks (one locked read and write per batch).
+
+    Drivers without a clock are skipped: their clock is built from history on first read. Every
+    clock that moved is published to its driver's live channel.
+    """
+    now = now or timezone.now()
+    events = [event for event in events if event.start_time <= now]
+    if not events:
+        return
+    rules, zone = clock_rules(), clock_zone()
+    drivers = dict(DailyLog.objects.filter(pk__in={event.daily_log_id for event in events})
+                   .values_list('pk', 'driver_id'))
+    by_driver = defaultdict(list)
+    for event in events:
+        by_driver[drivers[event.daily_log_id]].append(event)
+
+    with transaction.atomic():
+        changed, published = [], []
+        for clock in DriverClock.objects.select_for_update().filter(driver__in=by_driver, stale=False).order_by('pk'):
+            state = load_state(clock)
+            for event in sorted(by_driver[clock.driver_id], key=lambda event: event.start_time):
+                if state.as_of is not None and event.start_time < state.as_of:
+                    clock.stale = True  # arrived late, replay on next read
+                    break
+                _consume_recorded(state, event.duty_event_status, event.start_time, event.end_time, now, rules, zone)
+            else:
+                store_state(clock, state)
+                published.append((driver_channel(clock.driver_id), 'clock',
+                                  {'driver_id': clock.driver_id, **clock_data(state, clocks(state, now, rules, zone), now)}))
+            clock.updated_at = now  # bulk_update does not apply auto_now
+            changed.append(clock)
+        DriverClock.objects.bulk_update(changed, [*STATE_FIELDS.values(), 'stale', 'updated_at'])
+        publish_many(published)
+
+
+def mark_clocks_stale(driver_ids=(), log_ids=()):
+    """Flags clocks whose history changed, for the drivers given directly or through their daily logs."""
+    driver_ids = {pk for pk in driver_ids if pk}
+    log_ids = {pk for pk in log_ids if pk}
+    if log_ids:
+        driver_ids.update(DailyLog.objects.filter(pk__in=log_ids).values_list('driver_id', flat=True))
+    if driver_ids:
+        DriverClock.objects.filter(driver__in=driver_ids, stale=False).update(stale=True)
+
+
+def driver_clock(driver_id, rule='70_8', now=None):
+    """Remaining hours on every HOS clock of a driver at `now`, rebuilding a missing or stale clock first."""
+    now = now or timezone.now()
+    days, _ = cycle_rule(rule)
+    clock = DriverClock.objects.filter(driver_id=driver_id).first()
+    if clock is None or clock.stale:
+        rebuild_clocks([driver_id], now)
+        clock = DriverClock.objects.get(driver_id=driver_id)
+
+    state = load_state(clock)
+    return state, clocks(state, now, clock_rules(rule), clock_zone(), days)
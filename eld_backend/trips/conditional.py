@@ -0,0 +1,114 @@
+"""Conditional GET support: validators for trip resources and keeping them current.
+
+Every write to a trip's stops, daily logs or duty events moves Trip.changed_at forward (signals for
+ORM and admin writes, touch_trips() on bulk paths), so the trip's changed_at validates the trip and
+everything nested under it. Trip.updated_at is left alone: the trip list is ordered and
+cursor-paginated on it, and child writes such as device ingestion must not reorder the list. Views wrap their GET handler with revalidate(), which answers 304 from a
+single validator query, before any serialization happens.
+"""
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .models import Trip
+
+_local = threading.local()
+
+
+def touch_trips(trip_ids=(), log_ids=()):
+    """Moves changed_at forward on the given trips and on the trips owning the given daily logs."""
+    trip_ids = {pk for pk in trip_ids if pk}
+    log_ids = {pk for pk in log_ids if pk}
+    if not trip_ids and not log_ids:
+        return
+
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending[0].update(trip_ids)
+        pending[1].update(log_ids)
+        return
+
+    condition = Q(pk__in=trip_ids) if trip_ids else Q()
+    if log_ids:
+        condition |= Q(pk__in=Trip.objects.filter(daily_logs__in=log_ids).values('pk'))
+    Trip.objects.filter(condition).update(changed_at=timezone.now())
+
+
+@contextmanager
+def deferred_trip_touches():
+    """Collects the touches made inside the block and applies them with a single UPDATE on exit."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+
+    _local.pending = pending = (set(), set())
+    try:
+        yield
+    finally:
+        _local.pending = None
+    touch_trips(*pending)
+
+
+def revalidate(etag_func, last_modified_func):
+    """condition() plus Cache-Control: no-cache, so browsers revalidate instead of guessing freshness."""
+    def decorator(view):
+        view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        return cache_control(no_cache=True)(view)
+    return decorator
+
+
+def _cached(request, key, compute):
+    # condition() calls the etag and last-modified functions separately; query once per request
+    cache = request.__dict__.setdefault('_validators', {})
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _etag(request, *parts):
+    renderer = getattr(request, 'accepted_media_type', '')
+    raw = '|'.join(str(part) for part in (*parts, request.get_full_path(), renderer))
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def trip_last_modified(request, pk=None, trip_id=None, **kwargs):
+    """changed_at of a single trip (detail, logs and route endpoints)."""
+    trip_id = pk or trip_id
+    return _cached(request, ('trip', trip_id), lambda: (
+        Trip.objects.filter(pk=trip_id).values_list('changed_at', flat=True).first()))
+
+
+def trip_etag(request, pk=None, trip_id=None, **kwargs):
+    changed_at = trip_last_modified(request, pk=pk, trip_id=trip_id)
+    return _etag(request, pk or trip_id, changed_at.isoformat()) if changed_at else None
+
+
+def log_trip_last_modified(request, daily_log_id=None, **kwargs):
+    """changed_at of the trip owning a daily log (duty event listing)."""
+    return _cached(request, ('log', daily_log_id), lambda: (
+        Trip.objects.filter(daily_logs=daily_log_id).values_list('changed_at', flat=True).first()))
+
+
+def log_trip_etag(request, daily_log_id=None, **kwargs):
+    changed_at = log_trip_last_modified(request, daily_log_id=daily_log_id)
+    return _etag(request, daily_log_id, changed_at.isoformat()) if changed_at else None
+
+
+def trip_list_state(request):
+    # The row count catches deletes, which do not move any remaining trip's changed_at
+    return _cached(request, 'trip_list', lambda: Trip.objects.aggregate(latest=Max('changed_at'), count=Count('pk')))
+
+
+def trip_list_last_modified(request, **kwargs):
+    return trip_list_state(request)['latest']
+
+
+def trip_list_etag(request, **kwargs):
+    state = trip_list_state(request)
+    latest = state['latest'].isoformat() if state['latest'] else ''
+    return _etag(request, 'trips', latest, state['count'])
@@ -0,0 +1,237 @@
+"""ELD output file (49 CFR 395 Subpart B, Appendix section 4.8.2) for roadside data transfer.
+
+A file covers one driver over a date window. It is built from a single query for the window's duty
+events (joined to their daily logs) plus one lookup of the driver, and written line by line.
+Fleet-wide pulls write one file per driver and can fan out across processes (write_fleet_files).
+
+Check values follow section 4.4.5: characters map to ASCII - 48 for 0-9, A-Z and a-z and to 0
+otherwise; line and event checks take the low 8 bits of the mapped sum, rotate them left by 3 and
+XOR 0xC3; the file check sums the line checks, keeps 16 bits, rotates left by 3 and XORs 0x969C.
+"""
+import os
+from datetime import datetime, time as dt_time, timedelta
+from multiprocessing import Pool
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Driver, DutyEvents
+
+LINE_END = '\r\n'
+
+# Event type 1 (change in duty status) codes
+DUTY_STATUS_CODES = {
+    'off_duty': 1,
+    'sleeper_berth': 2,
+    'driving': 3,
+    'on_duty': 4,
+}
+
+SECTIONS = [
+    'ELD File Header Segment:',
+    'User List:',
+    'CMV List:',
+    'ELD Event List:',
+    "ELD Event Annotations or Comments:",
+    "Driver's Certification/Recertification Actions:",
+    'Malfunctions and Data Diagnostic Events:',
+    'ELD Login/Logout Report:',
+    'CMV Engine Power-Up and Shut Down Activity:',
+    'Unidentified Driver Profile Records:',
+    'End of File:',
+]
+
+
+def _mapped_sum(text):
+    total = 0
+    for char in text:
+        if '0' <= char <= '9' or 'A' <= char <= 'Z' or 'a' <= char <= 'z':
+            total += ord(char) - 48
+    return total
+
+
+def _rotate_left(value, bits, width):
+    mask = (1 << width) - 1
+    return ((value << bits) | (value >> (width - bits))) & mask
+
+
+def check_value(text):
+    """8-bit data check value of a string (line and event checks), as an int."""
+    return _rotate_left(_mapped_sum(text) & 0xFF, 3, 8) ^ 0xC3
+
+
+def file_check_value(line_checks):
+    """16-bit file data check value from the line check values of every line, as an int."""
+    return _rotate_left(sum(line_checks) & 0xFFFF, 3, 16) ^ 0x969C
+
+
+def _clean(value):
+    # Fields are comma separated and line based; neither may appear inside a field
+    return str(value if value is not None else '').replace(',', ' ').replace('\r', ' ').replace('\n', ' ')
+
+
+class ELDOutputFile:
+    """Builds the lines of one driver's ELD output file; iterate write_lines() to stream them."""
+
+    def __init__(self, driver, events, comment=''):
+        self.driver = driver
+        self.events = events
+        self.comment = comment
+        self.config = settings.ELD_OUTPUT
+        self.zone = ZoneInfo(self.config['CARRIER_TIME_ZONE'])
+        self.line_checks = []
+
+    @property
+    def username(self):
+        return self.driver.user.username
+
+    def line(self, *fields):
+        text = ','.join(_clean(field) for field in fields)
+        check = check_value(text)
+        self.line_checks.append(check)
+        return f'{text},{check:02X}{LINE_END}'
+
+    def local(self, moment):
+        moment = moment.astimezone(self.zone)
+        return moment.strftime('%m%d%y'), moment.strftime('%H%M%S')
+
+    def utc_offset(self):
+        offset = datetime.now(self.zone).utcoffset() or timedelta()
+        return f'{int(abs(offset.total_seconds()) // 3600):02d}'
+
+    def vehicles(self):
+        """CMV order numbers by vehicle number, in order of first use."""
+        order = {}
+        for event in self.events:
+            order.setdefault(event.daily_log.vehicle_number, len(order) + 1)
+        return order
+
+    def event_rows(self, vehicles):
+        """Event list fields per duty event, with miles and engine hours accumulated per daily log."""
+        rows = []
+        log_id = None
+        miles = engine_hours = 0.0
+        for sequence, event in enumerate(self.events, start=1):
+            log = event.daily_log
+            if log.pk != log_id:
+                log_id, miles, engine_hours = log.pk, 0.0, 0.0
+            hours = ((event.end_time - event.start_time).total_seconds() / 3600) if event.end_time else 0.0
+            if event.duty_event_status == 'driving' and log.total_driving_time:
+                # Only daily mileage is recorded; spread it over the day's driving time
+                miles += log.total_driving_miles * hours / log.total_driving_time
+            if event.duty_event_status in ('driving', 'on_duty'):
+                engine_hours += hours
+
+            event_date, event_time = self.local(event.start_time)
+            code = DUTY_STATUS_CODES[event.duty_event_status]
+            cmv = vehicles[log.vehicle_number]
+            miles_text, hours_text = str(int(miles)), f'{engine_hours:.1f}'
+            latitude = longitude = ''  # positions are not recorded per event
+            event_check = check_value(''.join(
+                map(str, (1, code, event_date, event_time, miles_text, hours_text, latitude, longitude, cmv,
+                          self.username))))
+            rows.append((
+                f'{sequence & 0xFFFF:X}', 1, 1 if code == 3 else 2, 1, code, event_date, event_time, miles_text,
+                hours_text, latitude, longitude, 0, cmv, 1, 0, 0, f'{event_check:02X}',
+            ))
+        return rows
+
+    def write_lines(self):
+        self.line_checks = []
+        config = self.config
+        user = self.driver.user
+        vehicles = self.vehicles()
+        last_log = self.events[-1].daily_log if self.events else None
+        now_date, now_time = self.local(datetime.now(self.zone))
+        multiday = 7 if config['CYCLE_RULE'] == '60_7' else 8
+
+        yield SECTIONS[0] + LINE_END
+        yield self.line(user.last_name, user.first_name, user.username, '', '')
+        yield self.line('', '', '')  # no co-driver
+        yield self.line(last_log.vehicle_number if last_log else '', '', last_log.trailer_number if last_log else '')
+        yield self.line(config['CARRIER_USDOT'], config['CARRIER_NAME'], multiday, '000000', self.utc_offset())
+        yield self.line(last_log.load_number if last_log and last_log.load_number else '', 0)
+        yield self.line(now_date, now_time, '', '', '', '')
+        yield self.line(config['ELD_REGISTRATION_ID'], config['ELD_IDENTIFIER'], '', self.comment)
+
+        yield SECTIONS[1] + LINE_END
+        yield self.line(1, 'D', user.last_name, user.first_name)
+
+        yield SECTIONS[2] + LINE_END
+        for vehicle, order in vehicles.items():
+            yield self.line(order, vehicle, '')
+
+        yield SECTIONS[3] + LINE_END
+        for row in self.event_rows(vehicles):
+            yield self.line(*row)
+
+        yield SECTIONS[4] + LINE_END
+        for sequence, event in enumerate(self.events, start=1):
+            if event.remarks:
+                event_date, event_time = self.local(event.start_time)
+                yield self.line(f'{sequence & 0xFFFF:X}', self.username, event.remarks[:60], event_date,
+                                event_time, event.location)
+
+        for header in SECTIONS[5:-1]:
+            yield header + LINE_END
+
+        yield SECTIONS[-1] + LINE_END
+        yield f'{file_check_value(self.line_checks):04X}{LINE_END}'
+
+    def filename(self):
+        """Standard file name: last name (5), license digits (4), creation date DDMMYY, comment (<=16)."""
+        last_name = ''.join(c for c in self.driver.user.last_name if c.isalnum())[:5].ljust(5, '_')
+        comment = ''.join(c for c in self.comment if c.isalnum())[:16]
+        return f"{last_name}0000{datetime.now(self.zone).strftime('%d%m%y')}-{comment}.csv"
+
+
+def default_window(zone):
+    """The roadside inspection period: today and the previous 7 days."""
+    today = datetime.now(zone).date()
+    return today - timedelta(days=7), today
+
+
+def driver_events(driver, start, end, zone):
+    """Duty events of a driver between two dates (carrier time zone, inclusive), in one query."""
+    window_start = datetime.combine(start, dt_time.min, zone)
+    window_end = datetime.combine(end + timedelta(days=1), dt_time.min, zone)
+    return list(
+        DutyEvents.objects.filter(daily_log__driver=driver, start_time__gte=window_start,
+                                  start_time__lt=window_end)
+        .select_related('daily_log')
+        .order_by('start_time', 'id')
+    )
+
+
+def build_output_file(driver, start, end, comment=''):
+    zone = ZoneInfo(settings.ELD_OUTPUT['CARRIER_TIME_ZONE'])
+    return ELDOutputFile(driver, driver_events(driver, start, end, zone), comment)
+
+
+def write_driver_file(driver_id, start, end, directory, comment=''):
+    """Writes one driver's output file into directory. Returns (driver_id, path, event count)."""
+    driver = Driver.objects.select_related('user').get(pk=driver_id)
+    output = build_output_file(driver, start, end, comment)
+    path = os.path.join(directory, f'{driver_id}-{output.filename()}')
+    with open(path, 'w', newline='', encoding='ascii', errors='replace') as handle:
+        handle.writelines(output.write_lines())
+    return driver_id, path, len(output.events)
+
+
+def _write_driver_file_task(args):
+    return write_driver_file(*args)
+
+
+def write_fleet_files(driver_ids, start, end, directory, comment='', processes=1):
+    """Writes one output file per driver, across `processes` worker processes. Yields per-driver results."""
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(driver_id, start, end, directory, comment) for driver_id in driver_ids]
+    if processes <= 1:
+        yield from map(_write_driver_file_task, tasks)
+        return
+
+    # Workers are forked: close our connections first so each worker opens its own
+    connections.close_all()
+    with Pool(processes) as pool:
+        yield from pool.imap_unordered(_write_driver_file_task, tasks, chunksize=4)
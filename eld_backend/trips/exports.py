@@ -0,0 +1,124 @@
+"""Streaming export of records of duty status (daily logs and their duty events).
+
+Rows come from one ordered query over DailyLog LEFT JOIN DutyEvents, read with iterator(), which
+uses a server-side cursor on PostgreSQL and chunked fetchmany() elsewhere. Writers are generators
+that emit a few hundred rows per chunk, so the first bytes leave before the query is exhausted and
+memory stays flat however many rows are exported.
+"""
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import DailyLog, driver_name_expression
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000   # rows per database round trip
+ROWS_PER_WRITE = 500
+
+LOG_FIELDS = [
+    'driver_id', 'driver_number', 'driver_name', 'log_id', 'trip_id', 'date',
+    'total_off_duty_time', 'total_sleeper_berth_time', 'total_driving_time', 'total_on_duty_time',
+    'total_driving_miles', 'vehicle_number', 'trailer_number', 'shipper_name', 'shipper_commodity', 'load_number',
+]
+EVENT_FIELDS = ['event_status', 'start_time', 'end_time', 'truck_moved', 'location', 'remarks']
+
+
+def export_rows(driver_ids=None, home_operation_center=None, start=None, end=None):
+    """One dict per duty event (or per log without events), ordered by driver, date and event time."""
+    logs = DailyLog.objects.all()
+    if driver_ids:
+        logs = logs.filter(driver_id__in=driver_ids)
+    if home_operation_center:
+        logs = logs.filter(driver__home_operation_center=home_operation_center)
+    if start:
+        logs = logs.filter(date__gte=start)
+    if end:
+        logs = logs.filter(date__lte=end)
+
+    return (
+        logs.values(
+            'driver_id', 'trip_id', 'date', 'total_off_duty_time', 'total_sleeper_berth_time',
+            'total_driving_time', 'total_on_duty_time', 'total_driving_miles', 'vehicle_number',
+            'trailer_number', 'shipper_name', 'shipper_commodity', 'load_number',
+            driver_number=F('driver__driver_number'),
+            driver_name=driver_name_expression(),
+            log_id=F('id'),
+            event_status=F('dutyevents__duty_event_status'),
+            start_time=F('dutyevents__start_time'),
+            end_time=F('dutyevents__end_time'),
+            truck_moved=F('dutyevents__truck_moved'),
+            location=F('dutyevents__location'),
+            remarks=F('dutyevents__remarks'),
+        )
+        .order_by('driver_id', 'date', 'id', 'dutyevents__start_time')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def _buffered(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer.clear()
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_chunks(rows):
+    """Flat CSV, one line per duty event with its log's columns repeated."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def drain():
+        text = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return text
+
+    writer.writerow(LOG_FIELDS + EVENT_FIELDS)
+    yield drain()  # sent before the query runs
+
+    columns = LOG_FIELDS + EVENT_FIELDS
+    batch = []
+    for row in rows:
+        batch.append([row[name] for name in columns])
+        if len(batch) >= ROWS_PER_WRITE:
+            writer.writerows(batch)
+            batch.clear()
+            yield drain()
+    if batch:
+        writer.writerows(batch)
+        yield drain()
+
+
+def ndjson_chunks(rows):
+    """One JSON object per daily log, with its duty events nested in order."""
+    def lines():
+        current = None
+        for row in rows:
+            if current is None or current['log_id'] != row['log_id']:
+                if current is not None:
+                    yield json.dumps(current, cls=DjangoJSONEncoder) + '\n'
+                current = {name: row[name] for name in LOG_FIELDS}
+                current['events'] = []
+            if row['event_status'] is not None:
+                current['events'].append({name: row[name] for name in EVENT_FIELDS})
+        if current is not None:
+            yield json.dumps(current, cls=DjangoJSONEncoder) + '\n'
+
+    return _buffered(lines())
+
+
+def export_chunks(output, rows):
+    """Encoded text chunks for an export format ('csv' or 'ndjson')."""
+    writer = csv_chunks if output == 'csv' else ndjson_chunks
+    return (chunk.encode() for chunk in writer(rows) if chunk)
@@ -0,0 +1,121 @@
+"""Local stand-in for the OpenRouteService endpoints the app uses, with injectable latency.
+
+Serves /geocode/search, /v2/directions/<profile>/geojson and /v2/matrix/<profile> from a threaded
+HTTP server. Answers are deterministic: an address always geocodes to the same point in the
+continental US, and a route is a straight line at highway speed. Point ORS['BASE_URL']
+(ORS_BASE_URL) at it for local development, or use it from benchmarks to measure how latency and
+concurrency interact.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+METERS_PER_DEGREE = 111_320
+ROAD_FACTOR = 1.25          # road distance over great-circle distance
+SPEED_METERS_PER_SECOND = 26.8  # 60 mph
+ROUTE_POINTS = 200
+
+
+def fake_coordinates(text):
+    seed = int.from_bytes(hashlib.sha256(text.strip().lower().encode()).digest()[:8], 'big')
+    rng = random.Random(seed)
+    return [round(rng.uniform(-122, -72), 6), round(rng.uniform(30, 47), 6)]
+
+
+def fake_distance(start, end):
+    dx = (end[0] - start[0]) * math.cos(math.radians((start[1] + end[1]) / 2))
+    return math.hypot(dx, end[1] - start[1]) * METERS_PER_DEGREE * ROAD_FACTOR
+
+
+def fake_route(coordinates):
+    points, segments = [coordinates[0]], []
+    for start, end in zip(coordinates, coordinates[1:]):
+        distance = fake_distance(start, end)
+        segments.append({'distance': distance, 'duration': distance / SPEED_METERS_PER_SECOND})
+        points += [[start[0] + (end[0] - start[0]) * i / ROUTE_POINTS, start[1] + (end[1] - start[1]) * i / ROUTE_POINTS]
+                   for i in range(1, ROUTE_POINTS + 1)]
+    distance = sum(segment['distance'] for segment in segments)
+    return {'type': 'FeatureCollection', 'features': [{
+        'type': 'Feature',
+        'properties': {'summary': {'distance': distance, 'duration': distance / SPEED_METERS_PER_SECOND},
+                       'segments': segments},
+        'geometry': {'type': 'LineString', 'coordinates': points},
+    }]}
+
+
+def fake_matrix(locations, sources=None, destinations=None):
+    sources = range(len(locations)) if sources is None else sources
+    destinations = range(len(locations)) if destinations is None else destinations
+    distances = [[fake_distance(locations[i], locations[j]) for j in destinations] for i in sources]
+    return {'distances': distances,
+            'durations': [[distance / SPEED_METERS_PER_SECOND for distance in row] for row in distances]}
+
+
+class FakeORSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real service
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def delay(self):
+        latency, jitter = self.server.latency, self.server.jitter
+        time.sleep(max(latency + random.uniform(-jitter, jitter), 0))
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.delay()
+        if url.path != '/geocode/search':
+            return self.reply(404, {'error': 'Not found'})
+        text = parse_qs(url.query).get('text', [''])[0]
+        if not text.strip():
+            return self.reply(400, {'error': 'text is required'})
+        self.reply(200, {'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': fake_coordinates(text)},
+            'properties': {'label': text.strip()},
+        }]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        self.delay()
+        if self.path.startswith('/v2/matrix/'):
+            locations = body.get('locations') or []
+            if len(locations) < 2:
+                return self.reply(400, {'error': 'At least two locations are required'})
+            return self.reply(200, fake_matrix(locations, body.get('sources'), body.get('destinations')))
+        if not self.path.startswith('/v2/directions/'):
+            return self.reply(404, {'error': 'Not found'})
+        coordinates = body.get('coordinates') or []
+        if len(coordinates) < 2:
+            return self.reply(400, {'error': 'At least two coordinates are required'})
+        self.reply(200, fake_route(coordinates))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, jitter=0.0):
+    """A fake ORS server (port 0 picks a free one); call serve_forever() or start_in_thread()."""
+    server = ThreadingHTTPServer((host, port), FakeORSHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    return server
+
+
+def start_in_thread(server):
+    """Serves in a daemon thread and returns the base URL; stop with server.shutdown()."""
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}'
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import GeocodeCache
+
+logger = logging.getLogger('eld_tracker')
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_address(text):
+    """Normalizes a free-text address into a stable cache key ("Montréal, QC " -> "montréal qc").
+
+    Letters and digits of any script are kept; the key is empty only when there are none.
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return _NON_WORD.sub(' ', text).strip()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL and a bounded number of entries."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeocodingCache:
+    """Two-level geocoding cache: in-process LRU in front of the GeocodeCache table, ORS on a miss."""
+
+    def __init__(self, max_entries, ttl_seconds, db_ttl_days):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.db_ttl_days = db_ttl_days
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def geocode(self, client, text):
+        """Returns [lon, lat] for an address, or None when ORS cannot resolve it."""
+        key = normalize_address(text)
+        if not key:
+            # Nothing to key the cache on: ask ORS, but do not cache the answer
+            result = self.fetch(client, text) if text and text.strip() else None
+            return result[0] if result else None
+
+        coords = self.lookup_many([key]).get(key)
+        if coords is not None:
+            return coords
+
+        result = self.fetch(client, text)
+        if result is None:
+            return None
+        coords, label = result
+        self.store(key, text, coords, label)
+        return coords
+
+    def lookup_many(self, keys):
+        """Returns {key: [lon, lat]} for normalized keys found in memory or the table (one query)."""
+        found = {}
+        missing = []
+        for key in keys:
+            coords = self.memory.get(key)
+            if coords is not None:
+                self._count('memory_hits')
+                found[key] = coords
+            else:
+                missing.append(key)
+
+        if missing:
+            cutoff = timezone.now() - timedelta(days=self.db_ttl_days)
+            entries = GeocodeCache.objects.filter(normalized_query__in=missing, updated_at__gte=cutoff)
+            for entry in entries.only('normalized_query', 'longitude', 'latitude'):
+                self._count('db_hits')
+                coords = [entry.longitude, entry.latitude]
+                self.memory.set(entry.normalized_query, coords)
+                found[entry.normalized_query] = coords
+        return found
+
+    def fetch(self, client, text):
+        """Calls ORS for a cache miss without touching the database (safe from worker threads).
+
+        Returns ([lon, lat], label), or None when ORS cannot resolve the address.
+        """
+        self._count('misses')
+        return self._first_match(text, client.pelias_search(text=text))
+
+    async def afetch(self, client, text):
+        """fetch() with an AsyncORSClient."""
+        self._count('misses')
+        return self._first_match(text, await client.pelias_search(text=text))
+
+    @staticmethod
+    def _first_match(text, result):
+        if not result['features']:
+            # Unresolvable addresses are not cached, a corrected spelling or ORS update may fix them
+            logger.info("Geocoding found no match for %r", text)
+            return None
+
+        feature = result['features'][0]
+        coords = list(feature['geometry']['coordinates'][:2])  # [lon, lat]
+        return coords, (feature.get('properties', {}).get('label') or '')[:255]
+
+    async def ageocode_many(self, client, texts):
+        """Geocodes addresses with an AsyncORSClient: one cache lookup, the misses fetched from ORS
+        concurrently, one upsert. Returns {text: [lon, lat] or None}.
+        """
+        keys = {text: normalize_address(text) for text in texts}
+        found = await sync_to_async(self.lookup_many)(list({key for key in keys.values() if key}))
+
+        misses = {}
+        for text, key in keys.items():
+            if key and key not in found:
+                misses.setdefault(key, text)
+        # Addresses without a cache key are still sent to ORS, they are just not cached
+        uncached = [text for text, key in keys.items() if not key and text and text.strip()]
+        results = await asyncio.gather(*(self.afetch(client, text) for text in [*misses.values(), *uncached]))
+        fresh = [(key, text, *result) for (key, text), result in zip(misses.items(), results) if result]
+        if fresh:
+            await sync_to_async(self.store_many)(fresh)
+            found.update({key: coords for key, text, coords, label in fresh})
+        geocoded = {text: found.get(key) for text, key in keys.items()}
+        geocoded.update({text: result[0] if result else None
+                         for text, result in zip(uncached, results[len(misses):])})
+        return geocoded
+
+    def store(self, key, text, coords, label=''):
+        """Saves a fresh ORS result in both cache levels."""
+        GeocodeCache.objects.update_or_create(
+            normalized_query=key,
+            defaults={
+                'query': text,
+                'label': label,
+                'longitude': coords[0],
+                'latitude': coords[1],
+            },
+        )
+        self.memory.set(key, coords)
+
+    def store_many(self, results):
+        """Saves many fresh ORS results with a single upsert. results is [(key, text, coords, label)]."""
+        GeocodeCache.objects.bulk_create(
+            [GeocodeCache(normalized_query=key, query=text, label=label, longitude=coords[0], latitude=coords[1])
+             for key, text, coords, label in results],
+            update_conflicts=True,
+            unique_fields=['normalized_query'],
+            update_fields=['query', 'label', 'longitude', 'latitude', 'updated_at'],
+        )
+        for key, text, coords, label in results:
+            self.memory.set(key, coords)
+
+    def stats(self):
+        """Returns hit/miss counters for both cache levels."""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else None,
+            'memory_entries': len(self.memory),
+        }
+
+
+geocoding_cache = GeocodingCache(
+    max_entries=settings.GEOCODE_CACHE['MEMORY_MAX_ENTRIES'],
+    ttl_seconds=settings.GEOCODE_CACHE['MEMORY_TTL_SECONDS'],
+    db_ttl_days=settings.GEOCODE_CACHE['DB_TTL_DAYS'],
+)
+
+
+def geocode(client, text):
+    """Geocodes an address through the shared process-wide cache."""
+    return geocoding_cache.geocode(client, text)
@@ -0,0 +1,131 @@
+"""Helpers for storing and serving route geometry compactly."""
+import math
+
+POLYLINE_PRECISION = 5
+
+# Precomputed simplification levels cover web map zooms 0..MAX_ZOOM_LEVEL; deeper zooms get the full line
+MAX_ZOOM_LEVEL = 16
+
+
+def encode_polyline(coordinates, precision=POLYLINE_PRECISION):
+    """Encodes GeoJSON [lon, lat] pairs with the Google encoded polyline algorithm (lat/lng order)."""
+    factor = 10 ** precision
+    output = []
+    prev_lat = prev_lng = 0
+
+    for lng, lat in ((c[0], c[1]) for c in coordinates):
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                output.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            output.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+
+    return ''.join(output)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """Decodes an encoded polyline back into GeoJSON [lon, lat] pairs."""
+    factor = 10 ** precision
+    coordinates = []
+    index = lat = lng = 0
+    length = len(encoded)
+
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coordinates.append([lng / factor, lat / factor])
+
+    return coordinates
+
+
+def linestring(coordinates):
+    """Wraps [lon, lat] pairs in a GeoJSON LineString, the shape RouteMap.jsx expects."""
+    return {'type': 'LineString', 'coordinates': coordinates}
+
+
+def zoom_tolerance(zoom):
+    """Douglas-Peucker tolerance, in degrees, of one 256px web map tile pixel at the given zoom."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplification_ranks(coordinates):
+    """Runs Douglas-Peucker once and returns, per point, the largest tolerance at which it survives.
+
+    The split tree does not depend on the tolerance, so a point is kept at tolerance t exactly when
+    its own split distance and every enclosing split distance exceed t. Capping each rank by its
+    parent's rank turns every later simplification into a linear filter (see simplify()).
+    Distances are planar, with longitude scaled by cos(mean latitude).
+    """
+    count = len(coordinates)
+    ranks = [math.inf] * count
+    if count < 3:
+        return ranks
+
+    scale = math.cos(math.radians(sum(c[1] for c in coordinates) / count))
+    xs = [c[0] * scale for c in coordinates]
+    ys = [c[1] for c in coordinates]
+
+    stack = [(0, count - 1, math.inf)]
+    while stack:
+        first, last, ceiling = stack.pop()
+        if last - first < 2:
+            continue
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length2 = dx * dx + dy * dy
+
+        farthest, index = -1.0, first + 1
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if length2:
+                t = (px * dx + py * dy) / length2
+                t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+                px -= t * dx
+                py -= t * dy
+            distance2 = px * px + py * py
+            if distance2 > farthest:
+                farthest, index = distance2, i
+
+        rank = min(math.sqrt(farthest), ceiling)
+        ranks[index] = rank
+        stack.append((first, index, rank))
+        stack.append((index, last, rank))
+    return ranks
+
+
+def simplify(coordinates, tolerance, ranks=None):
+    """Douglas-Peucker simplification of [lon, lat] pairs; tolerance is in degrees."""
+    if ranks is None:
+        ranks = simplification_ranks(coordinates)
+    return [point for point, rank in zip(coordinates, ranks) if rank > tolerance]
+
+
+def zoom_levels(coordinates):
+    """Encoded polylines simplified for zooms 0..MAX_ZOOM_LEVEL, as {"zoom": polyline}.
+
+    Levels stop at the first zoom that keeps half the points or more; deeper zooms use the full
+    route, which keeps the stored levels smaller than the route itself.
+    """
+    ranks = simplification_ranks(coordinates)
+    levels = {}
+    for zoom in range(MAX_ZOOM_LEVEL + 1):
+        points = simplify(coordinates, zoom_tolerance(zoom), ranks)
+        if len(points) * 2 >= len(coordinates):
+            break
+        levels[str(zoom)] = encode_polyline(points)
+    return levels
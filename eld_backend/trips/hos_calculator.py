@@ -1,156 +1,213 @@
-# from datetime import datetime, timedelta
-# from typing import List, Dict, Tuple
-
-# class HOSCalculator:
-#     """Calculate Hours of Service compliance based on FMCSA regulations"""
-    
-#     def __init__(self, current_cycle_hours: float):
-#         self.current_cycle_hours = current_cycle_hours
-#         self.max_cycle_hours = 70  # 70-hour/8-day rule
-#         self.max_daily_driving = 11  # 11-hour driving limit
-#         self.max_duty_window = 14   # 14-hour driving window
-#         self.min_off_duty = 10      # 10 consecutive hours off duty
-#         self.break_requirement = 8  # 30-min break after 8 hours driving
-        
-#     def calculate_available_hours(self) -> Dict[str, float]:
-#         """Calculate how many hours are available for driving and duty"""
-#         remaining_cycle = max(0, self.max_cycle_hours - self.current_cycle_hours)
-        
-#         return {
-#             'remaining_cycle_hours': remaining_cycle,
-#             'max_daily_driving': self.max_daily_driving,
-#             'max_duty_window': self.max_duty_window,
-#             'can_drive_today': remaining_cycle >= 11
-#         }
-    
-#     def plan_driving_schedule(self, total_drive_time: float, start_time: datetime = None) -> List[Dict]:
-#         """Plan when driving, breaks, and rest periods should occur"""
-#         if not start_time:
-#             start_time = datetime.now().replace(hour=6, minute=0, second=0, microsecond=0)
-        
-#         schedule = []
-#         current_time = start_time
-#         remaining_drive_time = total_drive_time
-#         current_cycle_used = self.current_cycle_hours
-        
-#         day_number = 1
-        
-#         while remaining_drive_time > 0:
-#             available = self.calculate_available_hours()
-            
-#             if not available['can_drive_today'] or current_cycle_used >= self.max_cycle_hours:
-#                 # Need a 34-hour restart
-#                 schedule.append({
-#                     'type': 'rest_period',
-#                     'start_time': current_time,
-#                     'end_time': current_time + timedelta(hours=34),
-#                     'duration': 34,
-#                     'reason': '34-hour restart required'
-#                 })
-#                 current_time += timedelta(hours=34)
-#                 current_cycle_used = 0
-#                 continue
-            
-#             # Plan a day of driving
-#             day_schedule = self.plan_single_day(
-#                 current_time, 
-#                 min(remaining_drive_time, self.max_daily_driving),
-#                 day_number
-#             )
-            
-#             schedule.extend(day_schedule)
-            
-#             # Update counters
-#             daily_drive_time = sum(item['duration'] for item in day_schedule if item['type'] == 'driving')
-#             daily_total_time = sum(item['duration'] for item in day_schedule if item['type'] != 'off_duty')
-            
-#             remaining_drive_time -= daily_drive_time
-#             current_cycle_used += daily_total_time
-            
-#             # Move to next day
-#             last_item = day_schedule[-1]
-#             current_time = last_item['end_time']
-            
-#             # Add mandatory 10-hour break if more driving needed
-#             if remaining_drive_time > 0:
-#                 schedule.append({
-#                     'type': 'off_duty',
-#                     'start_time': current_time,
-#                     'end_time': current_time + timedelta(hours=10),
-#                     'duration': 10,
-#                     'reason': 'Mandatory 10-hour rest'
-#                 })
-#                 current_time += timedelta(hours=10)
-            
-#             day_number += 1
-        
-#         return schedule
-    
-#     def plan_single_day(self, start_time: datetime, drive_time_needed: float, day_number: int) -> List[Dict]:
-#         """Plan a single day's driving schedule"""
-#         schedule = []
-#         current_time = start_time
-#         remaining_drive = drive_time_needed
-#         consecutive_drive_time = 0
-        
-#         # Pre-trip inspection and preparation
-#         schedule.append({
-#             'type': 'on_duty_not_driving',
-#             'start_time': current_time,
-#             'end_time': current_time + timedelta(minutes=30),
-#             'duration': 0.5,
-#             'activity': 'Pre-trip inspection',
-#             'day': day_number
-#         })
-#         current_time += timedelta(minutes=30)
-        
-#         while remaining_drive > 0 and (current_time - start_time).total_seconds() / 3600 < self.max_duty_window:
-#             # Check if we need a 30-minute break
-#             if consecutive_drive_time >= self.break_requirement and remaining_drive > 0:
-#                 schedule.append({
-#                     'type': 'break',
-#                     'start_time': current_time,
-#                     'end_time': current_time + timedelta(minutes=30),
-#                     'duration': 0.5,
-#                     'activity': 'Mandatory 30-minute break',
-#                     'day': day_number
-#                 })
-#                 current_time += timedelta(minutes=30)
-#                 consecutive_drive_time = 0
-            
-#             # Calculate how much we can drive this segment
-#             max_segment = min(
-#                 remaining_drive,
-#                 self.break_requirement - consecutive_drive_time if consecutive_drive_time < self.break_requirement else remaining_drive,
-#                 self.max_duty_window - (current_time - start_time).total_seconds() / 3600
-#             )
-            
-#             if max_segment <= 0:
-#                 break
-            
-#             # Add driving time
-#             drive_duration = min(max_segment, 4)  # Drive in 4-hour chunks max
-#             schedule.append({
-#                 'type': 'driving',
-#                 'start_time': current_time,
-#                 'end_time': current_time + timedelta(hours=drive_duration),
-#                 'duration': drive_duration,
-#                 'activity': 'Driving',
-#                 'day': day_number
-#             })
-            
-#             current_time += timedelta(hours=drive_duration)
-#             remaining_drive -= drive_duration
-#             consecutive_drive_time += drive_duration
-        
-#         # Post-trip activities
-#         schedule.append({
-#             'type': 'on_duty_not_driving',
-#             'start_time': current_time,
-#             'end_time': current_time + timedelta(minutes=30),
-#             'duration': 0.5,
-#             'activity': 'Post-trip inspection and paperwork',
-#             'day': day_number
-#         })
-        
-#         return schedule
\ No newline at end of file
+"""Hours of Service trip planner.
+
+Pure Python and side-effect free: no ORM, no clock, no settings access inside the planner itself.
+Times are float hours from the plan start, so the hot loop never builds datetimes. Callers convert
+segments to datetimes only when materializing logs.
+
+The planner walks an ordered list of tasks (driving legs and on-duty work) through a small state
+machine that tracks the 11-hour driving limit, the 14-hour window, the 30-minute break after
+8 hours of driving and the 70/8 (or 60/7) cycle, inserting breaks, 10-hour rests and 34-hour
+restarts whenever the next step would violate a rule.
+"""
+from typing import List, NamedTuple, Optional
+
+EPSILON = 1e-9
+
+
+class HOSRules(NamedTuple):
+    """FMCSA property-carrying limits, in hours (and miles for fueling)."""
+    max_driving: float = 11.0
+    max_window: float = 14.0
+    required_rest: float = 10.0
+    break_after_driving: float = 8.0
+    break_duration: float = 0.5
+    cycle_limit: float = 70.0
+    restart_hours: float = 34.0
+    fuel_interval_miles: float = 1000.0
+    fuel_duration: float = 0.5
+
+    @classmethod
+    def from_settings(cls, eld_settings, cycle_rule='70_8'):
+        """Builds rules from the ELD_SETTINGS dict; cycle_rule is '70_8' or '60_7'."""
+        return cls(
+            max_driving=eld_settings['MAX_DRIVING_HOURS_PER_DAY'],
+            max_window=eld_settings['MAX_ON_DUTY_HOURS_PER_DAY'],
+            required_rest=eld_settings['REQUIRED_REST_PERIOD_HOURS'],
+            break_after_driving=eld_settings['MANDATORY_BREAK_AFTER_HOURS'],
+            break_duration=eld_settings['MANDATORY_BREAK_DURATION'],
+            cycle_limit=eld_settings[f'MAX_CYCLE_HOURS_{cycle_rule.upper()}'],
+            fuel_interval_miles=eld_settings['FUEL_STOP_INTERVAL_MILES'],
+        )
+
+
+class Task(NamedTuple):
+    """A unit of planned work. kind is 'drive' or 'on_duty'."""
+    kind: str
+    hours: float
+    miles: float = 0.0
+    location: str = ''
+    remark: str = ''
+    stop_type: Optional[str] = None
+
+
+class Segment(NamedTuple):
+    """A planned duty status interval; start/end are hours from the plan start."""
+    status: str  # off_duty, sleeper_berth, driving, on_duty
+    start: float
+    end: float
+    miles: float = 0.0
+    location: str = ''
+    remark: str = ''
+    stop_type: Optional[str] = None
+
+    @property
+    def hours(self):
+        return self.end - self.start
+
+
+class HOSPlan(NamedTuple):
+    segments: List[Segment]
+    total_hours: float
+    driving_hours: float
+    on_duty_hours: float
+    cycle_used: float  # cycle hours used at the end of the plan
+    restarts: int
+
+
+def route_tasks(stops, legs, pickup_hours=1.0, dropoff_hours=1.0, inspection_hours=0.5):
+    """The task list for a route through stops [(location, 'current' | 'pickup' | 'dropoff')], starting
+    at the first one, where legs[i] is the (miles, hours) driven from stops[i] to stops[i + 1].
+    """
+    tasks = [Task('on_duty', inspection_hours, location=stops[0][0], remark='Pre-trip inspection', stop_type='pretrip')]
+    for (location, kind), (miles, hours) in zip(stops[1:], legs):
+        if hours > 0:
+            tasks.append(Task('drive', hours, miles=miles, location='On Route', remark='Driving'))
+        if kind == 'pickup':
+            tasks.append(Task('on_duty', pickup_hours, location=location, remark='Loading at pickup', stop_type='pickup'))
+        elif kind == 'dropoff':
+            tasks.append(Task('on_duty', dropoff_hours, location=location, remark='Unloading at dropoff',
+                              stop_type='dropoff'))
+    tasks.append(Task('on_duty', inspection_hours, location=stops[-1][0], remark='Post-trip inspection',
+                      stop_type='posttrip'))
+    return tasks
+
+
+def trip_tasks(distance_miles, duration_hours, current_location='', pickup_location='', dropoff_location='',
+               **hours):
+    """The standard task list for a single pickup -> dropoff load, starting at current_location.
+
+    The pre-trip inspection happens at current_location. distance_miles and duration_hours cover the
+    loaded drive from pickup to dropoff only, so the leg from current_location to the pickup is not
+    driven here; route_tasks() with real legs plans that deadhead drive.
+    """
+    stops = [(current_location, 'current'), (pickup_location, 'pickup'), (dropoff_location, 'dropoff')]
+    return route_tasks(stops, [(0.0, 0.0), (distance_miles, duration_hours)], **hours)
+
+
+def plan(tasks, rules=HOSRules(), current_cycle_used=0.0):
+    """Simulates the tasks under the HOS rules and returns the resulting duty status segments.
+
+    The driver is assumed to start the plan rested (10+ hours off duty) with current_cycle_used
+    hours already counted against the cycle. Prior cycle hours are treated as not expiring within
+    the plan, which is conservative: a 34-hour restart is inserted once the cycle is exhausted.
+    """
+    segments = []
+    append = segments.append
+
+    max_driving = rules.max_driving
+    max_window = rules.max_window
+    break_after = rules.break_after_driving
+    fuel_interval = rules.fuel_interval_miles
+
+    now = 0.0
+    window_start = None    # start of the current 14-hour window, None while rested
+    driven = 0.0           # driving in the current shift
+    since_break = 0.0      # driving since the last 30-minute non-driving period
+    cycle = float(current_cycle_used)
+    since_fuel = 0.0       # miles since the last fuel stop
+    driving_total = on_duty_total = 0.0
+    restarts = 0
+
+    def rest(hours, status, remark):
+        nonlocal now, window_start, driven, since_break
+        append(Segment(status, now, now + hours, 0.0, 'Truck Stop', remark, 'rest'))
+        now += hours
+        window_start = None
+        driven = since_break = 0.0
+
+    for task in tasks:
+        if task.kind == 'on_duty':
+            remaining = task.hours
+            if remaining <= EPSILON:
+                continue
+            if cycle + remaining > rules.cycle_limit + EPSILON:
+                rest(rules.restart_hours, 'off_duty', f'{rules.restart_hours:g}-hour restart')
+                cycle = 0.0
+                restarts += 1
+            if window_start is None:
+                window_start = now
+            append(Segment('on_duty', now, now + remaining, 0.0, task.location, task.remark, task.stop_type))
+            now += remaining
+            cycle += remaining
+            on_duty_total += remaining
+            if remaining >= rules.break_duration - EPSILON:
+                # Any 30 consecutive minutes not driving satisfies the break requirement
+                since_break = 0.0
+            continue
+
+        remaining = task.hours
+        miles_left = task.miles
+        speed = task.miles / task.hours if task.hours > EPSILON else 0.0
+
+        while remaining > EPSILON:
+            if window_start is None:
+                window_start = now
+            window_left = max_window - (now - window_start)
+            available = min(remaining, max_driving - driven, window_left, break_after - since_break,
+                            rules.cycle_limit - cycle)
+
+            if speed and fuel_interval:
+                available = min(available, (fuel_interval - since_fuel) / speed)
+
+            if available <= EPSILON:
+                # Resolve whichever limit stopped us, most restrictive first
+                if rules.cycle_limit - cycle <= EPSILON:
+                    rest(rules.restart_hours, 'off_duty', f'{rules.restart_hours:g}-hour restart')
+                    cycle = 0.0
+                    restarts += 1
+                elif max_driving - driven <= EPSILON or window_left <= EPSILON:
+                    rest(rules.required_rest, 'sleeper_berth', f'{rules.required_rest:g}-hour rest period')
+                elif break_after - since_break <= EPSILON:
+                    append(Segment('off_duty', now, now + rules.break_duration, 0.0, 'Rest Area',
+                                   '30-minute break', 'rest'))
+                    now += rules.break_duration
+                    since_break = 0.0
+                else:
+                    # Fuel stop, on duty; counts as the 30-minute break too
+                    if cycle + rules.fuel_duration > rules.cycle_limit + EPSILON:
+                        rest(rules.restart_hours, 'off_duty', f'{rules.restart_hours:g}-hour restart')
+                        cycle = 0.0
+                        restarts += 1
+                        continue
+                    append(Segment('on_duty', now, now + rules.fuel_duration, 0.0, 'Fuel Stop', 'Fueling', 'fuel'))
+                    now += rules.fuel_duration
+                    cycle += rules.fuel_duration
+                    on_duty_total += rules.fuel_duration
+                    since_fuel = 0.0
+                    if rules.fuel_duration >= rules.break_duration - EPSILON:
+                        since_break = 0.0
+                continue
+
+            miles = min(miles_left, available * speed) if remaining - available > EPSILON else miles_left
+            append(Segment('driving', now, now + available, miles, task.location, task.remark))
+            now += available
+            remaining -= available
+            miles_left -= miles
+            driven += available
+            since_break += available
+            cycle += available
+            since_fuel += miles
+            driving_total += available
+
+    return HOSPlan(segments, now, driving_total, on_duty_total, cycle, restarts)
+
@@ -0,0 +1,146 @@
+"""Hours of Service clocks driven by recorded duty status changes.
+
+Pure Python like hos_calculator: no ORM, no settings, no clock. A ClockState holds everything the
+rules need to know about a driver's past, so consuming the next duty interval and answering "how
+much can this driver do right now" are both O(1):
+
+- the 14-hour window start and the driving done since the last 10-hour rest (11-hour limit),
+- driving since the last 30 consecutive minutes of non-driving time (break after 8 hours),
+- on-duty hours per calendar day for the last CYCLE_DAYS_KEPT days (70/8 and 60/7 cycles),
+- consecutive off-duty time, which resets the shift at 10 hours and the cycle at 34 (restart).
+
+Sleeper berth counts as off duty; split sleeper berth pairings are not modelled.
+"""
+from dataclasses import dataclass, field, replace
+from datetime import datetime, time, timedelta
+from typing import Dict, Optional
+
+from .hos_calculator import EPSILON
+
+OFF_DUTY_STATUSES = ('off_duty', 'sleeper_berth')
+CYCLE_DAYS_KEPT = 8  # the longest cycle window (70 hours / 8 days)
+
+
+@dataclass
+class ClockState:
+    as_of: Optional[datetime] = None          # end of everything consumed so far
+    status: str = ''                          # open (ongoing) duty status, '' when none is open
+    status_since: Optional[datetime] = None
+    status_until: Optional[datetime] = None   # recorded end of the open status, when it has one
+    window_start: Optional[datetime] = None   # first on-duty time after the last 10-hour rest
+    shift_driving: float = 0.0
+    since_break: float = 0.0
+    non_driving: float = 0.0                  # consecutive non-driving hours, for the 30-minute break
+    off_duty: float = 0.0                     # consecutive off-duty / sleeper hours
+    cycle_days: Dict[str, float] = field(default_factory=dict)  # ISO date -> on-duty hours
+    last_restart_at: Optional[datetime] = None
+
+
+def _hours(start, end):
+    return (end - start).total_seconds() / 3600
+
+
+def _add_cycle_hours(state, start, end, zone):
+    """Adds on-duty time to per-day buckets, split at local midnights, keeping the last days only."""
+    cursor = start.astimezone(zone)
+    end = end.astimezone(zone)
+    while cursor < end:
+        midnight = datetime.combine(cursor.date() + timedelta(days=1), time.min, zone)
+        until = min(midnight, end)
+        day = cursor.date().isoformat()
+        state.cycle_days[day] = state.cycle_days.get(day, 0.0) + _hours(cursor, until)
+        cursor = until
+
+    oldest = (end.date() - timedelta(days=CYCLE_DAYS_KEPT - 1)).isoformat()
+    for day in [day for day in state.cycle_days if day < oldest]:
+        del state.cycle_days[day]
+
+
+def _accrue(state, status, start, end, rules, zone):
+    hours = _hours(start, end)
+    if hours <= 0:
+        return
+
+    if status in OFF_DUTY_STATUSES:
+        previous_off = state.off_duty
+        state.off_duty += hours
+        state.non_driving += hours
+        if state.non_driving + EPSILON >= rules.break_duration:
+            state.since_break = 0.0
+        if state.off_duty + EPSILON >= rules.required_rest:
+            state.window_start = None
+            state.shift_driving = 0.0
+        if previous_off < rules.restart_hours <= state.off_duty + EPSILON:
+            state.cycle_days = {}
+            state.last_restart_at = end - timedelta(hours=state.off_duty - rules.restart_hours)
+        return
+
+    state.off_duty = 0.0
+    if state.window_start is None:
+        state.window_start = start
+    if status == 'driving':
+        state.shift_driving += hours
+        state.since_break += hours
+        state.non_driving = 0.0
+    else:
+        state.non_driving += hours
+        if state.non_driving + EPSILON >= rules.break_duration:
+            state.since_break = 0.0
+    _add_cycle_hours(state, start, end, zone)
+
+
+def consume(state, status, start, end, rules, zone, until=None):
+    """Applies one duty interval in time order. end=None opens a status that lasts until the next one,
+    or until `until` (a recorded end that is still ahead) if that comes first.
+
+    Time between the end of the last interval and this one's start counts as off duty.
+    """
+    if state.status:
+        ended = max(start, state.status_since)
+        if state.status_until is not None:
+            ended = min(ended, state.status_until)
+        _accrue(state, state.status, state.status_since, ended, rules, zone)
+        state.status, state.status_since, state.status_until = '', None, None
+        if start > ended:
+            _accrue(state, 'off_duty', ended, start, rules, zone)
+    elif state.as_of is not None and start > state.as_of:
+        _accrue(state, 'off_duty', state.as_of, start, rules, zone)
+
+    if end is None:
+        state.status, state.status_since, state.status_until = status, start, until
+        state.as_of = start
+    else:
+        _accrue(state, status, start, end, rules, zone)
+        state.as_of = end
+    return state
+
+
+def clocks(state, now, rules, zone, cycle_days=CYCLE_DAYS_KEPT):
+    """Remaining hours on every clock at `now`, without changing the stored state."""
+    projected = replace(state, cycle_days=dict(state.cycle_days))
+    if projected.status:
+        consume(projected, 'off_duty', now, now, rules, zone)  # closes the open status at now (or its end)
+    elif projected.as_of is not None and now > projected.as_of:
+        _accrue(projected, 'off_duty', projected.as_of, now, rules, zone)
+
+    first_day = (now.astimezone(zone).date() - timedelta(days=cycle_days - 1)).isoformat()
+    cycle_used = sum(hours for day, hours in projected.cycle_days.items() if day >= first_day)
+    window_left = rules.max_window
+    if projected.window_start is not None:
+        window_left = max(rules.max_window - _hours(projected.window_start, now), 0.0)
+    drive_left = max(rules.max_driving - projected.shift_driving, 0.0)
+    cycle_left = max(rules.cycle_limit - cycle_used, 0.0)
+    break_due_in = max(rules.break_after_driving - projected.since_break, 0.0)
+
+    return {
+        'drive_left': drive_left,
+        'window_left': window_left,
+        'break_due_in': break_due_in,
+        'cycle_used': cycle_used,
+        'cycle_left': cycle_left,
+        'available_driving': min(drive_left, window_left, cycle_left, break_due_in),
+        'consecutive_off_duty': projected.off_duty,
+        'rest_left': max(rules.required_rest - projected.off_duty, 0.0) if projected.window_start else 0.0,
+        'restart_left': max(rules.restart_hours - projected.off_duty, 0.0),
+        'last_restart_at': projected.last_restart_at,
+    }
@@ -0,0 +1,210 @@
+"""Bulk ingestion of duty status changes sent by devices, for many daily logs at once.
+
+Each item is validated on its own and gets its own outcome, as in trips.batch. Items carrying a
+client_event_id that is already stored (or repeated earlier in the batch) are acknowledged as
+duplicates without being written again, so a device can resend a batch after a timeout.
+
+Off-duty padding the trip planner adds to fill a log sheet's day is not checked for overlaps:
+recorded events cut their time out of it, trimming or splitting the padding rows.
+
+The affected daily logs are locked (SELECT ... FOR UPDATE) for the duration of the write, so two
+concurrent batches for the same log cannot both pass the overlap check. Everything else is a
+constant number of queries per batch: logs, existing events, known client ids, then bulk inserts.
+"""
+import bisect
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .clocks import advance_clocks, mark_clocks_stale
+from .conditional import touch_trips
+from .live import publish_duty_events
+from .log_totals import add_event, apply_event_deltas, event_deltas
+from .models import DailyLog, DutyEvents
+from .serializers import DutyEventIngestSerializer
+from .services import BULK_BATCH_SIZE
+
+logger = logging.getLogger('eld_tracker')
+
+
+class Timeline:
+    """Start-ordered intervals of one log's events, for overlap checks as events are added.
+
+    An event without end_time is open: it lasts until the next status change, so it never
+    overlaps a later event.
+    """
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.ends = [end for _, end in intervals]
+
+    def conflict(self, start, end):
+        """The (start, end) of an existing interval that overlaps the given one, or None."""
+        position = bisect.bisect_left(self.starts, start)
+        if position < len(self.starts) and self.starts[position] == start:
+            return self.starts[position], self.ends[position]
+        if position and self.ends[position - 1] is not None and self.ends[position - 1] > start:
+            return self.starts[position - 1], self.ends[position - 1]
+        if position < len(self.starts) and end is not None and end > self.starts[position]:
+            return self.starts[position], self.ends[position]
+        return None
+
+    def add(self, start, end):
+        position = bisect.bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+
+
+def _cut(start, end, cut_start, cut_end):
+    """What is left of [start, end) after removing [cut_start, cut_end); an open cut runs to the end."""
+    cut_end = end if cut_end is None else cut_end
+    if cut_start >= end or cut_end <= start:
+        return [(start, end)]
+    return [(piece_start, piece_end) for piece_start, piece_end in ((start, cut_start), (cut_end, end))
+            if piece_start < piece_end]
+
+
+def carve_padding(padding, events):
+    """Cuts the new events' time out of planner padding rows on the same logs.
+
+    Returns (changed, added, removed, deltas): padding rows with a new start or end, new rows for
+    the pieces a split leaves behind, rows covered completely, and the log total deltas of the
+    changed and added rows. Removed rows are deleted through the ORM, whose signals take their
+    hours off the log.
+    """
+    by_log = defaultdict(list)
+    for event in events:
+        by_log[event.daily_log_id].append(event)
+
+    changed, added, removed = [], [], []
+    deltas = defaultdict(lambda: defaultdict(float))
+    for row in padding:
+        pieces = [(row.start_time, row.end_time)]
+        for event in by_log.get(row.daily_log_id, ()):
+            pieces = [piece for start, end in pieces for piece in _cut(start, end, event.start_time, event.end_time)]
+        if pieces == [(row.start_time, row.end_time)]:
+            continue
+
+        if not pieces:
+            removed.append(row)
+            continue
+        add_event(deltas, row.daily_log_id, row.duty_event_status, row.start_time, row.end_time, sign=-1)
+        for start, end in pieces:
+            add_event(deltas, row.daily_log_id, row.duty_event_status, start, end)
+        row.start_time, row.end_time = pieces[0]
+        changed.append(row)
+        added.extend(
+            DutyEvents(daily_log_id=row.daily_log_id, duty_event_status=row.duty_event_status, start_time=start,
+                       end_time=end, location=row.location, remarks=row.remarks, truck_moved=row.truck_moved,
+                       planner_padding=True)
+            for start, end in pieces[1:]
+        )
+    return changed, added, removed, deltas
+
+
+def _error(index, item, errors):
+    client_event_id = item.get('client_event_id') if isinstance(item, dict) else None
+    return {'index': index, 'status': 'error', 'client_event_id': client_event_id, 'errors': errors}
+
+
+def ingest_duty_events(items, daily_log_id=None):
+    """Validates and stores duty events. Returns (per-item outcomes in input order, created events).
+
+    Outcomes have status 'created', 'duplicate' or 'error'. When daily_log_id is given (the per-log
+    endpoint) every item belongs to that log.
+    """
+    outcomes = [None] * len(items)
+
+    # 1. Field validation, no queries. One serializer validates every item: building one per item
+    # deep-copies its fields each time, which costs more than the validation itself.
+    serializer = DutyEventIngestSerializer()
+    valid = []  # (index, validated data)
+    for index, item in enumerate(items):
+        try:
+            data = serializer.run_validation(item)
+        except ValidationError as e:
+            outcomes[index] = _error(index, item, as_serializer_error(e))
+            continue
+        if daily_log_id is not None:
+            data['daily_log'] = daily_log_id
+        elif 'daily_log' not in data:
+            outcomes[index] = _error(index, item, {'daily_log': ['This field is required.']})
+            continue
+        valid.append((index, data))
+
+    created = []
+    with transaction.atomic():
+        # 2. Lock the logs in a fixed order so concurrent batches cannot deadlock
+        log_ids = {data['daily_log'] for _, data in valid}
+        logs = {
+            pk: (trip_id, driver_id) for pk, trip_id, driver_id in
+            DailyLog.objects.select_for_update().filter(pk__in=log_ids).order_by('pk')
+            .values_list('pk', 'trip_id', 'driver_id')
+        }
+
+        client_ids = {data['client_event_id'] for _, data in valid if data.get('client_event_id')}
+        seen = set(DutyEvents.objects.filter(client_event_id__in=client_ids).values_list('client_event_id', flat=True))
+
+        timelines = defaultdict(list)
+        for log_id, start, end in DutyEvents.objects.filter(daily_log__in=logs, planner_padding=False).values_list(
+                'daily_log_id', 'start_time', 'end_time'):
+            timelines[log_id].append((start, end))
+        timelines = {log_id: Timeline(intervals) for log_id, intervals in timelines.items()}
+        padding = list(DutyEvents.objects.filter(daily_log__in=logs, planner_padding=True))
+
+        # 3. Dedupe and check overlaps in time order, so a batch may arrive in any order
+        for index, data in sorted(valid, key=lambda pair: pair[1]['start_time']):
+            client_event_id = data.get('client_event_id')
+            if client_event_id and client_event_id in seen:
+                outcomes[index] = {'index': index, 'status': 'duplicate', 'client_event_id': str(client_event_id)}
+                continue
+            if data['daily_log'] not in logs:
+                outcomes[index] = _error(index, items[index], {'daily_log': ['Unknown daily log.']})
+                continue
+
+            timeline = timelines.setdefault(data['daily_log'], Timeline([]))
+            conflict = timeline.conflict(data['start_time'], data.get('end_time'))
+            if conflict:
+                outcomes[index] = _error(index, items[index], {'non_field_errors': [
+                    f"Overlaps the event from {conflict[0].isoformat()}"
+                    f"{' to ' + conflict[1].isoformat() if conflict[1] else ''} on this log."
+                ]})
+                continue
+
+            timeline.add(data['start_time'], data.get('end_time'))
+            if client_event_id:
+                seen.add(client_event_id)
+            event = DutyEvents(daily_log_id=data.pop('daily_log'), **data)
+            created.append(event)
+            outcomes[index] = {'index': index, 'status': 'created',
+                               'client_event_id': str(client_event_id) if client_event_id else None}
+
+        # 4. Bulk insert; bulk_create sends no signals, so log totals, driver clocks, the owning
+        # trips' changed_at and live subscribers are handled here, once per log, driver or trip
+        DutyEvents.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+        deltas = event_deltas(created)
+
+        # Planner padding gives way to the recorded events
+        changed, added, removed, padding_deltas = carve_padding(padding, created)
+        DutyEvents.objects.bulk_update(changed, ['start_time', 'end_time'], batch_size=BULK_BATCH_SIZE)
+        DutyEvents.objects.bulk_create(added, batch_size=BULK_BATCH_SIZE)
+        DutyEvents.objects.filter(pk__in=[row.pk for row in removed]).delete()
+        for log_id, fields in padding_deltas.items():
+            for field, hours in fields.items():
+                deltas[log_id][field] += hours
+
+        apply_event_deltas(deltas)
+        advance_clocks(created)
+        # Clocks that already consumed the padding are replayed on their next read
+        mark_clocks_stale(log_ids={row.daily_log_id for row in [*changed, *removed]})
+        touch_trips(log_ids={event.daily_log_id for event in created})
+        publish_duty_events(created, logs)
+
+    logger.info("Duty event ingestion: %s created, %s duplicates, %s failed", len(created),
+                sum(1 for outcome in outcomes if outcome['status'] == 'duplicate'),
+                sum(1 for outcome in outcomes if outcome['status'] == 'error'))
+    return outcomes, created
@@ -0,0 +1,144 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .live import publish, trip_channel
+from .models import Trip, TripJob
+from .services import generate_trip_route_and_logs
+
+logger = logging.getLogger('eld_tracker')
+
+
+def enqueue_trip_generation(trip):
+    """Marks the trip pending and queues route + log generation for the worker."""
+    if trip.status != 'pending':
+        trip.status = 'pending'
+        trip.save(update_fields=['status', 'updated_at', 'changed_at'])
+    return TripJob.objects.create(
+        trip=trip,
+        kind='generate_trip',
+        max_attempts=settings.TRIP_JOBS['MAX_ATTEMPTS'],
+    )
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with full jitter, capped at BACKOFF_MAX_SECONDS."""
+    base = settings.TRIP_JOBS['BACKOFF_BASE_SECONDS']
+    cap = settings.TRIP_JOBS['BACKOFF_MAX_SECONDS']
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+def requeue_stale_jobs():
+    """Puts jobs whose worker died mid-run back in the queue, or fails them once they are out of
+    attempts, as run_job does. Returns the number requeued.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.TRIP_JOBS['LOCK_TIMEOUT_SECONDS'])
+    stale = TripJob.objects.filter(status='running', locked_at__lt=cutoff)
+    with transaction.atomic():
+        exhausted = list(stale.filter(attempts__gte=F('max_attempts')).select_for_update()
+                         .values_list('pk', 'trip_id', 'attempts'))
+        TripJob.objects.filter(pk__in=[pk for pk, _, _ in exhausted]).update(
+            status='failed', finished_at=now, locked_at=None, locked_by='',
+            last_error='Worker stopped responding', updated_at=now,
+        )
+        for pk, trip_id, attempts in exhausted:
+            _set_trip_status(trip_id, 'failed')
+            logger.error("Job %s failed permanently after %s attempts: worker stopped responding", pk, attempts)
+        return stale.update(status='queued', locked_at=None, locked_by='', updated_at=now)
+
+
+def claim_next_job(worker_id):
+    """Atomically claims the oldest runnable job, or returns None when the queue is empty."""
+    with transaction.atomic():
+        queryset = TripJob.objects.filter(status='queued', run_after__lte=timezone.now()).order_by('run_after')
+        if connection.features.has_select_for_update_skip_locked:
+            # Concurrent workers skip rows another worker is claiming instead of waiting on them
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_at = timezone.now()
+        job.locked_by = worker_id
+        job.save(update_fields=['status', 'attempts', 'locked_at', 'locked_by', 'updated_at'])
+    return job
+
+
+def _update_progress(job, percent, message):
+    job.progress = percent
+    job.progress_message = message
+    TripJob.objects.filter(pk=job.pk).update(progress=percent, progress_message=message, updated_at=timezone.now())
+    publish(trip_channel(job.trip_id), 'progress',
+            {'trip_id': str(job.trip_id), 'job_id': job.pk, 'progress': percent, 'message': message})
+
+
+def _set_trip_status(trip_id, status):
+    now = timezone.now()
+    Trip.objects.filter(pk=trip_id).update(status=status, updated_at=now, changed_at=now)
+    publish(trip_channel(trip_id), 'status', {'trip_id': str(trip_id), 'status': status})
+
+
+def _run_generate_trip(job):
+    trip = job.trip
+    _set_trip_status(trip.pk, 'processing')
+    generate_trip_route_and_logs(trip, progress=lambda percent, message: _update_progress(job, percent, message))
+    _set_trip_status(trip.pk, 'ready')
+
+
+JOB_HANDLERS = {
+    'generate_trip': _run_generate_trip,
+}
+
+
+def run_job(job):
+    """Runs a claimed job, scheduling a retry with backoff on failure. Returns True on success."""
+    try:
+        JOB_HANDLERS[job.kind](job)
+    except Exception as e:
+        job.last_error = f"{type(e).__name__}: {e}"
+        job.locked_at = None
+        job.locked_by = ''
+        if job.attempts < job.max_attempts:
+            # Do not come back before ORS can be called again
+            delay = max(backoff_delay(job.attempts), getattr(e, 'retry_after', 0))
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            _set_trip_status(job.trip_id, 'pending')
+            logger.warning("Job %s attempt %s/%s failed, retrying in %.0fs: %s",
+                           job.pk, job.attempts, job.max_attempts, delay, job.last_error)
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            _set_trip_status(job.trip_id, 'failed')
+            logger.error("Job %s failed permanently after %s attempts: %s", job.pk, job.attempts, job.last_error)
+        job.save()
+        return False
+
+    job.status = 'succeeded'
+    job.progress = 100
+    job.progress_message = 'Done'
+    job.last_error = ''
+    job.locked_at = None
+    job.finished_at = timezone.now()
+    job.save()
+    return True
+
+
+def run_pending_jobs(worker_id, max_jobs=None, should_stop=None):
+    """Drains runnable jobs. Returns the number of jobs processed."""
+    processed = 0
+    while (max_jobs is None or processed < max_jobs) and not (should_stop and should_stop()):
+        job = claim_next_job(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
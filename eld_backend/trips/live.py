@@ -0,0 +1,264 @@
+"""Live updates (job progress, duty events, driver clocks) pushed to clients as server-sent events.
+
+Publishers (web requests, the trip worker, management commands) insert LiveEvent rows in their own
+transaction, so a notification becomes visible exactly when the change it describes commits, and
+prune expired rows after it (throttled), so the outbox stays bounded without any stream open. Each
+ASGI process runs one poller task that reads the rows added since its last poll and fans them out
+to the in-memory queues of its open streams. An idle stream is a suspended coroutine and a bounded
+queue with no database work of its own, so the cost of polling does not grow with the number of
+connections; a client that stops reading is dropped and replays from Last-Event-ID on reconnect.
+
+Ids are allocated before commit, so a row can become visible after a higher id was already read.
+The poller keeps such gaps under watch for GAP_TIMEOUT_SECONDS (a rolled-back insert leaves a gap
+for good) and delivers the late row when it shows up.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import LiveEvent
+
+logger = logging.getLogger('eld_tracker')
+
+FETCH_LIMIT = 1000          # rows read per poll; a full page polls again without sleeping
+MAX_TRACKED_GAP = 1000      # id jumps wider than this are sequence skips, not open transactions
+REPLAY_LIMIT = 1000         # events sent to a reconnecting client, newest dropped beyond that
+PRUNE_INTERVAL_SECONDS = 60
+
+
+def trip_channel(trip_id):
+    return f'trip:{trip_id}'
+
+
+def driver_channel(driver_id):
+    return f'driver:{driver_id}'
+
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def prune_events():
+    """Deletes rows older than LIVE_EVENTS['RETENTION_SECONDS']. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(seconds=settings.LIVE_EVENTS['RETENTION_SECONDS'])
+    deleted, _ = LiveEvent.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _prune_if_due():
+    global _last_prune
+    with _prune_lock:
+        now = time.monotonic()
+        if now - _last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    try:
+        prune_events()
+    except Exception:
+        logger.exception("Pruning live events failed")
+
+
+def _published():
+    # Every process that publishes keeps the outbox bounded, whether or not it serves any stream.
+    # Pruning runs after commit, outside the publisher's transaction.
+    transaction.on_commit(_prune_if_due)
+
+
+def publish(channel, kind, payload):
+    LiveEvent.objects.create(channel=channel, kind=kind, payload=payload)
+    _published()
+
+
+def publish_many(rows):
+    """Publishes (channel, kind, payload) rows with one bulk insert."""
+    if rows:
+        LiveEvent.objects.bulk_create([LiveEvent(channel=channel, kind=kind, payload=payload)
+                                       for channel, kind, payload in rows], batch_size=500)
+        _published()
+
+
+def duty_event_payload(event):
+    return {
+        'id': event.pk,
+        'daily_log': str(event.daily_log_id),
+        'client_event_id': str(event.client_event_id) if event.client_event_id else None,
+        'duty_event_status': event.duty_event_status,
+        'start_time': event.start_time,
+        'end_time': event.end_time,
+        'truck_moved': event.truck_moved,
+        'location': event.location,
+        'remarks': event.remarks,
+    }
+
+
+def publish_duty_events(events, logs):
+    """Publishes new events once per trip and once per driver. logs maps log id -> (trip id, driver id)."""
+    grouped = defaultdict(list)
+    for event in events:
+        trip_id, driver_id = logs[event.daily_log_id]
+        payload = duty_event_payload(event)
+        grouped[trip_channel(trip_id)].append(payload)
+        grouped[driver_channel(driver_id)].append(payload)
+    publish_many([(channel, 'duty_events', {'events': payloads}) for channel, payloads in grouped.items()])
+
+
+def format_event(kind, payload, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {kind}', f'data: {json.dumps(payload, cls=DjangoJSONEncoder)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    def __init__(self, channels, queue_size):
+        self.channels = tuple(channels)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class Broker:
+    """Per-process fan-out of LiveEvent rows to subscriptions, fed by a single polling task.
+
+    The poller starts with the first subscription and stops when the last one goes away. State is
+    bound to the event loop it was created on, so a new loop (tests, a reloaded worker) starts clean.
+    """
+
+    def __init__(self, poll_interval, queue_size, gap_timeout):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.gap_timeout = gap_timeout
+        self._loop = None
+        self._reset()
+
+    def _reset(self):
+        self._subscribers = defaultdict(set)  # channel -> subscriptions
+        self._task = None
+        self._starting = asyncio.Lock()
+        self.last_id = None
+        self._gaps = {}  # id not seen yet -> monotonic time it was first missed
+
+    async def subscribe(self, channels):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._reset()
+
+        subscription = Subscription(channels, self.queue_size)
+        for channel in subscription.channels:
+            self._subscribers[channel].add(subscription)
+        async with self._starting:
+            if self._task is None or self._task.done():
+                if self.last_id is None:
+                    # Read before the caller builds its snapshot, so nothing committed after it is skipped
+                    self.last_id = await sync_to_async(self._latest_id)()
+                self._task = loop.create_task(self._run())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    @property
+    def subscriber_count(self):
+        return len({subscription for subscribers in self._subscribers.values() for subscription in subscribers})
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                rows = await sync_to_async(self.fetch)()
+            except Exception:
+                logger.exception("Live event poll failed")
+                rows = []
+            for row in rows:
+                self.dispatch(row)
+            if len(rows) < FETCH_LIMIT:
+                await asyncio.sleep(self.poll_interval)
+        self.last_id = None
+        self._gaps = {}
+
+    @staticmethod
+    def _latest_id():
+        return LiveEvent.objects.aggregate(latest=Max('pk'))['latest'] or 0
+
+    def fetch(self):
+        """Reads rows past last_id plus any late commits filling watched gaps, in id order."""
+        now = time.monotonic()
+        self._gaps = {pk: missed for pk, missed in self._gaps.items() if now - missed < self.gap_timeout}
+        condition = Q(pk__gt=self.last_id)
+        if self._gaps:
+            condition |= Q(pk__in=list(self._gaps))
+        rows = list(LiveEvent.objects.filter(condition).order_by('pk')[:FETCH_LIMIT])
+
+        for row in rows:
+            if row.pk > self.last_id:
+                if row.pk - self.last_id <= MAX_TRACKED_GAP:
+                    for missing in range(self.last_id + 1, row.pk):
+                        self._gaps.setdefault(missing, now)
+                self.last_id = row.pk
+            else:
+                self._gaps.pop(row.pk, None)
+        return rows
+
+    def dispatch(self, row):
+        for subscription in list(self._subscribers.get(row.channel, ())):
+            try:
+                subscription.queue.put_nowait(row)
+            except asyncio.QueueFull:
+                # A client that stopped reading is cut off instead of buffered without bound
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+
+broker = Broker(
+    poll_interval=settings.LIVE_EVENTS['POLL_INTERVAL_SECONDS'],
+    queue_size=settings.LIVE_EVENTS['QUEUE_SIZE'],
+    gap_timeout=settings.LIVE_EVENTS['GAP_TIMEOUT_SECONDS'],
+)
+
+
+def replay(channels, after_id):
+    return list(LiveEvent.objects.filter(channel__in=channels, pk__gt=after_id).order_by('pk')[:REPLAY_LIMIT])
+
+
+async def event_stream(channels, snapshot, last_event_id=None):
+    """Server-sent events for the channels, run until the client disconnects.
+
+    A new client first gets snapshot() (a list of (kind, payload) built after subscribing, so no
+    change falls between it and the stream); a reconnecting one gets the events it missed instead.
+    """
+    subscription = await broker.subscribe(channels)
+    try:
+        yield f"retry: {settings.LIVE_EVENTS['RETRY_MILLISECONDS']}\n\n"
+        replayed = set()
+        if last_event_id is None:
+            for kind, payload in await sync_to_async(snapshot)():
+                yield format_event(kind, payload)
+        else:
+            for row in await sync_to_async(replay)(channels, last_event_id):
+                replayed.add(row.pk)
+                yield format_event(row.kind, row.payload, row.pk)
+
+        while not (subscription.overflowed and subscription.queue.empty()):
+            try:
+                row = await asyncio.wait_for(subscription.queue.get(), settings.LIVE_EVENTS['HEARTBEAT_SECONDS'])
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'  # keeps proxies from closing an idle connection
+                continue
+            if row.pk not in replayed:
+                yield format_event(row.kind, row.payload, row.pk)
+    finally:
+        broker.unsubscribe(subscription)
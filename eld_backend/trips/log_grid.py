@@ -0,0 +1,307 @@
+"""Server-side rendering of the daily log graph grid as SVG and PDF.
+
+A sheet is first reduced to plain data (sheet_data): header fields, the duty segments clipped to the
+log's day in the carrier time zone, per-status totals and the remarks. The SHA-256 of that data is
+the sheet's content address: rendered sheets are cached under it, so any change to the log or its
+events yields a new address and old renderings are never served again; they simply age out.
+
+Both outputs are drawn from the same list of primitives in Courier, whose fixed advance width lets
+text be placed identically in SVG and in the hand-written PDF (standard font, no embedding).
+"""
+import hashlib
+import json
+import zlib
+from datetime import datetime, time as dt_time, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from .models import DutyEvents
+
+RENDER_VERSION = 1  # bump when the drawing changes, so cached sheets are not reused
+
+GRID_FORMATS = {
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+}
+
+PAGE_WIDTH, PAGE_HEIGHT = 792, 612  # US Letter, landscape, in points
+GRID_LEFT, GRID_TOP = 150, 170
+HOUR_WIDTH, ROW_HEIGHT = 22, 28
+GRID_RIGHT = GRID_LEFT + 24 * HOUR_WIDTH
+GRID_BOTTOM = GRID_TOP + 4 * ROW_HEIGHT
+REMARKS_TOP = GRID_BOTTOM + 56
+LINE_HEIGHT = 13
+CHAR_WIDTH = 0.6  # Courier advance width, in em
+DUTY_LINE_COLOR = '#1f4e9c'
+
+ROWS = [
+    ('off_duty', '1. Off Duty'),
+    ('sleeper_berth', '2. Sleeper Berth'),
+    ('driving', '3. Driving'),
+    ('on_duty', '4. On Duty (not driving)'),
+]
+ROW_INDEX = {status: index for index, (status, _) in enumerate(ROWS)}
+STATUS_LABELS = dict(DutyEvents.DUTY_EVENT_TYPE)
+
+
+def grid_logs(logs):
+    """Daily logs with driver, user and ordered duty events loaded in two queries."""
+    return logs.select_related('driver__user').prefetch_related(
+        Prefetch('dutyevents_set', queryset=DutyEvents.objects.order_by('start_time', 'id'), to_attr='grid_events'),
+    ).order_by('date', 'id')
+
+
+def _hours(moment, day_start):
+    return min(max((moment - day_start).total_seconds() / 3600, 0.0), 24.0)
+
+
+def _clock(hours):
+    minutes = round(hours * 60)
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def sheet_data(log, zone):
+    """Everything drawn on a log's sheet, as JSON-serializable data."""
+    day_start = datetime.combine(log.date, dt_time.min, zone)
+    day_end = datetime.combine(log.date + timedelta(days=1), dt_time.min, zone)
+    events = log.grid_events
+
+    segments = []
+    remarks = []
+    for index, event in enumerate(events):
+        # An open event runs until the next one starts, or to the end of the day
+        end = event.end_time or (events[index + 1].start_time if index + 1 < len(events) else day_end)
+        start, end = max(event.start_time, day_start), min(end, day_end)
+        if end <= start:
+            continue
+        segments.append([event.duty_event_status, round(_hours(start, day_start), 4), round(_hours(end, day_start), 4)])
+        remarks.append([_clock(_hours(start, day_start)), STATUS_LABELS[event.duty_event_status],
+                        event.location, event.remarks])
+
+    totals = {status: 0.0 for status, _ in ROWS}
+    for status, start, end in segments:
+        totals[status] += end - start
+
+    user = log.driver.user
+    return {
+        'version': RENDER_VERSION,
+        'date': log.date.isoformat(),
+        'time_zone': str(zone),
+        'driver': f'{user.first_name} {user.last_name}'.strip() or user.username,
+        'driver_number': log.driver.driver_number,
+        'home_operation_center': log.driver.home_operation_center,
+        'vehicle_number': log.vehicle_number,
+        'trailer_number': log.trailer_number,
+        'miles': round(log.total_driving_miles or 0),
+        'shipper': log.shipper_name,
+        'commodity': log.shipper_commodity,
+        'load_number': log.load_number,
+        'segments': segments,
+        'totals': {status: round(hours, 4) for status, hours in totals.items()},
+        'remarks': remarks,
+    }
+
+
+def sheet_digest(data):
+    """Content address of a sheet."""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _x(hours):
+    return GRID_LEFT + hours * HOUR_WIDTH
+
+
+def _row_middle(status):
+    return GRID_TOP + (ROW_INDEX[status] + 0.5) * ROW_HEIGHT
+
+
+def sheet_primitives(data):
+    """Drawing operations for one sheet, top-left origin, in points.
+
+    ('line', x1, y1, x2, y2, width, color), ('rect', x, y, w, h, width) and
+    ('text', x, y, text, size, anchor) where anchor is 'start', 'middle' or 'end'.
+    """
+    ops = [
+        ('text', PAGE_WIDTH / 2, 52, "DRIVER'S DAILY LOG (24 HOURS)", 15, 'middle'),
+        ('text', PAGE_WIDTH - 36, 52, data['date'], 11, 'end'),
+        ('text', 36, 84, f"Driver: {data['driver']} (#{data['driver_number']})", 10, 'start'),
+        ('text', 420, 84, f"Home operation center: {data['home_operation_center']}", 10, 'start'),
+        ('text', 36, 100, f"Vehicle: {data['vehicle_number']}   Trailer: {data['trailer_number']}", 10, 'start'),
+        ('text', 420, 100, f"Total miles driving today: {data['miles']}", 10, 'start'),
+        ('text', 36, 116, f"Shipper: {data['shipper'] or '-'}   Commodity: {data['commodity'] or '-'}   "
+                          f"Load No.: {data['load_number'] or '-'}", 10, 'start'),
+        ('text', 36, 132, f"Times in {data['time_zone']}", 8, 'start'),
+        ('text', GRID_RIGHT + 57, GRID_TOP - 8, 'Total Hours', 8, 'middle'),
+        ('rect', GRID_LEFT, GRID_TOP, GRID_RIGHT - GRID_LEFT, GRID_BOTTOM - GRID_TOP, 1),
+    ]
+
+    for hour in range(25):
+        x = _x(hour)
+        label = 'M' if hour in (0, 24) else 'N' if hour == 12 else str(hour % 12)
+        ops.append(('text', x, GRID_TOP - 8, label, 7, 'middle'))
+        ops.append(('line', x, GRID_TOP, x, GRID_BOTTOM, 0.5, '#000000'))
+
+    for index, (status, label) in enumerate(ROWS):
+        top = GRID_TOP + index * ROW_HEIGHT
+        if index:
+            ops.append(('line', GRID_LEFT, top, GRID_RIGHT, top, 0.5, '#000000'))
+        ops.append(('text', 36, top + ROW_HEIGHT / 2 + 3, label, 9, 'start'))
+        ops.append(('text', GRID_RIGHT + 57, top + ROW_HEIGHT / 2 + 3, _clock(data['totals'][status]), 9, 'middle'))
+        for quarter in range(1, 96):
+            if quarter % 4:
+                tick = 9 if quarter % 2 == 0 else 5
+                x = _x(quarter / 4)
+                ops.append(('line', x, top, x, top + tick, 0.3, '#000000'))
+    ops.append(('text', GRID_RIGHT + 57, GRID_BOTTOM + 14, '= ' + _clock(sum(data['totals'].values())), 9, 'middle'))
+
+    previous = None
+    for status, start, end in data['segments']:
+        y = _row_middle(status)
+        if previous and previous[1] == start:
+            ops.append(('line', _x(start), _row_middle(previous[0]), _x(start), y, 2, DUTY_LINE_COLOR))
+        ops.append(('line', _x(start), y, _x(end), y, 2, DUTY_LINE_COLOR))
+        ops.append(('line', _x(start), GRID_BOTTOM, _x(start), GRID_BOTTOM + 8, 0.75, '#000000'))
+        previous = (status, end)
+
+    ops.append(('text', 36, REMARKS_TOP, 'Remarks', 10, 'start'))
+    room = int((PAGE_HEIGHT - 36 - REMARKS_TOP) / LINE_HEIGHT) - 1
+    remarks = data['remarks']
+    shown = remarks if len(remarks) <= room else remarks[:room - 1]
+    for index, (clock, status, location, remark) in enumerate(shown, start=1):
+        text = f"{clock}  {status:<13}  {location}" + (f" - {remark}" if remark else '')
+        ops.append(('text', 36, REMARKS_TOP + index * LINE_HEIGHT, text[:118], 8, 'start'))
+    if len(shown) < len(remarks):
+        ops.append(('text', 36, REMARKS_TOP + room * LINE_HEIGHT,
+                    f"... {len(remarks) - len(shown)} more duty status changes", 8, 'start'))
+    return ops
+
+
+def _xml_escape(text):
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def svg_sheet(data):
+    """One sheet as an SVG group (no root element), placed at the origin."""
+    parts = ['<g font-family="Courier, monospace" fill="none" stroke-linecap="square">']
+    for op in sheet_primitives(data):
+        if op[0] == 'line':
+            _, x1, y1, x2, y2, width, color = op
+            parts.append(f'<line x1="{x1:g}" y1="{y1:g}" x2="{x2:g}" y2="{y2:g}" stroke="{color}" '
+                         f'stroke-width="{width:g}"/>')
+        elif op[0] == 'rect':
+            _, x, y, w, h, width = op
+            parts.append(f'<rect x="{x:g}" y="{y:g}" width="{w:g}" height="{h:g}" stroke="#000000" '
+                         f'stroke-width="{width:g}"/>')
+        else:
+            _, x, y, text, size, anchor = op
+            parts.append(f'<text x="{x:g}" y="{y:g}" font-size="{size}" text-anchor="{anchor}" '
+                         f'fill="#000000">{_xml_escape(text)}</text>')
+    parts.append('</g>')
+    return ''.join(parts)
+
+
+def svg_document(groups):
+    """Sheets stacked top to bottom in one SVG document."""
+    height = PAGE_HEIGHT * max(len(groups), 1)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{PAGE_WIDTH}" height="{height}" '
+             f'viewBox="0 0 {PAGE_WIDTH} {height}">', f'<rect width="100%" height="100%" fill="#ffffff"/>']
+    for index, group in enumerate(groups):
+        parts.append(f'<g transform="translate(0 {index * PAGE_HEIGHT})">{group}</g>')
+    parts.append('</svg>')
+    return ''.join(parts).encode()
+
+
+def _pdf_text(text):
+    text = str(text).encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _pdf_color(color):
+    return ' '.join(f'{int(color[i:i + 2], 16) / 255:.3g}' for i in (1, 3, 5))
+
+
+def pdf_page(data):
+    """One sheet as a compressed PDF page content stream (PDF origin is bottom-left)."""
+    out = []
+    for op in sheet_primitives(data):
+        if op[0] == 'line':
+            _, x1, y1, x2, y2, width, color = op
+            out.append(f'{_pdf_color(color)} RG {width:g} w {x1:g} {PAGE_HEIGHT - y1:g} m '
+                       f'{x2:g} {PAGE_HEIGHT - y2:g} l S')
+        elif op[0] == 'rect':
+            _, x, y, w, h, width = op
+            out.append(f'0 0 0 RG {width:g} w {x:g} {PAGE_HEIGHT - y - h:g} {w:g} {h:g} re S')
+        else:
+            _, x, y, text, size, anchor = op
+            advance = len(text) * size * CHAR_WIDTH
+            x -= {'start': 0, 'middle': advance / 2, 'end': advance}[anchor]
+            out.append(f'BT /F1 {size} Tf {x:g} {PAGE_HEIGHT - y:g} Td ({_pdf_text(text)}) Tj ET')
+    return zlib.compress('\n'.join(out).encode('latin-1'))
+
+
+def pdf_document(pages):
+    """A PDF with one Letter-landscape page per compressed content stream."""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once page numbers are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for stream in pages:
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> '
+                       b'/Contents %d 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT, len(objects)))
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class GridRenderer:
+    """Renders daily logs to SVG or PDF, reusing cached sheets by content address."""
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def sheets(self, logs, output):
+        """(cache key, sheet data) per log, for logs loaded with grid_logs()."""
+        zone = ZoneInfo(settings.ELD_OUTPUT['CARRIER_TIME_ZONE'])
+        sheets = [sheet_data(log, zone) for log in logs]
+        return [(f'trips:grid:{output}:{sheet_digest(data)}', data) for data in sheets]
+
+    def digest(self, sheets):
+        """Content address of a whole document, usable as its ETag."""
+        return hashlib.sha256('|'.join(key for key, _ in sheets).encode()).hexdigest()
+
+    def render(self, sheets, output):
+        """The document as bytes; only sheets missing from the cache are drawn."""
+        draw = svg_sheet if output == 'svg' else pdf_page
+        cached = self.cache.get_many([key for key, _ in sheets])
+        missing = {key: draw(data) for key, data in sheets if key not in cached}
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+        rendered = [cached[key] if key in cached else missing[key] for key, _ in sheets]
+        return svg_document(rendered) if output == 'svg' else pdf_document(rendered)
+
+grid_renderer = GridRenderer(
+    alias=settings.LOG_GRID['CACHE_ALIAS'],
+    timeout=settings.LOG_GRID['TIMEOUT_SECONDS'],
+)
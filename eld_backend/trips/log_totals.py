@@ -0,0 +1,128 @@
+"""DailyLog duty-status totals kept equal to the hours of the log's stored DutyEvents.
+
+Every event insert, edit and delete applies the hour difference it makes to its log's total
+columns with an UPDATE ... SET total = total + delta, so totals never need a scan of the events.
+Driving and on-duty deltas are passed on to DriverDaySummary. Single saves go through the
+DutyEvents signals; bulk writers call apply_event_deltas() themselves. Events without end_time
+count for nothing until they are closed. reconcile_log_totals() checks and repairs drift in bulk.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Sum
+
+from .conditional import touch_trips
+from .models import DailyLog, DutyEvents
+from .summaries import apply_deltas
+
+TOTAL_FIELDS = {
+    'off_duty': 'total_off_duty_time',
+    'sleeper_berth': 'total_sleeper_berth_time',
+    'driving': 'total_driving_time',
+    'on_duty': 'total_on_duty_time',
+}
+
+DRIFT_TOLERANCE_HOURS = 0.01  # generated logs store totals rounded to 2 decimals
+
+
+def event_hours(status, start_time, end_time):
+    """(total field, hours) an event contributes to its log, or None for an open event."""
+    if not end_time or not start_time:
+        return None
+    return TOTAL_FIELDS[status], (end_time - start_time).total_seconds() / 3600
+
+
+def add_event(deltas, daily_log_id, status, start_time, end_time, sign=1):
+    """Adds (sign=1) or removes (sign=-1) an event's hours to {log_id: {field: hours}}."""
+    contribution = event_hours(status, start_time, end_time)
+    if contribution and daily_log_id:
+        field, hours = contribution
+        deltas[daily_log_id][field] += sign * hours
+
+
+def event_deltas(events, sign=1):
+    deltas = defaultdict(lambda: defaultdict(float))
+    for event in events:
+        add_event(deltas, event.daily_log_id, event.duty_event_status, event.start_time, event.end_time, sign)
+    return deltas
+
+
+def apply_event_deltas(deltas):
+    """Applies {log_id: {total field: hours}} to DailyLog totals and the matching day summaries.
+
+    One UPDATE per log, plus one query for the logs' driver-days when driving or on-duty changed.
+    """
+    deltas = {log_id: {field: hours for field, hours in fields.items() if hours}
+              for log_id, fields in deltas.items()}
+    deltas = {log_id: fields for log_id, fields in deltas.items() if fields}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        for log_id, fields in deltas.items():
+            DailyLog.objects.filter(pk=log_id).update(
+                **{field: F(field) + hours for field, hours in fields.items()})
+
+        hours_logs = [log_id for log_id, fields in deltas.items()
+                      if 'total_driving_time' in fields or 'total_on_duty_time' in fields]
+        summary_deltas = defaultdict(lambda: [0.0, 0.0])
+        for log_id, driver_id, date in DailyLog.objects.filter(pk__in=hours_logs).values_list(
+                'pk', 'driver_id', 'date'):
+            delta = summary_deltas[(driver_id, date)]
+            delta[0] += deltas[log_id].get('total_driving_time', 0.0)
+            delta[1] += deltas[log_id].get('total_on_duty_time', 0.0)
+        apply_deltas(summary_deltas)
+
+
+def stored_event_totals(log_ids):
+    """{log_id: {total field: hours}} summed in the database from the logs' closed events."""
+    duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+    totals = defaultdict(lambda: dict.fromkeys(TOTAL_FIELDS.values(), 0.0))
+    rows = (
+        DutyEvents.objects.filter(daily_log__in=log_ids, end_time__isnull=False)
+        .order_by().values('daily_log_id', 'duty_event_status').annotate(total=Sum(duration))
+    )
+    for row in rows:
+        totals[row['daily_log_id']][TOTAL_FIELDS[row['duty_event_status']]] = row['total'].total_seconds() / 3600
+    return totals
+
+
+def reconcile_log_totals(logs=None, chunk_size=1000, repair=True, tolerance=DRIFT_TOLERANCE_HOURS):
+    """Compares every log's totals with its events, chunk by chunk in primary key order.
+
+    Each chunk locks its logs, sums their events in one query and, when repair is set, rewrites the
+    drifted logs with one bulk UPDATE and moves the day summaries by the same amounts. Yields
+    (logs checked, drifted logs) per chunk, so callers can report progress.
+    """
+    logs = (logs if logs is not None else DailyLog.objects.all()).order_by('pk')
+    fields = list(TOTAL_FIELDS.values())
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            chunk = logs.select_for_update() if repair else logs
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk.only('pk', 'trip_id', 'driver_id', 'date', *fields)[:chunk_size])
+            if not chunk:
+                return
+            last_pk = chunk[-1].pk
+
+            expected = stored_event_totals([log.pk for log in chunk])
+            drifted = []
+            summary_deltas = defaultdict(lambda: [0.0, 0.0])
+            for log in chunk:
+                totals = expected.get(log.pk) or dict.fromkeys(fields, 0.0)
+                if all(abs((getattr(log, field) or 0.0) - totals[field]) <= tolerance for field in fields):
+                    continue
+                delta = summary_deltas[(log.driver_id, log.date)]
+                delta[0] += totals['total_driving_time'] - (log.total_driving_time or 0.0)
+                delta[1] += totals['total_on_duty_time'] - (log.total_on_duty_time or 0.0)
+                for field in fields:
+                    setattr(log, field, round(totals[field], 4))
+                drifted.append(log)
+
+            if repair and drifted:
+                DailyLog.objects.bulk_update(drifted, fields, batch_size=chunk_size)
+                apply_deltas(summary_deltas)
+                touch_trips([log.trip_id for log in drifted])
+        yield len(chunk), drifted
@@ -0,0 +1,72 @@
+import json
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from trips.models import DailyLog, Driver, DutyEvents, Trip
+from trips.services import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Posts batches of duty events for many logs to the bulk ingestion endpoint, then replays them "
+            "as device retries, and reports events per second for both. Rolls back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000)
+        parser.add_argument('--logs', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        client = APIClient()
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            logs = self.seed(driver, options['logs'])
+            per_log = -(-options['events'] // len(logs))
+            step = timedelta(hours=24) / per_log
+            events = []
+            for log in logs:
+                midnight = timezone.make_aware(datetime.combine(log.date, datetime.min.time()))
+                events += [{
+                    'client_event_id': str(uuid.uuid4()), 'daily_log': str(log.id),
+                    'duty_event_status': 'driving' if i % 2 else 'on_duty', 'location': 'On Route',
+                    'start_time': (midnight + i * step).isoformat(),
+                    'end_time': (midnight + (i + 1) * step).isoformat(),
+                } for i in range(per_log)]
+            events = events[:options['events']]
+            batches = [events[i:i + options['batch_size']] for i in range(0, len(events), options['batch_size'])]
+            payloads = [json.dumps({'events': batch}) for batch in batches]
+
+            self.stdout.write(f"{'pass':>8} {'events':>8} {'batches':>8} {'seconds':>8} {'events/s':>10}")
+            for label in ('ingest', 'retry'):
+                started = time.perf_counter()
+                for payload in payloads:
+                    response = client.post('/api/events/bulk/', payload, content_type='application/json')
+                    if response.status_code not in (200, 201):
+                        self.stderr.write(f"Unexpected {response.status_code}: {response.content[:300]!r}")
+                        return
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{label:>8} {len(events):>8} {len(batches):>8} {elapsed:>8.2f} "
+                                  f"{len(events) / elapsed:>10,.0f}")
+
+            stored = DutyEvents.objects.filter(daily_log__in=logs).count()
+            self.stdout.write(f"{stored} events stored")
+            transaction.set_rollback(True)
+
+    def seed(self, driver, count):
+        trip = Trip.objects.create(driver=driver, current_location='A', pickup_location='A',
+                                   dropoff_location='B', current_cycle_used=0, status='ready')
+        first_day = date.today() - timedelta(days=count)
+        return DailyLog.objects.bulk_create([
+            DailyLog(trip=trip, driver=driver, date=first_day + timedelta(days=i), total_driving_miles=0)
+            for i in range(count)
+        ], batch_size=BULK_BATCH_SIZE)
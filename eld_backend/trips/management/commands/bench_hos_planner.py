@@ -0,0 +1,39 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trips import hos_calculator
+from trips.hos_calculator import HOSRules, trip_tasks
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark for the HOS planner: plans random trips and reports trips per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=20000)
+        parser.add_argument('--max-miles', type=int, default=3000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rules = HOSRules.from_settings(settings.ELD_SETTINGS)
+
+        workloads = []
+        for _ in range(options['trips']):
+            miles = rng.uniform(50, options['max_miles'])
+            hours = miles / rng.uniform(45, 60)
+            workloads.append((trip_tasks(miles, hours), rng.uniform(0, 69)))
+
+        segments = 0
+        started = time.perf_counter()
+        for tasks, cycle_used in workloads:
+            segments += len(hos_calculator.plan(tasks, rules, cycle_used).segments)
+        elapsed = time.perf_counter() - started
+
+        count = len(workloads)
+        self.stdout.write(
+            f"Planned {count} trips ({segments} segments) in {elapsed:.3f}s: "
+            f"{count / elapsed:,.0f} trips/s, {elapsed / count * 1e6:.1f} us/trip"
+        )
@@ -0,0 +1,50 @@
+import asyncio
+import resource
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from trips.live import broker, event_stream, publish_many
+from trips.models import LiveEvent
+
+
+class Command(BaseCommand):
+    help = ("Opens many idle live streams in one process, publishes events to their channels and reports "
+            "how long fan-out to every stream takes. Deletes the events it published.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--streams', type=int, default=5000)
+        parser.add_argument('--channels', type=int, default=500)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        first_id = LiveEvent.objects.aggregate(latest=Max('pk'))['latest'] or 0
+        try:
+            asyncio.run(self.run(options['streams'], options['channels'], options['rounds']))
+        finally:
+            LiveEvent.objects.filter(pk__gt=first_id, channel__startswith='bench:').delete()
+
+    async def run(self, stream_count, channel_count, rounds):
+        channels = [f'bench:{i}' for i in range(channel_count)]
+        started = time.perf_counter()
+        streams = [event_stream([channels[i % channel_count]], list) for i in range(stream_count)]
+        for stream in streams:
+            await anext(stream)  # retry hint; the stream is subscribed from here on
+        opened = time.perf_counter() - started
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"{broker.subscriber_count} streams on {channel_count} channels opened in "
+                          f"{opened:.2f}s, max RSS {memory:.0f} MB")
+
+        self.stdout.write(f"{'round':>6} {'events':>8} {'delivered':>10} {'seconds':>8}")
+        for round_number in range(1, rounds + 1):
+            reads = [asyncio.ensure_future(anext(stream)) for stream in streams]
+            started = time.perf_counter()
+            await sync_to_async(publish_many)([(channel, 'bench', {'round': round_number}) for channel in channels])
+            delivered = await asyncio.gather(*reads)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{round_number:>6} {channel_count:>8} {len(delivered):>10} {elapsed:>8.3f}")
+
+        for stream in streams:
+            await stream.aclose()
@@ -0,0 +1,75 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from trips.exports import export_chunks, export_rows
+from trips.management.commands.export_logs import CountingRows, peak_rss_mb
+from trips.models import DailyLog, Driver, Trip
+from trips.services import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Seeds duty events inside a transaction, streams them through the CSV and NDJSON exporters "
+            "into a null sink and reports time to first byte, throughput and peak RSS. Rolls back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000000, help="Use 10000000 for the full-size run.")
+        parser.add_argument('--events-per-log', type=int, default=20)
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        with transaction.atomic():
+            self.seed(driver, options['events'], options['events_per_log'])
+            self.stdout.write(f"peak RSS after seeding: {peak_rss_mb():.0f} MB")
+            self.stdout.write(f"{'output':>7} {'rows':>10} {'MB':>8} {'first byte ms':>14} {'rows/s':>10} "
+                              f"{'peak RSS MB':>12}")
+            for output in ('csv', 'ndjson'):
+                rows = CountingRows(export_rows(driver_ids=[driver.pk]))
+                written = 0
+                first_byte = None
+                started = time.perf_counter()
+                for chunk in export_chunks(output, rows):
+                    if first_byte is None and rows.count:
+                        first_byte = (time.perf_counter() - started) * 1000
+                    written += len(chunk)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{output:>7} {rows.count:>10} {written / 1e6:>8.1f} {first_byte or 0:>14.1f} "
+                                  f"{rows.count / elapsed:>10,.0f} {peak_rss_mb():>12.0f}")
+            transaction.set_rollback(True)
+
+    def seed(self, driver, events, per_log):
+        started = time.perf_counter()
+        trip = Trip.objects.create(driver=driver, current_location='A', pickup_location='A',
+                                   dropoff_location='B', current_cycle_used=0, status='ready')
+        logs = -(-events // per_log)
+        first_day = date.today() - timedelta(days=logs)
+        for first in range(0, logs, BULK_BATCH_SIZE * 10):
+            DailyLog.objects.bulk_create([
+                DailyLog(trip=trip, driver=driver, date=first_day + timedelta(days=i), total_driving_miles=0)
+                for i in range(first, min(first + BULK_BATCH_SIZE * 10, logs))
+            ], batch_size=BULK_BATCH_SIZE)
+
+        # Events are generated in the database; building millions of model instances would dominate RSS
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "INSERT INTO trips_dutyevents (duty_event_status, daily_log_id, start_time, end_time, "
+                    "truck_moved, location, remarks, created_at) "
+                    "SELECT 'driving', l.id, l.date + i * interval '1 hour', NULL, true, 'On Route', '', now() "
+                    "FROM trips_dailylog l CROSS JOIN generate_series(0, %s - 1) i WHERE l.trip_id = %s",
+                    [per_log, trip.pk])
+            else:
+                cursor.execute(
+                    "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < %s - 1) "
+                    "INSERT INTO trips_dutyevents (duty_event_status, daily_log_id, start_time, end_time, "
+                    "truck_moved, location, remarks, created_at) "
+                    "SELECT 'driving', l.id, datetime(l.date, '+' || n.i || ' hours'), NULL, 1, 'On Route', '', "
+                    "datetime('now') FROM trips_dailylog l, n WHERE l.trip_id = %s",
+                    [per_log, trip.pk.hex])
+        self.stdout.write(f"Seeded {logs} logs and {logs * per_log} events in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,69 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from trips.log_grid import grid_renderer
+from trips.models import DailyLog, Driver, DutyEvents, Trip
+
+
+class Command(BaseCommand):
+    help = ("Renders a month of daily log sheets as SVG and PDF through the batch endpoint, cold, warm "
+            "(cached sheets) and revalidated (304), and reports size and latency. Rolls back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=31)
+        parser.add_argument('--events-per-day', type=int, default=12)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        client = APIClient()
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            trip = self.seed(driver, options['days'], options['events_per_day'])
+            url = f'/api/trips/{trip.id}/grid/'
+            self.stdout.write(f"{'output':>7} {'sheets':>7} {'KB':>8} {'cold ms':>8} {'warm ms':>8} {'304 ms':>8}")
+            for output in ('svg', 'pdf'):
+                grid_renderer.cache.clear()
+                started = time.perf_counter()
+                response = client.get(url, {'output': output})
+                cold = (time.perf_counter() - started) * 1000
+
+                warm = revalidated = float('inf')
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    client.get(url, {'output': output})
+                    warm = min(warm, (time.perf_counter() - started) * 1000)
+                    started = time.perf_counter()
+                    client.get(url, {'output': output}, HTTP_IF_NONE_MATCH=response['ETag'])
+                    revalidated = min(revalidated, (time.perf_counter() - started) * 1000)
+                self.stdout.write(f"{output:>7} {options['days']:>7} {len(response.content) / 1024:>8.0f} "
+                                  f"{cold:>8.1f} {warm:>8.1f} {revalidated:>8.1f}")
+            transaction.set_rollback(True)
+
+    def seed(self, driver, days, per_day):
+        trip = Trip.objects.create(driver=driver, current_location='A', pickup_location='A',
+                                   dropoff_location='B', current_cycle_used=0, status='ready')
+        statuses = ['off_duty', 'on_duty', 'driving', 'on_duty', 'driving', 'sleeper_berth']
+        step = timedelta(hours=24) / per_day
+        first_day = date.today() - timedelta(days=days)
+        events = []
+        for day in range(days):
+            log = DailyLog.objects.create(trip=trip, driver=driver, date=first_day + timedelta(days=day),
+                                          total_driving_miles=500)
+            midnight = timezone.make_aware(datetime.combine(log.date, datetime.min.time()))
+            events += [
+                DutyEvents(daily_log=log, duty_event_status=statuses[i % len(statuses)], location=f'Stop {i}',
+                           start_time=midnight + i * step, end_time=midnight + (i + 1) * step)
+                for i in range(per_day)
+            ]
+        DutyEvents.objects.bulk_create(events)
+        return trip
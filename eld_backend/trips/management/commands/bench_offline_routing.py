@@ -0,0 +1,71 @@
+import os
+import random
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from trips.road_graph import RoadGraph, haversine_m, synthetic_grid
+
+
+class Command(BaseCommand):
+    help = ("Measures offline routing throughput (queries per second) on a road graph file, by default a "
+            "synthetic grid the size of a continental road network's highway core over the continental US.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--graph', help="Graph file to benchmark instead of a synthetic grid.")
+        parser.add_argument('--columns', type=int, default=1600)
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        path = options['graph']
+        if not path:
+            path = os.path.join(tempfile.mkdtemp(), 'grid.bin')
+            started = time.perf_counter()
+            synthetic_grid(path, options['columns'], options['rows'])
+            self.stdout.write(f"Built a {options['columns']}x{options['rows']} grid in "
+                              f"{time.perf_counter() - started:.1f}s")
+        try:
+            self.run(path, options['queries'], random.Random(options['seed']))
+        finally:
+            if not options['graph']:
+                os.remove(path)
+                os.rmdir(os.path.dirname(path))
+
+    def run(self, path, queries, rng):
+        started = time.perf_counter()
+        graph = RoadGraph(path)
+        self.stdout.write(f"Mapped {graph.node_count} nodes / {graph.edge_count} edges "
+                          f"({os.path.getsize(path) / 2 ** 20:.0f} MB) in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        def random_node():
+            return rng.randrange(graph.node_count)
+
+        def pairs(min_km, max_km):
+            found = []
+            while len(found) < queries:
+                source, target = random_node(), random_node()
+                km = haversine_m(*graph.coordinates(source), *graph.coordinates(target)) / 1000
+                if min_km <= km <= max_km:
+                    found.append((source, target))
+            return found
+
+        self.stdout.write(f"{'queries':<26} {'count':>6} {'qps':>8} {'avg ms':>8} {'max ms':>8} {'road km':>8}")
+        for label, min_km, max_km in (('regional (<300 km)', 0, 300), ('long haul (1000-2000 km)', 1000, 2000),
+                                      ('cross country (>3000 km)', 3000, 10000)):
+            timings, meters = [], 0
+            for source, target in pairs(min_km, max_km):
+                started = time.perf_counter()
+                path_nodes, _, length = graph.shortest_path(source, target)
+                timings.append(time.perf_counter() - started)
+                meters += length
+            total = sum(timings)
+            self.stdout.write(f"{label:<26} {len(timings):>6} {len(timings) / total:>8.1f} "
+                              f"{total / len(timings) * 1000:>8.1f} {max(timings) * 1000:>8.1f} "
+                              f"{meters / len(timings) / 1000:>8.0f}")
+        memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"Max RSS {memory:.0f} MB")
+        graph.close()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from trips.fake_ors import make_server, start_in_thread
+from trips.geocoding import geocoding_cache, normalize_address
+from trips.models import GeocodeCache, Trip
+from trips.ors import get_async_ors_client, get_ors_client
+from trips.services import aget_route_data, get_route_data
+
+
+class Command(BaseCommand):
+    help = ("Routes trips against a local fake ORS with the given latency, first one call after another "
+            "with the sync client, then with the async client (concurrent geocoding, many trips in flight), "
+            "and reports wall time per trip. Deletes the geocoding cache entries it creates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=20)
+        parser.add_argument('--latency-ms', type=float, default=150)
+        parser.add_argument('--concurrency', type=int, default=20, help="Trips routed at once on the async path.")
+
+    def handle(self, *args, **options):
+        server = make_server(latency=options['latency_ms'] / 1000)
+        base_url = start_in_thread(server)
+        run = uuid.uuid4().hex[:8]
+        addresses = []
+        try:
+            # No rate limits: the fake server has no quota to protect
+            with override_settings(ORS={**settings.ORS, 'BASE_URL': base_url, 'RATE_LIMITS_PER_MINUTE': {}}):
+                self.stdout.write(f"{'path':>22} {'trips':>6} {'seconds':>8} {'ms/trip':>8}")
+                for label, route in (('sync, sequential', self.route_sync),
+                                     ('async, 1 in flight', lambda trips: self.route_async(trips, 1)),
+                                     (f"async, {options['concurrency']} in flight",
+                                      lambda trips: self.route_async(trips, options['concurrency']))):
+                    trips = self.trips(f'{run}-{len(addresses)}', options['trips'])
+                    addresses += [text for trip in trips for text in (trip.pickup_location, trip.dropoff_location)]
+                    started = time.perf_counter()
+                    route(trips)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{label:>22} {len(trips):>6} {elapsed:>8.2f} {elapsed / len(trips) * 1000:>8.0f}")
+        finally:
+            server.shutdown()
+            GeocodeCache.objects.filter(normalized_query__in=[normalize_address(text) for text in addresses]).delete()
+            geocoding_cache.memory.clear()
+
+    @staticmethod
+    def trips(prefix, count):
+        # Unsaved trips with unique addresses, so every geocode misses the cache
+        return [Trip(current_location='Yard', pickup_location=f'Pickup {prefix}-{i}',
+                     dropoff_location=f'Dropoff {prefix}-{i}') for i in range(count)]
+
+    @staticmethod
+    def route_sync(trips):
+        client = get_ors_client()
+        for trip in trips:
+            get_route_data(trip, client=client)
+
+    @staticmethod
+    def route_async(trips, concurrency):
+        async def run():
+            limit = asyncio.Semaphore(concurrency)
+            client = get_async_ors_client()
+
+            async def route(trip):
+                async with limit:
+                    await aget_route_data(trip, client)
+            await asyncio.gather(*(route(trip) for trip in trips))
+        asyncio.run(run())
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from trips.models import Driver, Trip
+from trips.pagination import encode_cursor
+from trips.services import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Compares page-number (OFFSET + COUNT) and cursor pagination latency on GET /api/trips/ at "
+            "increasing depths. Seeds the trips inside a transaction and rolls them back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=100000, help="Use 1000000 for the full-size run.")
+        parser.add_argument('--depths', type=float, nargs='+', default=[0, 0.25, 0.5, 0.99],
+                            help="Page positions as fractions of the table.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        client = APIClient()
+        page_size = 20
+
+        def timed(url, params):
+            best = float('inf')
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                response = client.get(url, params)
+                best = min(best, time.perf_counter() - started)
+            assert response.status_code == 200, response.status_code
+            return best * 1000
+
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            self.seed(driver, options['trips'])
+            total = Trip.objects.count()
+
+            self.stdout.write(f"{total} trips, page size {page_size}")
+            self.stdout.write(f"{'row':>10} {'page-number ms':>15} {'cursor ms':>10}")
+            url = '/api/trips/'
+            for depth in options['depths']:
+                offset = min(int(total * depth), total - page_size)
+                page = offset // page_size + 1
+                previous = (Trip.objects.order_by('updated_at', 'id')
+                            .values_list('updated_at', 'id')[max(offset - 1, 0)])
+                cursor_params = {'cursor': encode_cursor(previous)} if offset else {}
+
+                offset_ms = timed(url, {'page': page})
+                cursor_ms = timed(url, cursor_params)
+                self.stdout.write(f"{offset:>10} {offset_ms:>15.1f} {cursor_ms:>10.1f}")
+
+            transaction.set_rollback(True)
+
+    def seed(self, driver, count):
+        started = time.perf_counter()
+        for first in range(0, count, BULK_BATCH_SIZE * 10):
+            Trip.objects.bulk_create([
+                Trip(driver=driver, current_location='Chicago, IL', pickup_location='Chicago, IL',
+                     dropoff_location='Dallas, TX', current_cycle_used=0, status='ready')
+                for _ in range(first, min(first + BULK_BATCH_SIZE * 10, count))
+            ], batch_size=BULK_BATCH_SIZE)
+        # auto_now stamps every row with "now"; spread them out like real history
+        with connection.cursor() as cursor:
+            table = Trip._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"UPDATE {table} SET updated_at = updated_at - random() * interval '365 days'")
+            else:
+                cursor.execute(f"UPDATE {table} SET updated_at = datetime(updated_at, '-' || abs(random() % 31536000) || ' seconds')")
+            cursor.execute(f'ANALYZE {table}')
+        self.stdout.write(f"Seeded {count} trips in {time.perf_counter() - started:.1f}s")
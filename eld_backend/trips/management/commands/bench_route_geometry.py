@@ -0,0 +1,87 @@
+import gzip
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from trips.geometry import MAX_ZOOM_LEVEL, decode_polyline, zoom_levels
+from trips.models import Driver, Trip
+from trips.response_cache import response_cache
+from trips.services import save_route
+
+
+def _synthetic_route(points, seed):
+    """A noisy Los Angeles -> New York line with about as many vertices as a long ORS route."""
+    rng = random.Random(seed)
+    lon, lat = -118.24, 34.05
+    step_lon, step_lat = (-74.0 - lon) / points, (40.71 - lat) / points
+    coordinates = []
+    for _ in range(points):
+        lon += step_lon + rng.uniform(-0.0015, 0.0015)
+        lat += step_lat + rng.uniform(-0.0015, 0.0015)
+        coordinates.append([round(lon, 5), round(lat, 5)])
+    return coordinates
+
+
+class Command(BaseCommand):
+    help = ("Reports route endpoint payload size (raw and gzip), vertex count and latency for every zoom "
+            "level, as GeoJSON and as an encoded polyline. Rolls back the trip it creates.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=30000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        coordinates = _synthetic_route(options['points'], options['seed'])
+        started = time.perf_counter()
+        levels = zoom_levels(coordinates)
+        self.stdout.write(f"{len(coordinates)} vertices, {len(levels)} levels precomputed in "
+                          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+        client = APIClient()
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            trip = Trip.objects.create(driver=driver, current_location='Los Angeles, CA',
+                                       pickup_location='Los Angeles, CA', dropoff_location='New York, NY',
+                                       current_cycle_used=0, status='ready')
+            save_route(trip, {
+                'distance_miles': 2790, 'duration_hours': 41, 'levels': levels,
+                'pickup_coords': coordinates[0], 'dropoff_coords': coordinates[-1],
+                'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            })
+            url = f'/api/trips/{trip.id}/route/'
+
+            self.stdout.write(f"{'zoom':>5} {'encoding':>9} {'vertices':>9} {'bytes':>10} {'gzip':>9} "
+                              f"{'cold ms':>8} {'warm ms':>8}")
+            for zoom in [*range(0, MAX_ZOOM_LEVEL + 1, 2), None]:
+                for encoding in ('geojson', 'polyline'):
+                    params = {'encoding': encoding}
+                    if zoom is not None:
+                        params['zoom'] = zoom
+
+                    response_cache.cache.clear()
+                    started = time.perf_counter()
+                    response = client.get(url, params)
+                    cold = (time.perf_counter() - started) * 1000
+                    warm = float('inf')
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        client.get(url, params)
+                        warm = min(warm, (time.perf_counter() - started) * 1000)
+
+                    body = response.content
+                    vertices = len(response.data['geometry']['coordinates'] if encoding == 'geojson'
+                                   else decode_polyline(response.data['polyline']))
+                    label = 'full' if zoom is None else zoom
+                    self.stdout.write(f"{label:>5} {encoding:>9} {vertices:>9} {len(body):>10} "
+                                      f"{len(gzip.compress(body)):>9} {cold:>8.1f} {warm:>8.1f}")
+
+            transaction.set_rollback(True)
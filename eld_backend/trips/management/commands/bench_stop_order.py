@@ -0,0 +1,59 @@
+import itertools
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trips.road_graph import haversine_m
+from trips.stop_order import feasible, improve, nearest_neighbour, path_cost, precedence
+
+TRUCK_METERS_PER_SECOND = 24  # about 55 mph over great-circle distance
+
+
+class Command(BaseCommand):
+    help = ("Microbenchmark for multi-stop ordering: random loads across the continental US, comparing the "
+            "nearest-neighbour order, the improved order and (for small trips) the exact optimum.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loads', type=int, nargs='+', default=[2, 3, 4, 8, 12])
+        parser.add_argument('--trips', type=int, default=50)
+        parser.add_argument('--exact-up-to', type=int, default=8, help="Largest stop count solved exactly.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        max_rounds = settings.STOP_ORDER['MAX_ROUNDS']
+        self.stdout.write(f"{'loads':>6} {'stops':>6} {'greedy +%':>10} {'improved +%':>12} {'ms/trip':>8}")
+        for loads in options['loads']:
+            greedy_gap = improved_gap = elapsed = 0.0
+            exact = 2 * loads <= options['exact_up_to']
+            for _ in range(options['trips']):
+                cost, stops = self.random_trip(rng, loads)
+                before = precedence(stops)
+                started = time.perf_counter()
+                greedy = nearest_neighbour(cost, before)
+                order = improve(greedy, cost, before, max_rounds)
+                elapsed += time.perf_counter() - started
+                # Without the exact optimum, gaps are measured against the improved order
+                best = self.optimum(cost, before) if exact else path_cost(order, cost)
+                greedy_gap += path_cost(greedy, cost) / best - 1
+                improved_gap += path_cost(order, cost) / best - 1
+            trips = options['trips']
+            improved = f"{improved_gap / trips * 100:.1f}" if exact else '-'
+            self.stdout.write(f"{loads:>6} {2 * loads:>6} {greedy_gap / trips * 100:>10.1f} {improved:>12} "
+                              f"{elapsed / trips * 1000:>8.2f}")
+
+    @staticmethod
+    def random_trip(rng, loads):
+        points = [(rng.uniform(-122, -72), rng.uniform(30, 47)) for _ in range(2 * loads + 1)]
+        cost = [[haversine_m(*a, *b) / TRUCK_METERS_PER_SECOND for b in points] for a in points]
+        stops = [{'type': 'current'}]
+        stops += [{'type': 'pickup', 'load': str(load)} for load in range(loads)]
+        stops += [{'type': 'dropoff', 'load': str(load)} for load in range(loads)]
+        return cost, stops
+
+    @staticmethod
+    def optimum(cost, before):
+        return min(path_cost([0, *order], cost) for order in itertools.permutations(range(1, len(cost)))
+                   if feasible([0, *order], before))
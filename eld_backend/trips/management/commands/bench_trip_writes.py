@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from trips.models import Driver, Trip
+from trips.services import build_trip_plan, save_route, save_trip_plan
+
+
+def _row_at_a_time(trip, route_data, plan):
+    """The previous write path: one INSERT per stop, log and event."""
+    save_route(trip, route_data)
+    for obj in plan.stops + plan.daily_logs + plan.duty_events:
+        obj.save(force_insert=True)
+
+
+def _bulk(trip, route_data, plan):
+    save_trip_plan(trip, route_data, plan)
+
+
+def _fake_route(miles):
+    # ~50 mph average, straight-line geometry
+    return {
+        'distance_miles': miles,
+        'duration_hours': round(miles / 50, 2),
+        'pickup_coords': [-87.63, 41.88],
+        'dropoff_coords': [-118.24, 34.05],
+        'geometry': {'type': 'LineString', 'coordinates': [[-87.63, 41.88], [-118.24, 34.05]]},
+    }
+
+
+class Command(BaseCommand):
+    help = "Compares row-at-a-time and bulk trip plan writes (round trips and wall time). Rolls back all rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--miles', type=int, nargs='+', default=[500, 1000, 3000, 6000])
+        parser.add_argument('--latency-ms', type=float, default=0.0,
+                            help="Simulated network latency added to every query, e.g. 5 for a remote Postgres.")
+
+    def handle(self, *args, **options):
+        driver = Driver.objects.select_related('user').first()
+        if driver is None:
+            self.stderr.write("Create at least one Driver before running the benchmark.")
+            return
+
+        latency = options['latency_ms'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        self.stdout.write(f"{'miles':>6} {'rows':>6} {'mode':>14} {'queries':>8} {'ms':>10}")
+        for miles in options['miles']:
+            route_data = _fake_route(miles)
+            for label, writer in (('row-at-a-time', _row_at_a_time), ('bulk', _bulk)):
+                with transaction.atomic():
+                    trip = Trip.objects.create(
+                        driver=driver, current_location='Chicago, IL', pickup_location='Chicago, IL',
+                        dropoff_location='Los Angeles, CA', current_cycle_used=0,
+                    )
+                    plan = build_trip_plan(trip, route_data)
+                    rows = len(plan.stops) + len(plan.daily_logs) + len(plan.duty_events)
+
+                    with connection.execute_wrapper(delay), CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        writer(trip, route_data, plan)
+                        elapsed = (time.perf_counter() - started) * 1000
+
+                    transaction.set_rollback(True)
+
+                self.stdout.write(f"{miles:>6} {rows:>6} {label:>14} {len(queries):>8} {elapsed:>10.1f}")
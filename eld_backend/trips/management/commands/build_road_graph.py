@@ -0,0 +1,29 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.road_graph import build_from_osm
+
+
+class Command(BaseCommand):
+    help = ("Builds the offline routing graph from an OpenStreetMap XML extract (.osm, .osm.bz2 or .osm.gz). "
+            "Convert .pbf extracts first, e.g. `osmium tags-filter in.pbf w/highway n/place -o out.osm.bz2`.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="OSM XML extract.")
+        parser.add_argument('--output', help="Graph file to write (default: ROUTING['GRAPH_PATH']).")
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.ROUTING['GRAPH_PATH']
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        started = time.perf_counter()
+        try:
+            # Written next to the live graph and swapped in, so running processes keep their mapping
+            nodes, edges, places = build_from_osm(options['source'], output + '.tmp')
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        os.replace(output + '.tmp', output)
+        self.stdout.write(f"Wrote {output}: {nodes} nodes, {edges} edges, {places} places, "
+                          f"{os.path.getsize(output) / 2 ** 20:.1f} MB in {time.perf_counter() - started:.1f}s")
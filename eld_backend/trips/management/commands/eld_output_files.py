@@ -0,0 +1,43 @@
+import time
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from trips.eld_output import default_window, write_fleet_files
+from trips.models import Driver
+
+
+class Command(BaseCommand):
+    help = "Writes ELD output files (49 CFR 395 Subpart B) for one driver or the whole fleet, one file per driver."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help="Only this driver id (repeatable); default is every driver.")
+        parser.add_argument('--home-operation-center')
+        parser.add_argument('--start', type=parse_date, help="First date, YYYY-MM-DD (default: 7 days ago).")
+        parser.add_argument('--end', type=parse_date, help="Last date, YYYY-MM-DD (default: today).")
+        parser.add_argument('--comment', default='')
+        parser.add_argument('--processes', type=int, default=1)
+
+    def handle(self, *args, **options):
+        start, end = default_window(ZoneInfo(settings.ELD_OUTPUT['CARRIER_TIME_ZONE']))
+        start, end = options['start'] or start, options['end'] or end
+
+        drivers = Driver.objects.order_by('pk')
+        if options['drivers']:
+            drivers = drivers.filter(pk__in=options['drivers'])
+        if options['home_operation_center']:
+            drivers = drivers.filter(home_operation_center=options['home_operation_center'])
+        driver_ids = list(drivers.values_list('pk', flat=True))
+
+        started = time.perf_counter()
+        events = 0
+        for driver_id, path, count in write_fleet_files(driver_ids, start, end, options['directory'],
+                                                        options['comment'], options['processes']):
+            events += count
+            self.stdout.write(f"{path}: {count} events")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Wrote {len(driver_ids)} files ({events} events) for {start}..{end} in {elapsed:.1f}s")
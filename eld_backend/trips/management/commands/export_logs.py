@@ -0,0 +1,78 @@
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from trips.exports import EXPORT_FORMATS, export_chunks, export_rows
+
+
+class Command(BaseCommand):
+    help = ("Streams daily logs and duty events to a file (or stdout) as CSV or NDJSON, then reports "
+            "rows, throughput and peak RSS on stderr.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help="Only export this driver id (repeatable).")
+        parser.add_argument('--home-operation-center')
+        parser.add_argument('--start', help="First date, YYYY-MM-DD.")
+        parser.add_argument('--end', help="Last date, YYYY-MM-DD.")
+        parser.add_argument('--file', help="Destination path; stdout when omitted.")
+
+    def handle(self, *args, **options):
+        start, end = (parse_date_option(options, key) for key in ('start', 'end'))
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end")
+        rows = export_rows(options['drivers'], options['home_operation_center'], start, end)
+        counted = CountingRows(rows)
+
+        started = time.perf_counter()
+        destination = open(options['file'], 'wb') if options['file'] else sys.stdout.buffer
+        written = 0
+        try:
+            for chunk in export_chunks(options['output'], counted):
+                destination.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['file']:
+                destination.close()
+            else:
+                destination.flush()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f"Exported {counted.count} rows, {written / 1e6:.1f} MB in {elapsed:.1f}s "
+            f"({counted.count / elapsed if elapsed else 0:,.0f} rows/s), peak RSS {peak_rss_mb():.0f} MB"
+        )
+
+
+def parse_date_option(options, key):
+    value = options[key]
+    try:
+        parsed = parse_date(value) if value else None
+    except ValueError:  # well formed but not a real date, like 2024-13-01
+        parsed = None
+    if value and parsed is None:
+        raise CommandError(f"--{key} must be a date, YYYY-MM-DD")
+    return parsed
+
+
+class CountingRows:
+    """Passes rows through while counting them."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from trips.summaries import rebuild_day_summaries
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-driver, per-day duty summaries from DailyLog totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help="Only rebuild this driver id (repeatable).")
+
+    def handle(self, *args, **options):
+        count = rebuild_day_summaries(options['drivers'])
+        self.stdout.write(f"Rebuilt {count} driver-day summaries")
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trips.clocks import REBUILD_LOOKBACK, rebuild_clocks
+
+
+class Command(BaseCommand):
+    help = f"Rebuilds every driver's HOS clock by replaying the last {REBUILD_LOOKBACK.days} days of duty events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help="Only rebuild this driver id (repeatable).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_clocks(options['drivers'])
+        self.stdout.write(f"Rebuilt {count} driver clocks in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trips.log_totals import reconcile_log_totals
+from trips.models import DailyLog
+
+
+class Command(BaseCommand):
+    help = ("Checks every DailyLog's duty-status totals against the hours of its duty events, in primary "
+            "key chunks, and repairs drifted logs (and their day summaries) unless --dry-run is given.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help="Only check this driver id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+        parser.add_argument('--verbose-logs', action='store_true', help="List every drifted log.")
+
+    def handle(self, *args, **options):
+        logs = DailyLog.objects.all()
+        if options['drivers']:
+            logs = logs.filter(driver_id__in=options['drivers'])
+
+        started = time.perf_counter()
+        checked = drifted = 0
+        for count, chunk_drifted in reconcile_log_totals(logs, options['chunk_size'], repair=not options['dry_run']):
+            checked += count
+            drifted += len(chunk_drifted)
+            if options['verbose_logs']:
+                for log in chunk_drifted:
+                    self.stdout.write(f"  {log.pk} ({log.date}): driving {log.total_driving_time:.2f}, "
+                                      f"on duty {log.total_on_duty_time:.2f}")
+            self.stdout.write(f"{checked} logs checked, {drifted} drifted")
+
+        action = 'found' if options['dry_run'] else 'repaired'
+        self.stdout.write(f"Done: {checked} logs checked, {drifted} {action} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from trips.fake_ors import make_server
+
+
+class Command(BaseCommand):
+    help = ("Serves a local stand-in for the OpenRouteService geocoding and directions endpoints, with "
+            "injectable latency. Point ORS_BASE_URL at it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+        parser.add_argument('--latency-ms', type=float, default=0, help="Delay added to every response.")
+        parser.add_argument('--jitter-ms', type=float, default=0, help="Uniform +/- variation of the delay.")
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['latency_ms'] / 1000, options['jitter_ms'] / 1000)
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Fake ORS listening on http://{host}:{port} "
+                          f"(latency {options['latency_ms']:.0f} ms +/- {options['jitter_ms']:.0f} ms)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
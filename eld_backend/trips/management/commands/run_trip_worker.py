@@ -0,0 +1,46 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from trips.jobs import requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued trip jobs (route and daily log generation) from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--max-jobs', type=int, default=None, help="Exit after processing this many jobs.")
+        parser.add_argument('--poll-interval', type=float, default=settings.TRIP_JOBS['POLL_INTERVAL_SECONDS'])
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Trip worker {worker_id} started")
+        processed = 0
+        while not self.stopping:
+            close_old_connections()
+            requeue_stale_jobs()
+
+            remaining = None if options['max_jobs'] is None else options['max_jobs'] - processed
+            done = run_pending_jobs(worker_id, max_jobs=remaining, should_stop=lambda: self.stopping)
+            processed += done
+
+            if options['once'] or (options['max_jobs'] is not None and processed >= options['max_jobs']):
+                break
+            if not done:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(f"Trip worker {worker_id} stopped after {processed} job(s)")
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
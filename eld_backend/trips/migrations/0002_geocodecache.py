@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_query', models.CharField(max_length=255, unique=True)),
+                ('query', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('longitude', models.FloatField()),
+                ('latitude', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='dailylog',
+            name='load_number',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='dailylog',
+            name='shipper_commodity',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='stop',
+            name='arrival_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='stop',
+            name='depature_time',
+            field=models.DateTimeField(),
+        ),
+    ]
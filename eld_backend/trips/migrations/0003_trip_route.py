@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='dropoff_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='dropoff_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='pickup_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='pickup_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_distance_miles',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_duration_hours',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_polyline',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_day_summaries(apps, schema_editor):
+    DailyLog = apps.get_model('trips', 'DailyLog')
+    DriverDaySummary = apps.get_model('trips', 'DriverDaySummary')
+    rows = DailyLog.objects.order_by().values('driver_id', 'date').annotate(
+        driving=models.Sum('total_driving_time'), on_duty=models.Sum('total_on_duty_time'))
+    DriverDaySummary.objects.bulk_create(
+        [DriverDaySummary(driver_id=row['driver_id'], date=row['date'], driving_hours=row['driving'] or 0,
+                          on_duty_hours=row['on_duty'] or 0) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_trip_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverDaySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('driving_hours', models.FloatField(default=0)),
+                ('on_duty_hours', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_summaries', to='trips.driver')),
+            ],
+            options={
+                'ordering': ['driver', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('driver', 'date'), name='unique_driver_day_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_day_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_driver_day_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['driver', 'date'], name='dailylog_driver_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['trip', 'date'], name='dailylog_trip_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutyevents',
+            index=models.Index(fields=['daily_log', 'start_time'], name='dutyevent_log_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stop',
+            index=models.Index(fields=['trip', 'arrival_time'], name='stop_trip_arrival_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['updated_at', 'id'], name='trip_updated_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+from trips.geometry import decode_polyline, zoom_levels
+
+
+def backfill_route_levels(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    for trip in Trip.objects.exclude(route_polyline='').only('pk', 'route_polyline').iterator(chunk_size=200):
+        # update() keeps updated_at, the route itself did not change
+        Trip.objects.filter(pk=trip.pk).update(route_levels=zoom_levels(decode_polyline(trip.route_polyline)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0006_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_levels',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(backfill_route_levels, migrations.RunPython.noop),
+    ]
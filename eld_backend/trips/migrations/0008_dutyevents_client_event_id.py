@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_trip_route_levels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dutyevents',
+            name='client_event_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
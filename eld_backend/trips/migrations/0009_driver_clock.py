@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_dutyevents_client_event_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverClock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('status_since', models.DateTimeField(blank=True, null=True)),
+                ('window_start', models.DateTimeField(blank=True, null=True)),
+                ('shift_driving_hours', models.FloatField(default=0)),
+                ('since_break_hours', models.FloatField(default=0)),
+                ('non_driving_hours', models.FloatField(default=0)),
+                ('off_duty_hours', models.FloatField(default=0)),
+                ('cycle_days', models.JSONField(blank=True, default=dict)),
+                ('last_restart_at', models.DateTimeField(blank=True, null=True)),
+                ('stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='clock', to='trips.driver')),
+            ],
+        ),
+    ]
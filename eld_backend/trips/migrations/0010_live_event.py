@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 13:51
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_driver_clock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100)),
+                ('kind', models.CharField(max_length=50)),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['channel', 'id'], name='liveevent_channel_id_idx'), models.Index(fields=['created_at'], name='liveevent_created_idx')],
+            },
+        ),
+    ]
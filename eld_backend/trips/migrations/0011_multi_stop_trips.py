@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_live_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='optimize_stop_order',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='waypoints',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='TravelMatrixCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin', models.CharField(max_length=32)),
+                ('destination', models.CharField(max_length=32)),
+                ('distance_meters', models.FloatField(null=True)),
+                ('duration_seconds', models.FloatField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination'), name='travelmatrix_pair_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_multi_stop_trips'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverclock',
+            name='status_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
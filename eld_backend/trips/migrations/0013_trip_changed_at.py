@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_updated_at(apps, schema_editor):
+    Trip = apps.get_model('trips', 'Trip')
+    Trip.objects.update(changed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_driverclock_status_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='changed_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+
+def mark_planner_padding(apps, schema_editor):
+    # The planner wrote its padding as off-duty events remarked "Off duty", with no device id
+    DutyEvents = apps.get_model('trips', 'DutyEvents')
+    DutyEvents.objects.filter(duty_event_status='off_duty', remarks='Off duty', client_event_id__isnull=True,
+                              truck_moved=False).update(planner_padding=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0013_trip_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dutyevents',
+            name='planner_padding',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_planner_padding, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,32 @@
 from django.db import models
+from django.db.models import Prefetch, Value
+from django.db.models.functions import Concat
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 from django.utils import timezone
 
 # Create your models here.
 
+def driver_name_expression(prefix='driver__'):
+    """SQL expression for a drivers full name (first + last), so serializers never walk driver.user."""
+    return Concat(f'{prefix}user__first_name', Value(' '), f'{prefix}user__last_name')
+
+
+class TripQuerySet(models.QuerySet):
+    def with_details(self):
+        """Trips with driver name, daily logs and stops loaded in a constant number of queries."""
+        return self.annotate(driver_name=driver_name_expression()).prefetch_related(
+            Prefetch('daily_logs', queryset=DailyLog.objects.with_driver_name().order_by('date')),
+            Prefetch('stops', queryset=Stop.objects.order_by('arrival_time')),
+        )
+
+
+class DailyLogQuerySet(models.QuerySet):
+    def with_driver_name(self):
+        return self.annotate(driver_name=driver_name_expression())
+
+
 class Driver(models.Model):
     """Represents a driver in the system, linked to a Django User. Stores driver-specific identifiers"""
     user =  models.OneToOneField(User, on_delete=models.CASCADE)
@@ -19,6 +41,12 @@ class Driver(models.Model):
 
 class Trip(models.Model):
     """Represents a trucking trip for a driver. Trip fields:id,driver,Current location, Pickup location, Dropoff location, Current Cycle Used (Hrs) """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
     id = models.UUIDField(primary_key=True, editable=False,default=uuid.uuid4)
     driver = models.ForeignKey(Driver, on_delete=models.CASCADE)
     current_location = models.CharField(max_length=255)
@@ -27,14 +55,43 @@ class Trip(models.Model):
     current_cycle_used = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Moves on every write to the trip or its stops, daily logs and duty events; validates cached
+    # copies of the trip. updated_at (the list order and cursor key) only moves with the trip row.
+    changed_at = models.DateTimeField(auto_now=True, db_index=True)
     drive_time = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Route computed at creation time, served by the route endpoint without calling ORS
+    route_distance_miles = models.FloatField(null=True, blank=True)
+    route_duration_hours = models.FloatField(null=True, blank=True)
+    route_polyline = models.TextField(blank=True)  # encoded polyline, precision 5
+    route_levels = models.JSONField(default=dict, blank=True)  # {"zoom": simplified encoded polyline}
+    pickup_latitude = models.FloatField(null=True, blank=True)
+    pickup_longitude = models.FloatField(null=True, blank=True)
+    dropoff_latitude = models.FloatField(null=True, blank=True)
+    dropoff_longitude = models.FloatField(null=True, blank=True)
+
+    # Multi-stop loads: [{"location", "type": "pickup"|"dropoff", "load"}] after the current location.
+    # Empty for a single pickup -> dropoff load. pickup/dropoff_location mirror the first pickup and last dropoff.
+    waypoints = models.JSONField(default=list, blank=True)
+    optimize_stop_order = models.BooleanField(default=False)  # waypoints may be reordered
+
+    objects = TripQuerySet.as_manager()
 
     class Meta:
         ordering = ['updated_at']
+        indexes = [
+            # Trip listing orders by updated_at; id makes the order total for keyset paging
+            models.Index(fields=['updated_at', 'id'], name='trip_updated_at_id_idx'),
+        ]
     
     def __str__(self):
         return f"Trip {self.id}: {self.pickup_location} to {self.dropoff_location}"
 
+    @property
+    def has_route(self):
+        return bool(self.route_polyline)
+
 
 class Stop(models.Model):
     """Represents a stop event during a trip. Can be fueling, rest, pickup, dropoff, loading/unloading, or inspections. Tracks location, type of stop, arrival/departure times, and duration."""
@@ -57,6 +114,9 @@ class Stop(models.Model):
 
     class Meta:
         ordering = ['arrival_time']
+        indexes = [
+            models.Index(fields=['trip', 'arrival_time'], name='stop_trip_arrival_idx'),
+        ]
 
 class DailyLog(models.Model):
     """Represents a driver’s daily log sheet. Aggregates duty times (off-duty, sleeper, driving, on-duty) and daily mileage. Stores vehicle, trailer, shipper, and commodity information."""
@@ -75,8 +135,14 @@ class DailyLog(models.Model):
     shipper_commodity = models.IntegerField(blank=True, null=True)
     load_number = models.IntegerField(blank=True, null=True)
 
+    objects = DailyLogQuerySet.as_manager()
+
     class Meta:
         ordering = ['date', 'driver']
+        indexes = [
+            models.Index(fields=['driver', 'date'], name='dailylog_driver_date_idx'),
+            models.Index(fields=['trip', 'date'], name='dailylog_trip_date_idx'),
+        ]
     
     def __str__(self):
         return f"ELD log {self.date} by {self.driver.user.username}"
@@ -96,19 +162,151 @@ class DutyEvents(models.Model):
     truck_moved = models.BooleanField(default=True)
     location = models.CharField(max_length=255)
     remarks = models.TextField(blank=True)
+    client_event_id = models.UUIDField(unique=True, null=True, blank=True)  # device-assigned, makes retries idempotent
+    # Off-duty time the trip planner fills a log sheet's day with; recorded events may cut into it
+    planner_padding = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['daily_log', 'start_time'], name='dutyevent_log_start_idx'),
+        ]
 
     def __str__(self):
         return f"{self.duty_event_status} - {self.start_time}"
 
 
+class GeocodeCache(models.Model):
+    """Persistent geocoding result for a normalized address, shared by every worker and kept across restarts."""
+    normalized_query = models.CharField(max_length=255, unique=True)
+    query = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, blank=True)
+    longitude = models.FloatField()
+    latitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.normalized_query} -> ({self.latitude}, {self.longitude})"
 
 
+class TravelMatrixCache(models.Model):
+    """Truck distance and duration from one geocoded point to another, so repeated lanes cost no ORS calls."""
+    origin = models.CharField(max_length=32)  # "lon,lat" rounded by trips.travel_matrix.location_key
+    destination = models.CharField(max_length=32)
+    distance_meters = models.FloatField(null=True)  # null when ORS finds no route
+    duration_seconds = models.FloatField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination'], name='travelmatrix_pair_uniq'),
+        ]
 
+    def __str__(self):
+        return f"{self.origin} -> {self.destination}: {self.distance_meters} m, {self.duration_seconds} s"
 
 
+class TripJob(models.Model):
+    """A unit of background work for a trip (route + log generation), claimed and run by the trip worker."""
+    KIND_CHOICES = [
+        ('generate_trip', 'Generate route and logs'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES, default='generate_trip')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    progress_message = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='tripjob_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for trip {self.trip_id} ({self.status})"
+
+
+class DriverDaySummary(models.Model):
+    """Per-driver, per-day duty hours summed over that day's DailyLogs, kept current incrementally.
+
+    Rolling cycle hours (70/8, 60/7) are a sum over at most 8 of these rows.
+    """
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='day_summaries')
+    date = models.DateField()
+    driving_hours = models.FloatField(default=0)
+    on_duty_hours = models.FloatField(default=0)  # on duty, not driving
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['driver', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['driver', 'date'], name='unique_driver_day_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_id} {self.date}: {self.driving_hours + self.on_duty_hours:.2f}h on duty"
+
+
+class DriverClock(models.Model):
+    """Persisted HOS clock state of a driver (trips.hos_clock.ClockState), advanced as events arrive.
+
+    stale is set when history changes behind the clock (edits, deletes, out-of-order inserts); the
+    next read replays recent events to rebuild it.
+    """
+    driver = models.OneToOneField(Driver, on_delete=models.CASCADE, related_name='clock')
+    as_of = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    status_since = models.DateTimeField(null=True, blank=True)
+    status_until = models.DateTimeField(null=True, blank=True)
+    window_start = models.DateTimeField(null=True, blank=True)
+    shift_driving_hours = models.FloatField(default=0)
+    since_break_hours = models.FloatField(default=0)
+    non_driving_hours = models.FloatField(default=0)
+    off_duty_hours = models.FloatField(default=0)
+    cycle_days = models.JSONField(default=dict, blank=True)
+    last_restart_at = models.DateTimeField(null=True, blank=True)
+    stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Clock of driver {self.driver_id} as of {self.as_of}"
+
+
+class LiveEvent(models.Model):
+    """Outbox of push notifications (job progress, duty events, clocks) for live subscribers.
+
+    Writers insert rows in their own transaction; each ASGI process has one poller that reads new rows
+    and fans them out to its open streams (trips.live). Rows are pruned after a short retention.
+    """
+    channel = models.CharField(max_length=100)  # 'trip:<uuid>' or 'driver:<id>'
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['channel', 'id'], name='liveevent_channel_id_idx'),
+            models.Index(fields=['created_at'], name='liveevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} {self.kind} #{self.pk}"
@@ -0,0 +1,400 @@
+"""Process-wide OpenRouteService clients with rate limiting, retries and a circuit breaker.
+
+Every ORS call, sync (requests, pooled keep-alive session) or async (httpx, one pooled client per
+event loop), goes through the same ORSGuard:
+
+- a token bucket per endpoint, sized from the ORS plan (ORS['RATE_LIMITS_PER_MINUTE']), so
+  bursts queue up briefly instead of burning quota; a call that would wait longer than
+  MAX_QUEUE_SECONDS is refused,
+- retries of 429, 5xx, timeouts and connection errors with jittered exponential backoff,
+  honouring Retry-After,
+- a circuit breaker: after BREAKER_FAILURES failed attempts in a row every call fails fast with
+  ORSUnavailable for BREAKER_RESET_SECONDS, then a single probe call decides whether to close it,
+- per-endpoint call, error and latency counters for /api/metrics/.
+
+Errors are raised as the openrouteservice package's exceptions, so callers handle both clients
+alike. Limits apply per process: divide the plan's limits by the number of processes.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+
+import httpx
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from openrouteservice import exceptions
+from requests.adapters import HTTPAdapter
+
+LATENCY_SAMPLES = 1000  # recent calls kept per endpoint for percentiles
+
+
+class ORSUnavailable(exceptions.ApiError):
+    """ORS is not called: the circuit breaker is open or the rate limit queue is too long."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(503, message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() takes a token and returns how long to wait for it."""
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Seconds until the reserved token is due (0 when one is available), or None when that is
+        longer than max_wait, in which case nothing is reserved.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(-(self.tokens - 1) / self.rate, 0.0)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half open after `reset_seconds`,
+    where one probe call closes it again on success or reopens it on failure.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_seconds else 'open'
+
+    def allow(self):
+        """0 when a call may go ahead, otherwise seconds until the next probe is allowed."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self.probing:
+                return self.reset_seconds  # another call is already probing
+            self.probing = True
+            return 0
+
+    def release(self):
+        """Gives up a probe slot taken by allow() without making the call."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, success):
+        with self._lock:
+            self.probing = False
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class ORSMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = defaultdict(int)
+            self.attempts = defaultdict(int)
+            self.errors = defaultdict(lambda: defaultdict(int))
+            self.rejected = defaultdict(int)
+            self.seconds = defaultdict(float)
+            self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def record_call(self, endpoint, seconds, error=None):
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.seconds[endpoint] += seconds
+            self.latencies[endpoint].append(seconds)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def record_attempt(self, endpoint):
+        with self._lock:
+            self.attempts[endpoint] += 1
+
+    def record_rejected(self, endpoint):
+        with self._lock:
+            self.rejected[endpoint] += 1
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint in sorted(set(self.calls) | set(self.rejected)):
+                latencies = sorted(self.latencies[endpoint])
+                calls = self.calls[endpoint]
+                endpoints[endpoint] = {
+                    'calls': calls,
+                    'retries': self.attempts[endpoint] - calls,
+                    'errors': dict(self.errors[endpoint]),
+                    'rejected': self.rejected[endpoint],
+                    'avg_ms': round(self.seconds[endpoint] / calls * 1000, 1) if calls else None,
+                    'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                    'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                }
+            return endpoints
+
+
+class ORSGuard:
+    """Rate limits, retry policy, circuit breaker and metrics shared by every client in the process."""
+
+    def __init__(self, config):
+        self.max_retries = config['MAX_RETRIES']
+        self.backoff_base = config['BACKOFF_BASE_SECONDS']
+        self.backoff_max = config['BACKOFF_MAX_SECONDS']
+        self.max_queue = config['MAX_QUEUE_SECONDS']
+        self.buckets = {endpoint: TokenBucket(limit / 60, config['RATE_BURST'])
+                        for endpoint, limit in config['RATE_LIMITS_PER_MINUTE'].items()}
+        self.breaker = CircuitBreaker(config['BREAKER_FAILURES'], config['BREAKER_RESET_SECONDS'])
+        self.metrics = ORSMetrics()
+
+    def admit(self, endpoint):
+        """Seconds to wait before the next attempt; raises ORSUnavailable when it must not be made."""
+        retry_after = self.breaker.allow()
+        if retry_after:
+            self.metrics.record_rejected(endpoint)
+            raise ORSUnavailable("OpenRouteService is unavailable (circuit open)", retry_after)
+        bucket = self.buckets.get(endpoint)
+        wait = bucket.reserve(self.max_queue) if bucket else 0.0
+        if wait is None:
+            self.breaker.release()
+            self.metrics.record_rejected(endpoint)
+            raise ORSUnavailable("OpenRouteService rate limit reached", self.max_queue)
+        self.metrics.record_attempt(endpoint)
+        return wait
+
+    def settle(self, attempt, status=None, error=None, retry_after=None):
+        """Records an attempt's outcome. Returns seconds to wait before retrying, or None when done."""
+        retriable = error is not None or status == 429 or status >= 500
+        if not retriable:
+            self.breaker.record(True)  # 4xx means ORS is up and answered
+            return None
+        self.breaker.record(False)
+        if attempt > self.max_retries or self.breaker.state != 'closed':
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def stats(self):
+        return {
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'endpoints': self.metrics.stats(),
+        }
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _body(status, read_json):
+    try:
+        body = read_json()
+    except ValueError:
+        raise exceptions.HTTPError(status)
+    if status != 200:
+        raise exceptions.ApiError(status, body)
+    return body
+
+
+def _matrix_body(locations, sources, destinations, metrics):
+    body = {'locations': locations, 'metrics': metrics or ['duration']}
+    if sources is not None:
+        body['sources'] = sources
+    if destinations is not None:
+        body['destinations'] = destinations
+    return body
+
+
+def _error_name(error, status):
+    if error is not None:
+        return 'timeout' if isinstance(error, exceptions.Timeout) else 'connection'
+    return str(status) if status != 200 else None
+
+
+class ORSClient:
+    """Blocking client on one pooled keep-alive session, safe to share between threads."""
+
+    def __init__(self, config, guard):
+        self.base_url = config['BASE_URL'].rstrip('/')
+        self.timeout = config['TIMEOUT_SECONDS']
+        self.guard = guard
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['POOL_SIZE'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Authorization': config['API_KEY'], 'Content-Type': 'application/json'})
+
+    def _request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        for attempt in range(1, self.guard.max_retries + 2):
+            try:
+                time.sleep(self.guard.admit(endpoint))
+            except ORSUnavailable:
+                self.guard.metrics.record_call(endpoint, time.perf_counter() - started, 'unavailable')
+                raise
+            response = error = None
+            try:
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            except requests.Timeout as e:
+                error = exceptions.Timeout(str(e))
+            except requests.ConnectionError as e:
+                error = ORSUnavailable(f"Cannot reach OpenRouteService: {e}", self.guard.breaker.reset_seconds)
+            status = response.status_code if response is not None else None
+            delay = self.guard.settle(attempt, status, error, _retry_after(response.headers) if response else None)
+            if delay is None:
+                break
+            time.sleep(delay)
+
+        self.guard.metrics.record_call(endpoint, time.perf_counter() - started, _error_name(error, status))
+        if error is not None:
+            raise error
+        return _body(status, response.json)
+
+    def pelias_search(self, text):
+        return self._request('geocode', 'GET', '/geocode/search', params={'text': text})
+
+    def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        return self._request('directions', 'POST', f'/v2/directions/{profile}/{format}',
+                             json={'coordinates': coordinates})
+
+    def distance_matrix(self, locations, profile='driving-hgv', sources=None, destinations=None, metrics=None):
+        return self._request('matrix', 'POST', f'/v2/matrix/{profile}',
+                             json=_matrix_body(locations, sources, destinations, metrics))
+
+
+class AsyncORSClient:
+    """Non-blocking client on a pooled httpx connection pool, bound to the event loop it was created on."""
+
+    def __init__(self, config, guard, transport=None):
+        self.guard = guard
+        self._http = httpx.AsyncClient(
+            base_url=config['BASE_URL'],
+            timeout=config['TIMEOUT_SECONDS'],
+            headers={'Authorization': config['API_KEY'], 'Content-Type': 'application/json'},
+            limits=httpx.Limits(max_connections=config['POOL_SIZE'], max_keepalive_connections=config['POOL_SIZE']),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        for attempt in range(1, self.guard.max_retries + 2):
+            try:
+                await asyncio.sleep(self.guard.admit(endpoint))
+            except ORSUnavailable:
+                self.guard.metrics.record_call(endpoint, time.perf_counter() - started, 'unavailable')
+                raise
+            response = error = None
+            try:
+                response = await self._http.request(method, path, **kwargs)
+            except httpx.TimeoutException as e:
+                error = exceptions.Timeout(str(e))
+            except httpx.TransportError as e:
+                error = ORSUnavailable(f"Cannot reach OpenRouteService: {e}", self.guard.breaker.reset_seconds)
+            status = response.status_code if response is not None else None
+            delay = self.guard.settle(attempt, status, error, _retry_after(response.headers) if response else None)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        self.guard.metrics.record_call(endpoint, time.perf_counter() - started, _error_name(error, status))
+        if error is not None:
+            raise error
+        return _body(status, response.json)
+
+    async def pelias_search(self, text):
+        return await self._request('geocode', 'GET', '/geocode/search', params={'text': text})
+
+    async def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        return await self._request('directions', 'POST', f'/v2/directions/{profile}/{format}',
+                                   json={'coordinates': coordinates})
+
+    async def distance_matrix(self, locations, profile='driving-hgv', sources=None, destinations=None, metrics=None):
+        return await self._request('matrix', 'POST', f'/v2/matrix/{profile}',
+                                   json=_matrix_body(locations, sources, destinations, metrics))
+
+
+_lock = threading.Lock()
+_guard = None
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncORSClient
+
+
+def get_ors_guard():
+    global _guard
+    with _lock:
+        if _guard is None:
+            _guard = ORSGuard(settings.ORS)
+        return _guard
+
+
+def get_ors_client():
+    """The process-wide blocking ORS client."""
+    global _client
+    guard = get_ors_guard()
+    with _lock:
+        if _client is None:
+            _client = ORSClient(settings.ORS, guard)
+        return _client
+
+
+def get_async_ors_client():
+    """The async ORS client of the running event loop (one pool per loop, shared guard)."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncORSClient(settings.ORS, get_ors_guard())
+    return client
+
+
+async def close_async_ors_client():
+    """Closes the running loop's client, for short-lived loops (async_to_sync in sync code)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+@receiver(setting_changed)
+def reset_ors_clients(setting, **kwargs):
+    """Rebuilds the clients and guard after settings.ORS changes (tests, benchmarks)."""
+    global _guard, _client
+    if setting == 'ORS':
+        with _lock:
+            _guard = _client = None
+            _async_clients.clear()
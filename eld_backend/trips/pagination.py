@@ -0,0 +1,154 @@
+"""Keyset (cursor) pagination for the trip, daily log and duty event listings."""
+import base64
+import json
+from urllib import parse
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(values, reverse=False):
+    """Opaque cursor for a row position: the row's ordering values and the paging direction."""
+    payload = json.dumps({'v': [str(value) for value in values], 'r': int(reverse)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(). Returns (values as strings, reverse); raises ValueError when malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return list(payload['v']), bool(payload['r'])
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError(str(e))
+
+
+class KeysetPagination(BasePagination):
+    """Paginates on a unique ordering tuple, e.g. ('updated_at', 'id'), instead of LIMIT/OFFSET.
+
+    Each page is one indexed range query that fetches page_size + 1 rows, so latency does not grow
+    with depth and no COUNT(*) is run. Requests that pass ?page= keep the previous page-number
+    behaviour (with count) for existing clients.
+    """
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_number_class = PageNumberPagination
+
+    def __init__(self):
+        self.legacy = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_number_class.page_query_param in request.query_params:
+            self.legacy = self.page_number_class()
+            self.legacy.page_size = self.page_size
+            return self.legacy.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        model = queryset.model
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        if cursor:
+            try:
+                raw_values, reverse = decode_cursor(parse.unquote(cursor))
+                if len(raw_values) != len(self.ordering):
+                    raise ValueError('cursor does not match ordering')
+                values = [model._meta.get_field(name).to_python(value)
+                          for name, value in zip(self.ordering, raw_values)]
+            except Exception:
+                raise NotFound('Invalid cursor')
+            queryset = queryset.filter(self.after(values, reverse))
+
+        ordering = [f'-{name}' for name in self.ordering] if reverse else list(self.ordering)
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Going forward there is a previous page whenever we started from a cursor, and vice versa
+        self.has_next = has_more if not reverse else bool(cursor)
+        self.has_previous = bool(cursor) if not reverse else has_more
+        self.first = self.position(rows[0]) if rows else None
+        self.last = self.position(rows[-1]) if rows else None
+        return rows
+
+    def after(self, values, reverse=False):
+        """Filter for rows strictly after (or before, when reverse) the given ordering values.
+
+        (a, b) > (x, y) is written as a >= x AND (a > x OR b > y), so the leading column bounds an
+        index range scan on every backend.
+        """
+        op = 'lt' if reverse else 'gt'
+        lookahead = Q()
+        for i in range(len(self.ordering) - 1, -1, -1):
+            name, value = self.ordering[i], values[i]
+            strict = Q(**{f'{name}__{op}': value})
+            lookahead = strict if i == len(self.ordering) - 1 else strict | (Q(**{name: value}) & lookahead)
+        leading = Q(**{f'{self.ordering[0]}__{op}e': values[0]})
+        return leading & lookahead
+
+    def position(self, row):
+        return [getattr(row, name) for name in self.ordering]
+
+    def get_link(self, values, reverse):
+        if values is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        return self.get_link(self.last, False) if self.has_next else None
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.get_link(self.first, True)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TripPagination(KeysetPagination):
+    ordering = ('updated_at', 'id')
+
+
+class DailyLogPagination(KeysetPagination):
+    ordering = ('date', 'id')
+
+
+class DutyEventPagination(KeysetPagination):
+    ordering = ('start_time', 'id')
@@ -0,0 +1,97 @@
+"""Cache of serialized response data for trip-scoped read endpoints.
+
+Keys embed the trip's changed_at, which every write to the trip, its stops, daily logs or duty
+events moves forward (see trips.conditional). A write therefore makes every cached response for
+that trip unreachable at once, in every process, without any explicit delete; stale entries
+simply age out. This works with any Django cache backend, including local memory and files.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ResponseCache:
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.hit_seconds = 0.0
+            self.miss_seconds = 0.0
+
+    def key(self, request, resource, trip_id, version):
+        # Full path and host: pagination links are absolute and query params change the payload
+        variant = f"{request.get_host()}{request.get_full_path()}|{getattr(request, 'accepted_media_type', '')}"
+        digest = hashlib.md5(variant.encode(), usedforsecurity=False).hexdigest()
+        return f"trips:response:{resource}:{trip_id}:{version.timestamp()}:{digest}"
+
+    def get_or_build(self, request, resource, trip_id, version, build):
+        """Returns cached data for this trip version, or calls build() and stores its result.
+
+        version is the trip's changed_at; when it is None (unknown trip) nothing is cached.
+        """
+        started = time.perf_counter()
+        if version is None:
+            return build()
+
+        key = self.key(request, resource, trip_id, version)
+        data = self.cache.get(key)
+        hit = data is not None
+        if not hit:
+            data = build()
+            self.cache.set(key, data, self.timeout)
+        self._record(hit, time.perf_counter() - started)
+        return data
+
+    async def aget_or_build(self, request, resource, trip_id, version, build):
+        """get_or_build() for async views, where build is a coroutine function."""
+        started = time.perf_counter()
+        if version is None:
+            return await build()
+
+        key = self.key(request, resource, trip_id, version)
+        data = await self.cache.aget(key)
+        hit = data is not None
+        if not hit:
+            data = await build()
+            await self.cache.aset(key, data, self.timeout)
+        self._record(hit, time.perf_counter() - started)
+        return data
+
+    def _record(self, hit, elapsed):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += elapsed
+            else:
+                self.misses += 1
+                self.miss_seconds += elapsed
+
+    def stats(self):
+        """Returns hit/miss counters and the mean time spent serving each."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'avg_hit_ms': round(self.hit_seconds / self.hits * 1000, 3) if self.hits else None,
+            'avg_miss_ms': round(self.miss_seconds / self.misses * 1000, 3) if self.misses else None,
+        }
+
+
+response_cache = ResponseCache(
+    alias=settings.RESPONSE_CACHE['ALIAS'],
+    timeout=settings.RESPONSE_CACHE['TIMEOUT_SECONDS'],
+)
@@ -0,0 +1,471 @@
+"""Offline truck routing on a road graph stored in one memory-mapped file.
+
+The file holds a directed graph in compressed sparse row form (per-node edge offsets, then edge
+targets, travel times and lengths), node coordinates, a grid index for snapping points to the
+nearest node, and a gazetteer of named places for geocoding. Everything is fixed-width little
+endian arrays read in place through mmap: opening a graph costs no parsing, and every process on
+a host shares one copy of it in the page cache.
+
+Routes are shortest-time paths found with A*, guided by the great-circle distance at the graph's
+top speed. build_from_osm() derives a graph from an OpenStreetMap XML extract.
+"""
+import bisect
+import bz2
+import gzip
+import heapq
+import math
+import mmap
+import struct
+import unicodedata
+import xml.etree.ElementTree as ElementTree
+from array import array
+
+MAGIC = b'ELDROAD1'
+HEADER = struct.Struct('<8sIIIIIdd')  # magic, version, nodes, edges, places, cells, cell size, top speed
+VERSION = 1
+COORD_SCALE = 1_000_000  # coordinates are stored as integer microdegrees
+EARTH_RADIUS_M = 6_371_000
+DEFAULT_CELL_DEGREES = 0.1
+SNAP_RINGS = 5  # grid rings searched around a point before giving up (about 50 km at 0.1 degrees)
+
+# Truck speeds (km/h) by highway class, used when a way has no usable maxspeed
+HIGHWAY_SPEEDS_KPH = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 85, 'trunk_link': 50,
+    'primary': 70, 'primary_link': 45,
+    'secondary': 60, 'secondary_link': 40,
+    'tertiary': 50, 'tertiary_link': 35,
+    'unclassified': 40,
+    'residential': 25,
+    'living_street': 10,
+    'service': 15,
+}
+TRUCK_MAX_SPEED_KPH = 105
+NO_ACCESS = {'no', 'private', 'agricultural', 'forestry', 'delivery_no'}
+PLACE_IMPORTANCE = {'city': 1_000_000, 'town': 100_000, 'village': 10_000, 'hamlet': 1_000}
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def normalize_name(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in text).split())
+
+
+def _cell_key(lon, lat, cell):
+    columns = math.ceil(360 / cell)
+    return int((lat + 90) // cell) * columns + int((lon + 180) // cell)
+
+
+def _pad(handle):
+    handle.write(b'\0' * (-handle.tell() % 8))
+
+
+def _counting_order(keys, count):
+    """(starts, order): positions of keys grouped by value 0..count-1, stable, in O(len(keys))."""
+    starts = array('I', bytes(4 * (count + 1)))
+    for key in keys:
+        starts[key + 1] += 1
+    for i in range(count):
+        starts[i + 1] += starts[i]
+    cursor = array('I', starts)
+    order = array('I', bytes(4 * len(keys)))
+    for position, key in enumerate(keys):
+        order[cursor[key]] = position
+        cursor[key] += 1
+    return starts, order
+
+
+def write_graph(path, lons, lats, sources, targets, seconds, meters, places=(), cell=DEFAULT_CELL_DEGREES):
+    """Writes a graph file. Nodes are given as parallel lon/lat sequences (degrees), directed edges as
+    parallel source/target/seconds/meters sequences, places as (name, lon, lat, importance).
+    """
+    node_count, edge_count = len(lons), len(sources)
+    offsets, order = _counting_order(sources, node_count)
+    top_speed = max((meters[i] / seconds[i] for i in range(edge_count) if seconds[i] > 0), default=1.0)
+
+    keys = [_cell_key(lons[i], lats[i], cell) for i in range(node_count)]
+    cell_keys = sorted(set(keys))
+    rank = {key: index for index, key in enumerate(cell_keys)}
+    cell_starts, cell_nodes = _counting_order([rank[key] for key in keys], len(cell_keys))
+
+    places = sorted(places, key=lambda place: -place[3])
+    names = [normalize_name(place[0]).encode() for place in places]
+    labels = [place[0].encode() for place in places]
+
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, node_count, edge_count, len(places), len(cell_keys), cell,
+                                 top_speed))
+        for values, typecode in (
+            ((round(lon * COORD_SCALE) for lon in lons), 'i'),
+            ((round(lat * COORD_SCALE) for lat in lats), 'i'),
+            (offsets, 'I'),
+            ((targets[i] for i in order), 'I'),
+            ((max(1, round(seconds[i] * 10)) for i in order), 'I'),  # deciseconds
+            ((round(meters[i]) for i in order), 'I'),
+            (cell_keys, 'i'),
+            (cell_starts, 'I'),
+            (cell_nodes, 'I'),
+            ((round(place[1] * COORD_SCALE) for place in places), 'i'),
+            ((round(place[2] * COORD_SCALE) for place in places), 'i'),
+            ((place[3] for place in places), 'I'),
+            (_string_offsets(names), 'I'),
+            (_string_offsets(labels), 'I'),
+        ):
+            _pad(handle)
+            array(typecode, values).tofile(handle)
+        _pad(handle)
+        handle.write(b''.join(names))
+        handle.write(b''.join(labels))
+
+
+def _string_offsets(strings):
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return offsets
+
+
+class RoadGraph:
+    """A graph file opened read-only through mmap. Safe to share between threads."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nodes, edges, places, cells, self.cell, self.top_speed = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} road graph")
+        self.node_count, self.edge_count, self.place_count = nodes, edges, places
+
+        view, position = memoryview(self._map), HEADER.size
+
+        def take(typecode, count):
+            nonlocal position
+            position += -position % 8
+            size = 4 * count
+            values = view[position:position + size].cast(typecode)
+            position += size
+            return values
+
+        self.lons, self.lats = take('i', nodes), take('i', nodes)
+        self.offsets = take('I', nodes + 1)
+        self.targets, self.deciseconds, self.meters = take('I', edges), take('I', edges), take('I', edges)
+        self.cell_keys, self.cell_starts, self.cell_nodes = take('i', cells), take('I', cells + 1), take('I', nodes)
+        place_lons, place_lats, self.place_importance = take('i', places), take('i', places), take('I', places)
+        name_offsets, label_offsets = take('I', places + 1), take('I', places + 1)
+        position += -position % 8
+        names = bytes(view[position:position + name_offsets[-1]])
+        position += name_offsets[-1]
+        labels = bytes(view[position:position + label_offsets[-1]])
+
+        # Places are few next to road nodes: index them in memory by normalized name, most important first
+        self.places = {}
+        for i in range(places):
+            name = names[name_offsets[i]:name_offsets[i + 1]].decode()
+            label = labels[label_offsets[i]:label_offsets[i + 1]].decode()
+            self.places.setdefault(name, (label, place_lons[i] / COORD_SCALE, place_lats[i] / COORD_SCALE))
+        for values in (place_lons, place_lats, name_offsets, label_offsets):
+            values.release()
+
+    def close(self):
+        for name in ('lons', 'lats', 'offsets', 'targets', 'deciseconds', 'meters', 'cell_keys', 'cell_starts',
+                     'cell_nodes', 'place_importance'):
+            getattr(self, name).release()
+        self._map.close()
+
+    def coordinates(self, node):
+        return [self.lons[node] / COORD_SCALE, self.lats[node] / COORD_SCALE]
+
+    def nearest(self, lon, lat):
+        """Nearest node to a point, searching outward ring by ring over the grid index, or None."""
+        columns = math.ceil(360 / self.cell)
+        row, column = int((lat + 90) // self.cell), int((lon + 180) // self.cell)
+        scale = math.cos(math.radians(lat))
+        x, y = lon * COORD_SCALE, lat * COORD_SCALE
+        best, best_distance = None, math.inf
+        for ring in range(SNAP_RINGS + 1):
+            for cell_row in range(row - ring, row + ring + 1):
+                for cell_column in range(column - ring, column + ring + 1):
+                    if max(abs(cell_row - row), abs(cell_column - column)) != ring:
+                        continue
+                    key = cell_row * columns + cell_column
+                    index = bisect.bisect_left(self.cell_keys, key)
+                    if index == len(self.cell_keys) or self.cell_keys[index] != key:
+                        continue
+                    for slot in range(self.cell_starts[index], self.cell_starts[index + 1]):
+                        node = self.cell_nodes[slot]
+                        distance = ((self.lons[node] - x) * scale) ** 2 + (self.lats[node] - y) ** 2
+                        if distance < best_distance:
+                            best, best_distance = node, distance
+            if best is not None and ring >= 1:
+                return best  # one ring past the first hit covers nodes just across a cell border
+        return best
+
+    def shortest_path(self, source, target):
+        """Fastest path as (nodes, deciseconds, meters), or None when target is unreachable."""
+        lons, lats, offsets = self.lons, self.lats, self.offsets
+        targets, deciseconds, lengths = self.targets, self.deciseconds, self.meters
+        target_lon, target_lat = lons[target] / COORD_SCALE, lats[target] / COORD_SCALE
+        cos_target = math.cos(math.radians(target_lat))
+        # Great-circle distance at top speed never overestimates the remaining time
+        per_meter = 10 / self.top_speed
+        to_radians = math.pi / 180 / COORD_SCALE
+
+        def estimate(node):
+            phi = lats[node] * to_radians
+            a = (math.sin((phi - target_lat * math.pi / 180) / 2) ** 2
+                 + math.cos(phi) * cos_target * math.sin((lons[node] * to_radians - target_lon * math.pi / 180) / 2) ** 2)
+            return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a))) * per_meter
+
+        best = {source: 0}
+        parent = {source: (-1, -1)}
+        heap = [(estimate(source), 0, source)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+        while heap:
+            _, cost, node = heappop(heap)
+            if node == target:
+                break
+            if cost > best[node]:
+                continue  # stale entry
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = cost + deciseconds[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    parent[neighbour] = (node, edge)
+                    heappush(heap, (candidate + estimate(neighbour), candidate, neighbour))
+        else:
+            return None
+
+        nodes, meters = [], 0
+        node = target
+        while node != -1:
+            nodes.append(node)
+            node, edge = parent[node]
+            if edge != -1:
+                meters += lengths[edge]
+        nodes.reverse()
+        return nodes, best[target], meters
+
+    def directions(self, coordinates):
+        """ORS-style GeoJSON directions through [lon, lat] waypoints, or None when there is no route."""
+        snapped = [self.nearest(lon, lat) for lon, lat in coordinates]
+        if None in snapped:
+            return None
+        path, segments = [snapped[0]], []
+        for source, target in zip(snapped, snapped[1:]):
+            leg = self.shortest_path(source, target)
+            if leg is None:
+                return None
+            path += leg[0][1:]
+            segments.append({'distance': float(leg[2]), 'duration': leg[1] / 10})
+        summary = {'distance': sum(segment['distance'] for segment in segments),
+                   'duration': sum(segment['duration'] for segment in segments)}
+        return {'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'properties': {'summary': summary, 'segments': segments},
+            'geometry': {'type': 'LineString', 'coordinates': [self.coordinates(node) for node in path]},
+        }]}
+
+    def travel_table(self, sources, targets):
+        """Fastest (deciseconds, meters) from every source node to every target node, None when unreachable.
+
+        One Dijkstra search per source, stopped once all of its targets are settled.
+        """
+        offsets, edge_targets, deciseconds, lengths = self.offsets, self.targets, self.deciseconds, self.meters
+        table = []
+        for source in sources:
+            pending = set(targets)
+            best, meters = {source: 0}, {source: 0}
+            heap = [(0, source)]
+            settled = set()
+            while heap and pending:
+                cost, node = heapq.heappop(heap)
+                if node in settled:
+                    continue
+                settled.add(node)
+                pending.discard(node)
+                for edge in range(offsets[node], offsets[node + 1]):
+                    neighbour = edge_targets[edge]
+                    candidate = cost + deciseconds[edge]
+                    if candidate < best.get(neighbour, math.inf):
+                        best[neighbour] = candidate
+                        meters[neighbour] = meters[node] + lengths[edge]
+                        heapq.heappush(heap, (candidate, neighbour))
+            table.append([(best[target], meters[target]) if target in settled else None for target in targets])
+        return table
+
+    def search_place(self, text):
+        """(label, lon, lat) of the most important place matching an address, or None.
+
+        Tries the whole address, then its parts ("Dallas, TX" -> "dallas tx", "dallas").
+        """
+        for candidate in [text, *text.split(',')]:
+            place = self.places.get(normalize_name(candidate))
+            if place:
+                return place
+        return None
+
+
+def synthetic_grid(path, columns, rows, west=-124.0, south=25.0, east=-67.0, north=49.0, highway_every=20):
+    """Writes a grid graph over a bounding box (by default the continental US) for benchmarks.
+
+    Every highway_every-th row and column is a motorway; the rest are secondary roads. Places named
+    'grid R C' sit on the highway crossings.
+    """
+    lon_step, lat_step = (east - west) / (columns - 1), (north - south) / (rows - 1)
+    lons = array('d', (west + column * lon_step for row in range(rows) for column in range(columns)))
+    lats = array('d', (south + row * lat_step for row in range(rows) for column in range(columns)))
+    sources, targets, seconds, meters = array('I'), array('I'), array('f'), array('f')
+    fast, slow = HIGHWAY_SPEEDS_KPH['motorway'] / 3.6, HIGHWAY_SPEEDS_KPH['secondary'] / 3.6
+    for row in range(rows):
+        lat = south + row * lat_step
+        east_meters = haversine_m(0, lat, lon_step, lat)
+        north_meters = haversine_m(0, lat, 0, lat + lat_step)
+        for column in range(columns):
+            node = row * columns + column
+            if column + 1 < columns:
+                speed = fast if row % highway_every == 0 else slow
+                sources.extend((node, node + 1))
+                targets.extend((node + 1, node))
+                seconds.extend((east_meters / speed,) * 2)
+                meters.extend((east_meters,) * 2)
+            if row + 1 < rows:
+                speed = fast if column % highway_every == 0 else slow
+                sources.extend((node, node + columns))
+                targets.extend((node + columns, node))
+                seconds.extend((north_meters / speed,) * 2)
+                meters.extend((north_meters,) * 2)
+    places = [(f'grid {row} {column}', west + column * lon_step, south + row * lat_step, 1)
+              for row in range(0, rows, highway_every) for column in range(0, columns, highway_every)]
+    write_graph(path, lons, lats, sources, targets, seconds, meters, places)
+
+
+def _open_osm(path):
+    path = str(path)
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _way_speed(tags):
+    """Truck speed in km/h for a way's tags, or None when trucks may not use it."""
+    highway = tags.get('highway')
+    if highway not in HIGHWAY_SPEEDS_KPH:
+        return None
+    if tags.get('hgv') in ('no',) or (tags.get('access') in NO_ACCESS and tags.get('hgv') not in ('yes', 'designated')):
+        return None
+    if tags.get('motor_vehicle') in NO_ACCESS:
+        return None
+    speed = HIGHWAY_SPEEDS_KPH[highway]
+    maxspeed = tags.get('maxspeed:hgv') or tags.get('maxspeed') or ''
+    number = maxspeed.split()[0] if maxspeed.split() else ''
+    if number.replace('.', '', 1).isdigit():
+        speed = float(number) * (1.609344 if 'mph' in maxspeed else 1)
+    return min(speed, TRUCK_MAX_SPEED_KPH)
+
+
+def _oneway(tags):
+    """1 forward only, -1 backward only, 0 both directions."""
+    value = tags.get('oneway')
+    if value == '-1':
+        return -1
+    if value in ('yes', 'true', '1') or tags.get('junction') == 'roundabout' or (
+            tags.get('highway') in ('motorway',) and value != 'no'):
+        return 1
+    return 0
+
+
+def _largest_component(node_count, sources, targets):
+    """Nodes of the largest weakly connected component (union-find over the edges)."""
+    parent = list(range(node_count))
+
+    def root(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for source, target in zip(sources, targets):
+        a, b = root(source), root(target)
+        if a != b:
+            parent[a] = b
+    roots = [root(node) for node in range(node_count)]
+    counts = {}
+    for node_root in roots:
+        counts[node_root] = counts.get(node_root, 0) + 1
+    largest = max(counts, key=counts.get)
+    return [node for node in range(node_count) if roots[node] == largest]
+
+
+def build_from_osm(source, path, cell=DEFAULT_CELL_DEGREES):
+    """Builds a graph file from an OSM XML extract (.osm, .osm.bz2 or .osm.gz) in two streaming passes.
+
+    Keeps truck-accessible highways (see _way_speed) and the largest connected network; named
+    city/town/village/hamlet nodes become the gazetteer. Returns (nodes, edges, places).
+    """
+    ways, places, used = [], [], set()
+    with _open_osm(source) as handle:
+        for _, element in ElementTree.iterparse(handle, events=('end',)):
+            if element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                speed = _way_speed(tags)
+                if speed:
+                    refs = array('q', (int(nd.get('ref')) for nd in element.iter('nd')))
+                    if len(refs) > 1:
+                        ways.append((refs, speed, _oneway(tags)))
+                        used.update(refs)
+                element.clear()
+            elif element.tag == 'node':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                if tags.get('place') in PLACE_IMPORTANCE and tags.get('name'):
+                    importance = tags.get('population', '')
+                    importance = int(importance) if importance.isdigit() else PLACE_IMPORTANCE[tags['place']]
+                    places.append((tags['name'], float(element.get('lon')), float(element.get('lat')), importance))
+                element.clear()
+
+    index, lons, lats = {}, array('d'), array('d')
+    with _open_osm(source) as handle:
+        for _, element in ElementTree.iterparse(handle, events=('end',)):
+            if element.tag == 'node':
+                osm_id = int(element.get('id'))
+                if osm_id in used:
+                    index[osm_id] = len(lons)
+                    lons.append(float(element.get('lon')))
+                    lats.append(float(element.get('lat')))
+            element.clear()
+
+    sources, targets, seconds, meters = array('I'), array('I'), array('d'), array('d')
+    for refs, speed, oneway in ways:
+        meters_per_second = speed / 3.6
+        for a, b in zip(refs, refs[1:]):
+            if a not in index or b not in index:
+                continue  # clipped at the extract boundary
+            u, v = index[a], index[b]
+            length = haversine_m(lons[u], lats[u], lons[v], lats[v])
+            for start, end in ((u, v),) if oneway == 1 else ((v, u),) if oneway == -1 else ((u, v), (v, u)):
+                sources.append(start)
+                targets.append(end)
+                seconds.append(length / meters_per_second)
+                meters.append(length)
+
+    if not sources:
+        raise ValueError(f"No truck-accessible roads found in {source}")
+    keep = _largest_component(len(lons), sources, targets)
+    renumber = {node: new for new, node in enumerate(keep)}
+    edges = [i for i in range(len(sources)) if sources[i] in renumber]
+    write_graph(
+        path,
+        array('d', (lons[node] for node in keep)), array('d', (lats[node] for node in keep)),
+        array('I', (renumber[sources[i]] for i in edges)), array('I', (renumber[targets[i]] for i in edges)),
+        array('d', (seconds[i] for i in edges)), array('d', (meters[i] for i in edges)),
+        places, cell,
+    )
+    return len(keep), len(edges), len(places)
@@ -0,0 +1,200 @@
+"""Routing backend selection: OpenRouteService, the offline road graph, or one behind the other.
+
+ROUTING['BACKEND'] picks what get_route_data() and batch creation talk to:
+
+- 'ors': OpenRouteService only (trips.ors),
+- 'offline': the local road graph only (trips.road_graph), no network calls and no quota,
+- 'ors_then_offline': ORS, falling back to the graph when ORS fails or cannot geocode,
+- 'offline_then_ors': the graph, falling back to ORS for places and routes it does not know.
+
+Every client has the pelias_search()/directions()/distance_matrix() interface of the ORS clients
+and answers in the same shape, so callers never know which one served them.
+"""
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from openrouteservice import exceptions
+
+from .ors import get_async_ors_client, get_ors_client
+from .road_graph import RoadGraph
+
+logger = logging.getLogger('eld_tracker')
+
+BACKENDS = ('ors', 'offline', 'ors_then_offline', 'offline_then_ors')
+# Failures that send a call to the fallback backend (ORSUnavailable is an ApiError)
+FALLBACK_ERRORS = (exceptions.ApiError, exceptions.HTTPError, exceptions.Timeout)
+
+
+class OfflineClient:
+    """Geocoding and truck directions from a RoadGraph, in ORS response format."""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def pelias_search(self, text):
+        place = self.graph.search_place(text)
+        if place is None:
+            return {'type': 'FeatureCollection', 'features': []}
+        label, lon, lat = place
+        return {'type': 'FeatureCollection', 'features': [{
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {'label': label},
+        }]}
+
+    def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        route = self.graph.directions(coordinates)
+        if route is None:
+            raise exceptions.ApiError(404, {'error': 'No route found in the offline road graph'})
+        return route
+
+    def distance_matrix(self, locations, profile='driving-hgv', sources=None, destinations=None, metrics=None):
+        nodes = [self.graph.nearest(lon, lat) for lon, lat in locations]
+        sources = range(len(locations)) if sources is None else sources
+        destinations = range(len(locations)) if destinations is None else destinations
+        if any(nodes[i] is None for i in [*sources, *destinations]):
+            raise exceptions.ApiError(404, {'error': 'Location outside the offline road graph'})
+        table = self.graph.travel_table([nodes[i] for i in sources], [nodes[j] for j in destinations])
+        return {
+            'durations': [[cell[0] / 10 if cell else None for cell in row] for row in table],
+            'distances': [[float(cell[1]) if cell else None for cell in row] for row in table],
+        }
+
+
+class AsyncOfflineClient:
+    """OfflineClient for async callers; searches run in a worker thread to keep the loop free."""
+
+    def __init__(self, graph):
+        self._client = OfflineClient(graph)
+
+    async def pelias_search(self, text):
+        return await asyncio.to_thread(self._client.pelias_search, text)
+
+    async def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        return await asyncio.to_thread(self._client.directions, coordinates, profile, format)
+
+    async def distance_matrix(self, locations, profile='driving-hgv', sources=None, destinations=None, metrics=None):
+        return await asyncio.to_thread(self._client.distance_matrix, locations, profile, sources, destinations, metrics)
+
+
+def _log_fallback(primary, error):
+    logger.warning("Routing through %s failed (%s), using the fallback backend", type(primary).__name__, error)
+
+
+class FallbackClient:
+    """Tries primary, then fallback when primary fails or finds no match for an address."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def pelias_search(self, text):
+        try:
+            result = self.primary.pelias_search(text)
+            if result['features']:
+                return result
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return self.fallback.pelias_search(text)
+
+    def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        try:
+            return self.primary.directions(coordinates, profile=profile, format=format)
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return self.fallback.directions(coordinates, profile=profile, format=format)
+
+    def distance_matrix(self, locations, **options):
+        try:
+            return self.primary.distance_matrix(locations, **options)
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return self.fallback.distance_matrix(locations, **options)
+
+
+class AsyncFallbackClient(FallbackClient):
+    """FallbackClient over async clients."""
+
+    async def pelias_search(self, text):
+        try:
+            result = await self.primary.pelias_search(text)
+            if result['features']:
+                return result
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return await self.fallback.pelias_search(text)
+
+    async def directions(self, coordinates, profile='driving-hgv', format='geojson'):
+        try:
+            return await self.primary.directions(coordinates, profile=profile, format=format)
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return await self.fallback.directions(coordinates, profile=profile, format=format)
+
+    async def distance_matrix(self, locations, **options):
+        try:
+            return await self.primary.distance_matrix(locations, **options)
+        except FALLBACK_ERRORS as e:
+            _log_fallback(self.primary, e)
+        return await self.fallback.distance_matrix(locations, **options)
+
+
+_lock = threading.Lock()
+_graph = None
+
+
+def get_road_graph():
+    """The process-wide road graph, mapped from ROUTING['GRAPH_PATH'] on first use."""
+    global _graph
+    with _lock:
+        if _graph is None:
+            _graph = RoadGraph(settings.ROUTING['GRAPH_PATH'])
+        return _graph
+
+
+def _backend():
+    backend = settings.ROUTING['BACKEND']
+    if backend not in BACKENDS:
+        raise ValueError(f"ROUTING['BACKEND'] must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    return backend
+
+
+def get_routing_client():
+    """The blocking client for the configured backend."""
+    backend = _backend()
+    if backend == 'ors':
+        return get_ors_client()
+    offline = OfflineClient(get_road_graph())
+    if backend == 'offline':
+        return offline
+    if backend == 'ors_then_offline':
+        return FallbackClient(get_ors_client(), offline)
+    return FallbackClient(offline, get_ors_client())
+
+
+def get_async_routing_client():
+    """The async client for the configured backend, on the running event loop."""
+    backend = _backend()
+    if backend == 'ors':
+        return get_async_ors_client()
+    offline = AsyncOfflineClient(get_road_graph())
+    if backend == 'offline':
+        return offline
+    if backend == 'ors_then_offline':
+        return AsyncFallbackClient(get_async_ors_client(), offline)
+    return AsyncFallbackClient(offline, get_async_ors_client())
+
+
+@receiver(setting_changed)
+def reset_road_graph(setting, **kwargs):
+    """Reopens the graph after settings.ROUTING changes (tests, benchmarks)."""
+    global _graph
+    if setting == 'ROUTING':
+        with _lock:
+            if _graph is not None:
+                _graph.close()
+            _graph = None
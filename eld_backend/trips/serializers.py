@@ -1,8 +1,18 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import DailyLog, Stop, Trip, Driver,DutyEvents
+from .models import DailyLog, Stop, Trip, Driver,DutyEvents, TripJob
+from .stop_order import feasible, precedence
 from datetime import time
 
 
+def driver_name(obj):
+    """Returns the annotated driver_name, falling back to walking driver.user for unannotated instances."""
+    name = getattr(obj, 'driver_name', None)
+    if name is None:
+        name = f"{obj.driver.user.first_name} {obj.driver.user.last_name}"
+    return name
+
+
 class DailyLogSerializer(serializers.ModelSerializer):
     """Serializes DailyLog data including driver name and duty hour totals."""
     driver_name = serializers.SerializerMethodField()
@@ -25,8 +35,8 @@ class DailyLogSerializer(serializers.ModelSerializer):
         return round((obj.total_driving_time + obj.total_on_duty_time) / 60, 1) #driving + on-duty hrs
     
     def get_driver_name(self, obj):
-        """Returns the drivers full name (first + last)."""
-        return f"{obj.driver.user.first_name} {obj.driver.user.last_name}"
+        """Returns the drivers full name (first + last), annotated by the queryset when available."""
+        return driver_name(obj)
 
 class StopsSerializer(serializers.ModelSerializer):
     """Serializes Stop objects for trip detail views."""
@@ -45,7 +55,52 @@ class DriverSerializer(serializers.ModelSerializer):
             return f"{obj.user.first_name} {obj.user.last_name}"
 
 
-class TripsSerializer(serializers.ModelSerializer):
+class WaypointSerializer(serializers.Serializer):
+    """One stop of a multi-stop load; stops sharing a load are picked up before they are dropped off."""
+    location = serializers.CharField(max_length=255)
+    type = serializers.ChoiceField(choices=['pickup', 'dropoff'])
+    load = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+
+class WaypointsMixin(serializers.Serializer):
+    """Validates `waypoints` and derives pickup_location/dropoff_location from them."""
+    waypoints = serializers.JSONField(required=False)
+
+    def validate_waypoints(self, value):
+        if not value:
+            return []
+        serializer = WaypointSerializer(data=value, many=True)
+        serializer.is_valid(raise_exception=True)
+        waypoints = [dict(stop) for stop in serializer.validated_data]
+        max_waypoints = settings.STOP_ORDER['MAX_WAYPOINTS']
+        if len(waypoints) > max_waypoints:
+            raise serializers.ValidationError(f"At most {max_waypoints} waypoints per trip.")
+        types = {stop['type'] for stop in waypoints}
+        if types != {'pickup', 'dropoff'}:
+            raise serializers.ValidationError("Needs at least one pickup and one dropoff.")
+        return waypoints
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        waypoints = attrs.get('waypoints', getattr(self.instance, 'waypoints', None))
+        optimize = attrs.get('optimize_stop_order', getattr(self.instance, 'optimize_stop_order', False))
+        if waypoints:
+            if not optimize and not feasible(range(len(waypoints)), precedence(waypoints)):
+                raise serializers.ValidationError(
+                    {'waypoints': ["A dropoff comes before the pickup of its load; reorder the stops or set "
+                                   "optimize_stop_order."]})
+            if 'waypoints' in attrs:
+                attrs['pickup_location'] = next(stop['location'] for stop in waypoints if stop['type'] == 'pickup')
+                attrs['dropoff_location'] = [stop['location'] for stop in waypoints if stop['type'] == 'dropoff'][-1]
+        elif self.instance is None:
+            missing = {field: ["This field is required."] for field in ('pickup_location', 'dropoff_location')
+                       if not attrs.get(field)}
+            if missing:
+                raise serializers.ValidationError(missing)
+        return attrs
+
+
+class TripsSerializer(WaypointsMixin, serializers.ModelSerializer):
     """Serializes Trip data with driver name, related logs, and stops."""
     driver_name = serializers.SerializerMethodField()
     daily_logs = serializers.SerializerMethodField()
@@ -53,27 +108,49 @@ class TripsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trip
         fields = [
-            'id', 'current_location', 'pickup_location', 'dropoff_location',
-            'current_cycle_used', 'drive_time', 'daily_logs', 'stops', 'driver_name'
+            'id', 'current_location', 'pickup_location', 'dropoff_location', 'waypoints', 'optimize_stop_order',
+            'current_cycle_used', 'drive_time', 'status', 'daily_logs', 'stops', 'driver_name'
         ]
-
-
-    read_only_fields = ['id', 'created_at', 'drive_time']
+        read_only_fields = ['id', 'drive_time', 'status']
+        extra_kwargs = {'pickup_location': {'required': False}, 'dropoff_location': {'required': False}}
 
     def get_daily_logs(self, obj):
-        """Fetches and serializes all DailyLogs linked to a given Trip."""
-        logs = DailyLog.objects.filter(trip=obj).order_by('date')
+        """Serializes all DailyLogs linked to a given Trip (prefetched by Trip.objects.with_details())."""
+        if 'daily_logs' in getattr(obj, '_prefetched_objects_cache', {}):
+            logs = obj.daily_logs.all()
+        else:
+            logs = obj.daily_logs.with_driver_name().order_by('date')
         return DailyLogSerializer(logs, many=True).data
     
     def get_driver_name(self, obj):
-        """Returns the drivers full name (first + last)."""
-        return f"{obj.driver.user.first_name} {obj.driver.user.last_name}"
+        """Returns the drivers full name (first + last), annotated by the queryset when available."""
+        return driver_name(obj)
 
-class CreateTripSerializer(serializers.ModelSerializer):
-    """Serializer for creating a new Trip with essential trip details."""
+class CreateTripSerializer(WaypointsMixin, serializers.ModelSerializer):
+    """Serializer for creating a new Trip with essential trip details.
+
+    A multi-stop load lists its stops in `waypoints` instead of pickup_location/dropoff_location.
+    """
     class Meta:
         model = Trip
-        fields = ['current_location','pickup_location','dropoff_location','current_cycle_used']
+        fields = ['id','current_location','pickup_location','dropoff_location','waypoints','optimize_stop_order',
+                  'current_cycle_used','status']
+        read_only_fields = ['id', 'status']
+        extra_kwargs = {'pickup_location': {'required': False}, 'dropoff_location': {'required': False}}
+
+class BatchTripSerializer(CreateTripSerializer):
+    """One item of a batch create; driver_id defaults to the first driver."""
+    driver_id = serializers.IntegerField(required=False, min_value=1)
+
+    class Meta(CreateTripSerializer.Meta):
+        fields = CreateTripSerializer.Meta.fields + ['driver_id']
+
+
+class TripJobSerializer(serializers.ModelSerializer):
+    """Serializes the progress of a background trip job."""
+    class Meta:
+        model = TripJob
+        fields = ['id', 'kind', 'status', 'attempts', 'max_attempts', 'progress', 'progress_message', 'last_error', 'run_after', 'created_at', 'finished_at']
 
 class DutyEventSerializer(serializers.ModelSerializer):
     """Serializes DutyEvents with status, times, location, remarks, and movement flag."""
@@ -86,4 +163,39 @@ class DutyEventSerializer(serializers.ModelSerializer):
         if obj.start_time and obj.end_time:
             diff = obj.end_time - obj.start_time
             return int(diff.total_seconds() / 60)
-        return 0
\ No newline at end of file
+        return 0
+
+class DutyEventIngestSerializer(serializers.Serializer):
+    """Validates one incoming duty event; daily_log is optional when the URL names the log."""
+    client_event_id = serializers.UUIDField(required=False, allow_null=True)
+    daily_log = serializers.UUIDField(required=False)
+    duty_event_status = serializers.ChoiceField(choices=DutyEvents.DUTY_EVENT_TYPE)
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField(required=False, allow_null=True)
+    truck_moved = serializers.BooleanField(default=True)
+    location = serializers.CharField(max_length=255)
+    remarks = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, attrs):
+        if attrs.get('end_time') and attrs['end_time'] <= attrs['start_time']:
+            raise serializers.ValidationError({'end_time': ['Must be after start_time.']})
+        return attrs
+
+class FleetComplianceSerializer(serializers.Serializer):
+    """Serializes a driver row annotated by fleet_compliance_queryset()."""
+    driver_id = serializers.IntegerField(source='id')
+    driver_name = serializers.CharField()
+    driver_number = serializers.CharField()
+    home_operation_center = serializers.CharField()
+    cycle_hours = serializers.FloatField()
+    remaining_cycle_hours = serializers.FloatField()
+    driving_limit_violations = serializers.IntegerField()
+    on_duty_limit_violations = serializers.IntegerField()
+    compliance_status = serializers.CharField()
+    risk_rank = serializers.IntegerField()
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['cycle_hours'] = round(data['cycle_hours'], 2)
+        data['remaining_cycle_hours'] = round(data['remaining_cycle_hours'], 2)
+        return data
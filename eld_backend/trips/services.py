@@ -1,59 +1,381 @@
-# import requests
-# import math
-# from datetime import datetime, timedelta
-# from django.utils import timezone
-# from typing import List, Dict, Any
-
-# class RouteCalculatorService():
-#     """Handles route calculation, distance, and estimated travel time using a map API."""
-#     def __init__(self):
-#         self.max_drive_time = 11 # 11 hrs limit
-#         self.max_cycle_hours = 70 #70hrs/8days
-#         self.max_on_duty_hours = 14 #14 hrs on-duty hrs
-#         self.required_rest_minutes = 30  # 30 minute break
-#         self.required_rest_after_hours = 8 # 8 hours driving
-#         self.max_distance_without_fuel = 1000  # mile
-
-#     def calculate_routes_with_stops(self,current_location:str,  dropoff_location:str, pickup_location:str,current_cycle_used: float):
-#         # get coodinates
-#         current_coords = self._coord_location(current_location)
-#         pickup_coords = self._coord_location(pickup_location)
-#         dropoff_coords = self._coord_location(dropoff_location)
-
-#         section1 = self._calculate_route_section(current_coords, pickup_coords)
-#         section2 = self._calculate_route_section(pickup_coords, dropoff_coords)
-
-#         total_distance = section1['distance'] + section2['distance']
-#         total_duration = section1['duration'] + section2['duration'] + 120  # plus 2 hrs
-
-#         def _geocode_location(self, location: str) -> Dict[str, float]:
-#             """Geocode a location using OpenStreetMap Nominatim"""
-#         try:
-#             url = 'https://nominatim.openstreetmap.org/search'
-#             params = {
-#                 'q': location,
-#                 'format': 'json',
-#                 'limit': 1,
-#                 'countrycodes': 'us'
-#             }
-            
-#             response = requests.get(url, params=params, timeout=10)
-#             response.raise_for_status()
-            
-#             results = response.json()
-#             if results:
-#                 return {
-#                     'lat': float(results[0]['lat']),
-#                     'lng': float(results[0]['lon']),
-#                     'name': results[0]['display_name']
-#                 }
-#             else:
-#                 raise ValueError(f"Location not found: {location}")
-                
-#         except Exception as e:
-#             # Fallback to some default coordinates if geocoding fails
-#             # In production, you'd want better error handling
-#             raise ValueError(f"Geocoding failed for {location}: {str(e)}")
-    
-
-    
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DailyLog, DutyEvents, Stop
+from . import hos_calculator
+from .conditional import deferred_trip_touches
+from .geocoding import geocode, geocoding_cache
+from .hos_calculator import HOSRules, route_tasks, trip_tasks
+from .log_totals import TOTAL_FIELDS
+from .summaries import apply_log_deltas
+from .geometry import encode_polyline, zoom_levels
+from .road_graph import haversine_m
+from .ors import close_async_ors_client
+from .routing import get_async_routing_client, get_routing_client
+from .stop_order import optimize_order
+from .travel_matrix import travel_matrix
+
+METERS_PER_MILE = 1609.34
+BULK_BATCH_SIZE = 500
+
+# Trip fields that feed the route; changing any of them invalidates the stored route
+ROUTE_LOCATION_FIELDS = ('current_location', 'pickup_location', 'dropoff_location', 'waypoints', 'optimize_stop_order')
+
+# Trip fields holding the stored route (an optimized trip also stores its stop order)
+ROUTE_FIELDS = [
+    'route_distance_miles', 'route_duration_hours', 'route_polyline', 'route_levels',
+    'pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude',
+    'waypoints', 'pickup_location', 'dropoff_location',
+]
+
+
+def trip_stops(trip):
+    """The stops a trip visits in its requested order, starting with the driver's current location."""
+    waypoints = trip.waypoints or [
+        {'location': trip.pickup_location, 'type': 'pickup'},
+        {'location': trip.dropoff_location, 'type': 'dropoff'},
+    ]
+    return [{'location': trip.current_location, 'type': 'current'}, *waypoints]
+
+
+def _check_geocoded(coords):
+    if not all(coords):
+        raise ValueError("Could not geocode addresses")
+
+
+def _reorderable(trip, stops):
+    # With one pickup and one dropoff after the current location there is only one valid order
+    return trip.optimize_stop_order and len(stops) > 3
+
+
+def _stop_order(stops, durations):
+    return optimize_order(durations, stops, settings.STOP_ORDER['MAX_ROUNDS'])
+
+
+def _distinct(points):
+    """Points without repeats of the previous one (a driver already at the pickup), as ORS expects."""
+    return [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+
+
+def get_route_data(trip, client=None):
+    """Get route data from the configured routing backend (OpenRouteService and/or the offline graph)"""
+    client = client or get_routing_client()
+
+    # Get coordinates for all stops (served from the geocoding cache when known)
+    stops = trip_stops(trip)
+    coords = [geocode(client, stop['location']) for stop in stops]  # [lon, lat]
+    return route_stops(client, trip, stops, coords)
+
+
+async def aget_route_data(trip, client=None):
+    """get_route_data() without blocking a thread: every trip location is geocoded concurrently
+    through the geocoding cache, then the route is requested. client is an async routing client.
+    """
+    client = client or get_async_routing_client()
+    stops = trip_stops(trip)
+    found = await geocoding_cache.ageocode_many(client, [stop['location'] for stop in stops])
+    coords = [found[stop['location']] for stop in stops]
+    _check_geocoded(coords)
+
+    order = list(range(len(stops)))
+    if _reorderable(trip, stops):
+        order = _stop_order(stops, (await travel_matrix.amatrix(client, coords))[1])
+    points = _distinct([coords[i] for i in order])
+    route = None
+    if len(points) > 1:
+        route = await client.directions(coordinates=points, profile='driving-hgv', format='geojson')
+    return shape_route(trip, route, stops, coords, order)
+
+
+def stop_order(client, trip, stops, coords):
+    """Visiting order of a trip's geocoded stops: as given, or optimized when the trip allows it."""
+    if not _reorderable(trip, stops):
+        return list(range(len(stops)))
+    # Durations between every pair of stops, cached per pair, so repeated lanes cost no calls
+    return _stop_order(stops, travel_matrix.matrix(client, coords)[1])
+
+
+def route_stops(client, trip, stops, coords, order=None):
+    """Requests truck directions through the geocoded stops, in the given order or the one from
+    stop_order(), and shapes the route data for the trip"""
+    _check_geocoded(coords)
+    if order is None:
+        order = stop_order(client, trip, stops, coords)
+    points = _distinct([coords[i] for i in order])
+    route = None
+    if len(points) > 1:
+        route = client.directions(
+            coordinates=points,
+            profile='driving-hgv',   # 'driving-car' also works
+            format='geojson'
+        )
+    return shape_route(trip, route, stops, coords, order)
+
+
+def _legs(route, points):
+    """(meters, seconds) per leg between consecutive points; repeated points are zero-length legs."""
+    moves = [i for i in range(1, len(points)) if points[i] != points[i - 1]]
+    legs = [(0.0, 0.0)] * (len(points) - 1)
+    if route is None:
+        return legs
+    properties = route['features'][0]['properties']
+    segments = properties.get('segments')
+    if segments and len(segments) == len(moves):
+        for i, segment in zip(moves, segments):
+            legs[i - 1] = (segment.get('distance', 0.0), segment.get('duration', 0.0))
+        return legs
+    # No per-leg breakdown: share the totals out by straight-line distance
+    straight = {i: haversine_m(*points[i - 1][:2], *points[i][:2]) for i in moves}
+    total = sum(straight.values()) or 1.0
+    summary = properties['summary']
+    for i in moves:
+        legs[i - 1] = (summary['distance'] * straight[i] / total, summary['duration'] * straight[i] / total)
+    return legs
+
+
+def shape_route(trip, route, stops, coords, order):
+    """Route data for a trip from an ORS GeoJSON directions response (None when every stop is one point)
+    through its stops in the given order."""
+    stops = [stops[i] for i in order]
+    points = [coords[i] for i in order]
+    legs = _legs(route, points)
+    if route is None:
+        geometry = {'type': 'LineString', 'coordinates': [points[0], points[0]]}
+    else:
+        geometry = route['features'][0]['geometry']
+
+    # Extract distance and duration, deadhead from the current location included
+    distance_miles = sum(meters for meters, seconds in legs) / METERS_PER_MILE
+    duration_hours = sum(seconds for meters, seconds in legs) / 3600
+    pickup = next(i for i, stop in enumerate(stops) if stop['type'] == 'pickup')
+    dropoff = max(i for i, stop in enumerate(stops) if stop['type'] == 'dropoff')
+
+    return {
+        'distance_miles': round(distance_miles, 2),
+        'duration_hours': round(duration_hours, 2),
+        'waypoints': stops,
+        'order': order,
+        'legs': [
+            {'distance_miles': round(meters / METERS_PER_MILE, 2), 'duration_hours': round(seconds / 3600, 2)}
+            for meters, seconds in legs
+        ],
+        'pickup_coords': points[pickup],
+        'dropoff_coords': points[dropoff],
+        'geometry': geometry,
+        'levels': zoom_levels(geometry['coordinates']),
+    }
+
+
+def apply_route(trip, route_data):
+    """Copies the route summary and encoded geometry onto the trip (caller saves)."""
+    trip.route_distance_miles = route_data['distance_miles']
+    trip.route_duration_hours = route_data['duration_hours']
+    trip.pickup_longitude, trip.pickup_latitude = route_data['pickup_coords'][:2]
+    trip.dropoff_longitude, trip.dropoff_latitude = route_data['dropoff_coords'][:2]
+    trip.route_polyline = encode_polyline(route_data['geometry']['coordinates'])
+    levels = route_data.get('levels')
+    trip.route_levels = levels if levels is not None else zoom_levels(route_data['geometry']['coordinates'])
+    if trip.waypoints:
+        # Keep the visiting order the route was planned with, and the first pickup / last dropoff it implies
+        trip.waypoints = route_data['waypoints'][1:]
+        trip.pickup_location = next(stop['location'] for stop in trip.waypoints if stop['type'] == 'pickup')
+        trip.dropoff_location = [stop['location'] for stop in trip.waypoints if stop['type'] == 'dropoff'][-1]
+
+
+def save_route(trip, route_data):
+    """Persists the computed route on the trip so the route endpoint never has to call ORS again."""
+    apply_route(trip, route_data)
+    trip.save(update_fields=ROUTE_FIELDS + ['updated_at', 'changed_at'])
+
+
+def clear_route(trip):
+    """Drops the stored route (it no longer matches the trip's locations) so it is computed on next read."""
+    trip.route_polyline = ''
+    trip.route_levels = {}
+    trip.save(update_fields=['route_polyline', 'route_levels', 'updated_at', 'changed_at'])
+
+
+def refresh_route(trip, client=None):
+    """Recomputes and stores the route for a trip. Returns the fresh route data."""
+    route_data = get_route_data(trip, client=client)
+    save_route(trip, route_data)
+    return route_data
+
+
+async def _route_once(trip):
+    # async_to_sync runs each call on a new event loop, whose client would otherwise never be closed
+    try:
+        return await aget_route_data(trip)
+    finally:
+        await close_async_ors_client()
+
+
+async def arefresh_route(trip, client=None):
+    """refresh_route() for async views."""
+    route_data = await aget_route_data(trip, client=client)
+    await sync_to_async(save_route)(trip, route_data)
+    return route_data
+
+
+def generate_trip_route_and_logs(trip, progress=None):
+    """Generate route information and ELD logs for the trip. Errors propagate to the caller."""
+    progress = progress or (lambda percent, message: None)
+
+    # Calculate route using OpenRouteService API and keep it on the trip
+    progress(10, 'Calculating route')
+    route_data = async_to_sync(_route_once)(trip)
+
+    progress(50, 'Planning stops and daily logs')
+    plan = build_trip_plan(trip, route_data)
+
+    progress(80, 'Saving trip plan')
+    save_trip_plan(trip, route_data, plan)
+
+    return route_data
+
+
+@dataclass
+class TripPlan:
+    """Unsaved rows for a trip, built in memory so they can be written in a handful of bulk INSERTs."""
+    stops: list = field(default_factory=list)
+    daily_logs: list = field(default_factory=list)
+    duty_events: list = field(default_factory=list)
+
+
+def plan_trip_hours(trip, route_data, cycle_rule='70_8'):
+    """Runs the HOS planner for a trip, starting from the driver's current cycle hours."""
+    rules = HOSRules.from_settings(settings.ELD_SETTINGS, cycle_rule)
+    if 'legs' in route_data:
+        tasks = route_tasks(
+            [(stop['location'], stop['type']) for stop in route_data['waypoints']],
+            [(leg['distance_miles'], leg['duration_hours']) for leg in route_data['legs']],
+        )
+    else:
+        # Hand-built route data (benchmarks) is a single pickup -> dropoff drive
+        tasks = trip_tasks(
+            route_data['distance_miles'], route_data['duration_hours'],
+            current_location=trip.current_location,
+            pickup_location=trip.pickup_location,
+            dropoff_location=trip.dropoff_location,
+        )
+    return hos_calculator.plan(tasks, rules, current_cycle_used=trip.current_cycle_used)
+
+
+def build_trip_plan(trip, route_data, start_time=None):
+    """Builds the stops, daily logs and duty events for a trip without touching the database."""
+    start_time = start_time or timezone.now().replace(second=0, microsecond=0)
+    hos_plan = plan_trip_hours(trip, route_data)
+
+    plan = TripPlan(stops=build_trip_stops(trip, hos_plan, start_time))
+    plan.daily_logs, plan.duty_events = build_daily_logs(trip, hos_plan, start_time)
+    return plan
+
+
+def save_trip_plan(trip, route_data, plan):
+    """Replaces the trip's route, stops, logs and events atomically using batched inserts."""
+    with transaction.atomic(), deferred_trip_touches():
+        # Retries and re-plans start from a clean slate; events go with their logs, so no log
+        # totals are adjusted for rows that are about to disappear
+        DailyLog.objects.filter(trip=trip).delete()
+        Stop.objects.filter(trip=trip).delete()
+
+        save_route(trip, route_data)
+        Stop.objects.bulk_create(plan.stops, batch_size=BULK_BATCH_SIZE)
+        DailyLog.objects.bulk_create(plan.daily_logs, batch_size=BULK_BATCH_SIZE)
+        DutyEvents.objects.bulk_create(plan.duty_events, batch_size=BULK_BATCH_SIZE)
+
+        # bulk_create skips signals, so the per-day summaries are updated explicitly
+        apply_log_deltas(plan.daily_logs)
+
+
+def build_trip_stops(trip, hos_plan, start_time):
+    """Build (unsaved) stops for every planned inspection, load, fuel stop and rest"""
+    return [
+        Stop(
+            trip=trip,
+            location=segment.location,
+            stop_type=segment.stop_type,
+            arrival_time=start_time + timedelta(hours=segment.start),
+            depature_time=start_time + timedelta(hours=segment.end),
+            duration=round(segment.hours, 2),
+        )
+        for segment in hos_plan.segments if segment.stop_type
+    ]
+
+
+def split_by_day(hos_plan, start_time):
+    """Yields (date, [(status, start, end, segment)]) for each calendar day the plan touches.
+
+    Segments crossing midnight are split, and each day is padded with off-duty time so it covers
+    the full 24 hours of the log sheet.
+    """
+    def midnight(day):
+        return timezone.make_aware(datetime.combine(day, time(0, 0)))
+
+    day = timezone.localtime(start_time).date()
+    day_end = midnight(day + timedelta(days=1))
+    cursor = midnight(day)
+    entries = []
+
+    for segment in hos_plan.segments:
+        seg_start = start_time + timedelta(hours=segment.start)
+        seg_end = start_time + timedelta(hours=segment.end)
+        if seg_start > cursor:
+            entries.append(('off_duty', cursor, seg_start, None))
+            cursor = seg_start
+
+        while seg_end > day_end:
+            entries.append((segment.status, cursor, day_end, segment))
+            yield day, entries
+            day += timedelta(days=1)
+            cursor, day_end, entries = day_end, midnight(day + timedelta(days=1)), []
+        entries.append((segment.status, cursor, seg_end, segment))
+        cursor = seg_end
+
+    if cursor < day_end:
+        entries.append(('off_duty', cursor, day_end, None))
+    yield day, entries
+
+
+def build_daily_logs(trip, hos_plan, start_time):
+    """Build (unsaved) daily ELD logs and their duty events from an HOS plan"""
+    daily_logs = []
+    duty_events = []
+    for day, entries in split_by_day(hos_plan, start_time):
+        # Daily log (UUID primary key is assigned here, so events can reference it before saving)
+        daily_log = DailyLog(
+            trip=trip,
+            driver=trip.driver,
+            date=day,
+            total_driving_miles=0,
+            vehicle_number=f"T{trip.driver.driver_number}"
+        )
+        for status, start, end, segment in entries:
+            hours = (end - start).total_seconds() / 3600
+            field_name = TOTAL_FIELDS[status]
+            setattr(daily_log, field_name, getattr(daily_log, field_name) + hours)
+            if segment is not None and segment.miles:
+                # Miles are spread evenly over a driving segment that crosses midnight
+                daily_log.total_driving_miles += segment.miles * hours / segment.hours
+            duty_events.append(DutyEvents(
+                daily_log=daily_log,
+                duty_event_status=status,
+                start_time=start,
+                end_time=end,
+                location=segment.location if segment else trip.current_location,
+                remarks=segment.remark if segment else 'Off duty',
+                truck_moved=status == 'driving',
+                planner_padding=segment is None,
+            ))
+
+        for field_name in TOTAL_FIELDS.values():
+            setattr(daily_log, field_name, round(getattr(daily_log, field_name), 2))
+        daily_log.total_driving_miles = round(daily_log.total_driving_miles, 1)
+        daily_logs.append(daily_log)
+
+    return daily_logs, duty_events
@@ -0,0 +1,137 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django.db.models import QuerySet
+
+from .clocks import advance_clocks, mark_clocks_stale
+from .conditional import touch_trips
+from .live import publish_duty_events
+from .log_totals import add_event, apply_event_deltas, event_deltas
+from .models import DailyLog, DutyEvents, Stop, Trip
+from .summaries import apply_deltas, log_totals
+
+
+@receiver(pre_save, sender=DailyLog)
+def remember_log_totals(sender, instance, raw=False, **kwargs):
+    """Keeps the stored totals of an edited log so post_save can apply only the difference."""
+    instance._summary_previous = None
+    if raw or instance._state.adding:
+        return
+    previous = DailyLog.objects.filter(pk=instance.pk).values(
+        'driver_id', 'date', 'total_driving_time', 'total_on_duty_time').first()
+    if previous:
+        instance._summary_previous = previous
+
+
+@receiver(post_save, sender=DailyLog)
+def add_log_to_day_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = {}
+    driving, on_duty = log_totals(instance)
+    deltas[(instance.driver_id, instance.date)] = [driving, on_duty]
+
+    previous = getattr(instance, '_summary_previous', None)
+    if previous:
+        key = (previous['driver_id'], previous['date'])
+        delta = deltas.setdefault(key, [0.0, 0.0])
+        delta[0] -= previous['total_driving_time'] or 0.0
+        delta[1] -= previous['total_on_duty_time'] or 0.0
+    apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=DailyLog)
+def remove_log_from_day_summary(sender, instance, **kwargs):
+    driving, on_duty = log_totals(instance)
+    apply_deltas({(instance.driver_id, instance.date): (-driving, -on_duty)})
+
+
+@receiver(pre_save, sender=DutyEvents)
+def remember_event_hours(sender, instance, raw=False, **kwargs):
+    """Keeps what an edited event counted before, so post_save can move the log totals by the difference."""
+    instance._totals_previous = None
+    if raw or instance._state.adding:
+        return
+    instance._totals_previous = DutyEvents.objects.filter(pk=instance.pk).values_list(
+        'daily_log_id', 'duty_event_status', 'start_time', 'end_time').first()
+
+
+@receiver(post_save, sender=DutyEvents)
+def add_event_to_log_totals(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = event_deltas([instance])
+    previous = getattr(instance, '_totals_previous', None)
+    if previous:
+        add_event(deltas, *previous, sign=-1)
+    apply_event_deltas(deltas)
+
+
+@receiver(post_delete, sender=DutyEvents)
+def remove_event_from_log_totals(sender, instance, origin=None, **kwargs):
+    # When the log itself is being deleted there are no totals left to correct
+    if not _cascaded_from(origin, Trip, DailyLog):
+        apply_event_deltas(event_deltas([instance], sign=-1))
+
+
+@receiver(post_save, sender=DutyEvents)
+def advance_driver_clock(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        advance_clocks([instance])
+        return
+    previous = getattr(instance, '_totals_previous', None)
+    mark_clocks_stale(log_ids=[instance.daily_log_id, previous[0] if previous else None])
+
+
+@receiver(post_save, sender=DutyEvents)
+def publish_new_event(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        log = DailyLog.objects.filter(pk=instance.daily_log_id).values_list('trip_id', 'driver_id').first()
+        if log:
+            publish_duty_events([instance], {instance.daily_log_id: log})
+
+
+@receiver(post_delete, sender=DutyEvents)
+def invalidate_clock_on_event_delete(sender, instance, origin=None, **kwargs):
+    # Cascades are covered once per log by the DailyLog receiver below
+    if not _cascaded_from(origin, Trip, DailyLog):
+        mark_clocks_stale(log_ids=[instance.daily_log_id])
+
+
+@receiver(post_delete, sender=DailyLog)
+def invalidate_clock_on_log_delete(sender, instance, **kwargs):
+    mark_clocks_stale(driver_ids=[instance.driver_id])
+
+
+def _cascaded_from(origin, *models):
+    """True when a delete is a cascade from one of the models, whose own delete covers the touch."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_save, sender=Stop)
+@receiver(post_save, sender=DailyLog)
+def touch_trip_on_child_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_trips([instance.trip_id])
+
+
+@receiver(post_delete, sender=Stop)
+@receiver(post_delete, sender=DailyLog)
+def touch_trip_on_child_delete(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from(origin, Trip):
+        touch_trips([instance.trip_id])
+
+
+@receiver(post_save, sender=DutyEvents)
+def touch_trip_on_event_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_trips(log_ids=[instance.daily_log_id])
+
+
+@receiver(post_delete, sender=DutyEvents)
+def touch_trip_on_event_delete(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from(origin, Trip, DailyLog):
+        touch_trips(log_ids=[instance.daily_log_id])
@@ -0,0 +1,93 @@
+"""Stop ordering for multi-stop trips: an open-path TSP with pickup-before-dropoff precedence.
+
+Stop 0 is where the driver is now and always comes first; the route ends at whichever stop is
+visited last. A nearest-neighbour tour is built first, then improved with 2-opt (reverse a run of
+stops) and relocation (move one stop elsewhere) until neither finds a shorter feasible order.
+Costs come from a travel matrix (usually durations) and may be asymmetric; None marks a pair
+with no route.
+"""
+import math
+
+EPSILON = 1e-9
+
+
+def precedence(stops):
+    """{index: set of indices that must be visited before it} for stops [{'type', 'load'}, ...].
+
+    A dropoff waits for the pickups of its load. Stops without a load are one shared load, so
+    every unlabelled pickup comes before every unlabelled dropoff.
+    """
+    pickups = {}
+    for index, stop in enumerate(stops):
+        if stop.get('type') == 'pickup':
+            pickups.setdefault(stop.get('load') or '', set()).add(index)
+    return {
+        index: pickups.get(stop.get('load') or '', set())
+        for index, stop in enumerate(stops) if stop.get('type') == 'dropoff'
+    }
+
+
+def feasible(order, before):
+    seen = set()
+    for index in order:
+        if not before.get(index, set()) <= seen:
+            return False
+        seen.add(index)
+    return True
+
+
+def path_cost(order, cost):
+    total = 0.0
+    for a, b in zip(order, order[1:]):
+        value = cost[a][b]
+        if value is None:
+            return math.inf
+        total += value
+    return total
+
+
+def nearest_neighbour(cost, before):
+    """Greedy order from stop 0: always the closest stop whose predecessors are all visited."""
+    order, left = [0], set(range(1, len(cost)))
+    while left:
+        here = order[-1]
+        ready = [index for index in left if before.get(index, set()) <= set(order)]
+        if not ready:
+            raise ValueError("Stop precedence has a cycle")
+        index = min(ready, key=lambda j: (math.inf if cost[here][j] is None else cost[here][j], j))
+        order.append(index)
+        left.remove(index)
+    return order
+
+
+def improve(order, cost, before, max_rounds=100):
+    """Applies improving 2-opt and relocation moves (stop 0 stays first) until none is left."""
+    best = path_cost(order, cost)
+    size = len(order)
+    for _ in range(max_rounds):
+        improved = False
+        candidates = (
+            # 2-opt: reverse order[i:k + 1]
+            [order[:i] + order[i:k + 1][::-1] + order[k + 1:] for i in range(1, size - 1) for k in range(i + 1, size)]
+            # Relocation: move order[i] to position j
+            + [_moved(order, i, j) for i in range(1, size) for j in range(1, size) if j not in (i, i - 1)]
+        )
+        for candidate in candidates:
+            candidate_cost = path_cost(candidate, cost)
+            if candidate_cost < best - EPSILON and feasible(candidate, before):
+                order, best, improved = candidate, candidate_cost, True
+                break
+        if not improved:
+            break
+    return order
+
+
+def _moved(order, i, j):
+    rest = order[:i] + order[i + 1:]
+    return rest[:j] + [order[i]] + rest[j:]
+
+
+def optimize_order(cost, stops, max_rounds=100):
+    """Visiting order (indices, starting with 0) that keeps precedence and minimizes total cost."""
+    before = precedence(stops)
+    return improve(nearest_neighbour(cost, before), cost, before, max_rounds)
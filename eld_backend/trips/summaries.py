@@ -0,0 +1,186 @@
+"""Incremental maintenance of DriverDaySummary and rolling cycle-hour reads."""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Case, CharField, Count, F, FilteredRelation, FloatField, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, Greatest, Rank
+from django.utils import timezone
+
+from .models import DailyLog, Driver, DriverDaySummary, driver_name_expression
+
+# cycle rule -> (days in the rolling window, ELD_SETTINGS key for the hour limit)
+CYCLE_RULES = {
+    '70_8': (8, 'MAX_CYCLE_HOURS_70_8'),
+    '60_7': (7, 'MAX_CYCLE_HOURS_60_7'),
+}
+
+
+def cycle_rule(rule):
+    """Returns (window_days, max_hours) for a cycle rule name, raising ValueError for unknown rules."""
+    try:
+        days, setting = CYCLE_RULES[rule]
+    except KeyError:
+        raise ValueError(f"Unknown cycle rule '{rule}', expected one of: {', '.join(CYCLE_RULES)}")
+    return days, settings.ELD_SETTINGS[setting]
+
+
+def cycle_window(days, today=None):
+    """(first, last) dates of a rolling window of `days` days ending today (inclusive)."""
+    today = today or timezone.localdate()
+    return today - timedelta(days=days - 1), today
+
+
+def cycle_hours_subquery(window, driver_ref='pk'):
+    """Correlated subquery summing a driver's on-duty hours (driving included) within a window.
+
+    Planned future days are excluded: the window ends today.
+    """
+    summaries = (
+        DriverDaySummary.objects
+        .filter(driver=OuterRef(driver_ref), date__range=window)
+        .values('driver')
+        .annotate(total=Sum(F('driving_hours') + F('on_duty_hours')))
+        .values('total')
+    )
+    return Coalesce(Subquery(summaries, output_field=FloatField()), Value(0.0))
+
+
+def log_totals(log):
+    return log.total_driving_time or 0.0, log.total_on_duty_time or 0.0
+
+
+def apply_deltas(deltas):
+    """Applies {(driver_id, date): (driving, on_duty)} hour deltas to the summary table.
+
+    Runs a constant number of queries however many driver-days change: one read of the rows that
+    exist, one UPDATE adding to all of them and one INSERT for the rest.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+    existing = set(DriverDaySummary.objects.filter(_driver_days(deltas)).values_list('driver_id', 'date'))
+
+    if existing:
+        def added(index):
+            return Case(*[When(driver_id=driver_id, date=date, then=Value(deltas[driver_id, date][index]))
+                          for driver_id, date in existing], default=Value(0.0), output_field=FloatField())
+        DriverDaySummary.objects.filter(_driver_days(existing)).update(
+            driving_hours=F('driving_hours') + added(0), on_duty_hours=F('on_duty_hours') + added(1),
+            updated_at=timezone.now())
+
+    missing = [key for key in deltas if key not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            DriverDaySummary.objects.bulk_create([
+                DriverDaySummary(driver_id=driver_id, date=date, driving_hours=deltas[driver_id, date][0],
+                                 on_duty_hours=deltas[driver_id, date][1])
+                for driver_id, date in missing
+            ], batch_size=1000)
+    except IntegrityError:
+        # Another writer created some of the rows first; add to those one by one
+        for key in missing:
+            _apply_delta(*key, *deltas[key])
+
+
+def _driver_days(keys):
+    condition = Q()
+    for driver_id, date in keys:
+        condition |= Q(driver_id=driver_id, date=date)
+    return condition
+
+
+def _apply_delta(driver_id, date, driving, on_duty):
+    values = {
+        'driving_hours': F('driving_hours') + driving,
+        'on_duty_hours': F('on_duty_hours') + on_duty,
+        'updated_at': timezone.now(),
+    }
+    if DriverDaySummary.objects.filter(driver_id=driver_id, date=date).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            DriverDaySummary.objects.create(driver_id=driver_id, date=date, driving_hours=driving,
+                                            on_duty_hours=on_duty)
+    except IntegrityError:
+        DriverDaySummary.objects.filter(driver_id=driver_id, date=date).update(**values)
+
+
+def apply_log_deltas(logs, sign=1):
+    """Adds (sign=1) or removes (sign=-1) the totals of many DailyLogs, grouped per driver-day."""
+    deltas = defaultdict(lambda: [0.0, 0.0])
+    for log in logs:
+        driving, on_duty = log_totals(log)
+        delta = deltas[(log.driver_id, log.date)]
+        delta[0] += sign * driving
+        delta[1] += sign * on_duty
+    apply_deltas(deltas)
+
+
+def rebuild_day_summaries(driver_ids=None):
+    """Recomputes summaries from DailyLog totals. Returns the number of rows written."""
+    logs = DailyLog.objects.all()
+    summaries = DriverDaySummary.objects.all()
+    if driver_ids is not None:
+        logs = logs.filter(driver_id__in=driver_ids)
+        summaries = summaries.filter(driver_id__in=driver_ids)
+
+    rows = [
+        DriverDaySummary(driver_id=row['driver_id'], date=row['date'],
+                         driving_hours=row['driving'] or 0.0, on_duty_hours=row['on_duty'] or 0.0)
+        for row in logs.order_by().values('driver_id', 'date').annotate(
+            driving=Sum('total_driving_time'), on_duty=Sum('total_on_duty_time'))
+    ]
+    with transaction.atomic():
+        summaries.delete()
+        DriverDaySummary.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def fleet_compliance_queryset(rule='70_8', lookback_days=None, today=None):
+    """Every driver with cycle hours, remaining hours and daily limit violations, in one GROUP BY query.
+
+    Only summary rows inside the lookback window are joined (FilteredRelation), so the cost per driver
+    is bounded by the window, not by the driver's history. Daily violations are days where driving
+    exceeded the daily driving limit or driving + on duty exceeded the on-duty limit.
+    """
+    window_days, max_cycle_hours = cycle_rule(rule)
+    lookback_days = max(lookback_days or window_days, window_days)
+    cycle_start, today = cycle_window(window_days, today)
+    lookback_start = today - timedelta(days=lookback_days - 1)
+    max_driving = settings.ELD_SETTINGS['MAX_DRIVING_HOURS_PER_DAY']
+    max_on_duty = settings.ELD_SETTINGS['MAX_ON_DUTY_HOURS_PER_DAY']
+
+    cycle_hours = Coalesce(
+        Sum(F('recent__driving_hours') + F('recent__on_duty_hours'), filter=Q(recent__date__gte=cycle_start)),
+        Value(0.0),
+    )
+    return (
+        Driver.objects
+        .annotate(recent=FilteredRelation(
+            'day_summaries', condition=Q(day_summaries__date__range=(lookback_start, today))))
+        .annotate(
+            driver_name=driver_name_expression(prefix=''),
+            cycle_hours=cycle_hours,
+            remaining_cycle_hours=Greatest(Value(float(max_cycle_hours)) - cycle_hours, Value(0.0)),
+            driving_limit_violations=Count('recent', filter=Q(recent__driving_hours__gt=max_driving)),
+            on_duty_limit_violations=Count(
+                'recent', filter=Q(recent__on_duty_hours__gt=max_on_duty - F('recent__driving_hours'))),
+        )
+        .annotate(
+            compliance_status=Case(
+                When(Q(remaining_cycle_hours__lte=0) | Q(driving_limit_violations__gt=0)
+                     | Q(on_duty_limit_violations__gt=0), then=Value('violation')),
+                default=Value('compliant'),
+                output_field=CharField(),
+            ),
+            # 1 = closest to running out of cycle hours
+            risk_rank=Window(Rank(), order_by=cycle_hours.desc()),
+        )
+        .order_by('-cycle_hours', 'id')
+    )
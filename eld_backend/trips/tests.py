@@ -1,3 +1,1710 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import signal
+import tempfile
+import uuid
+from collections import Counter
+from datetime import date, datetime, timedelta
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.utils import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openrouteservice import exceptions
+from rest_framework.test import APIClient
+
+from . import hos_calculator
+from .clocks import driver_clock
+from .eld_output import check_value, file_check_value
+from .fake_ors import fake_coordinates, fake_matrix, fake_route, make_server, start_in_thread
+from .ingestion import ingest_duty_events
+from .jobs import JOB_HANDLERS, backoff_delay, claim_next_job, enqueue_trip_generation, requeue_stale_jobs, run_job
+from .log_grid import DUTY_LINE_COLOR, grid_renderer
+from .batch import create_trips_in_bulk
+from .geocoding import GeocodingCache, LRUCache, geocoding_cache, normalize_address
+from .geometry import decode_polyline, encode_polyline, simplify, zoom_levels, zoom_tolerance
+from .hos_calculator import HOSRules, trip_tasks
+from .hos_clock import ClockState, clocks, consume
+from . import live
+from .live import Broker, broker, driver_channel, publish, publish_many, trip_channel
+from .log_totals import reconcile_log_totals
+from .models import (
+    DailyLog, Driver, DriverClock, DriverDaySummary, DutyEvents, GeocodeCache, LiveEvent, Stop,
+    TravelMatrixCache, Trip, TripJob,
+)
+from .ors import (
+    AsyncORSClient, ORSGuard, ORSUnavailable, TokenBucket, get_async_ors_client, get_ors_client, get_ors_guard,
+)
+from .response_cache import response_cache
+from .road_graph import RoadGraph, build_from_osm, haversine_m, write_graph
+from .services import aget_route_data, build_trip_plan, refresh_route, save_trip_plan
+from .stop_order import optimize_order, path_cost
+from .travel_matrix import travel_matrix
+from .summaries import rebuild_day_summaries
+from .views import DailyLogListView, DutyEventListView, TripListCreateView
+
+
+def make_driver(username='driver', **kwargs):
+    user = User.objects.create(username=username, first_name='Jane', last_name='Doe')
+    defaults = {'driver_number': '1001', 'initials': 'JD', 'home_operation_center': 'Chicago'}
+    defaults.update(kwargs)
+    return Driver.objects.create(user=user, **defaults)
+
+
+def make_trip(driver, days=2, stops=3, events_per_day=4):
+    """Creates a trip with daily logs, duty events and stops."""
+    trip = Trip.objects.create(
+        driver=driver, current_location='Chicago, IL', pickup_location='Chicago, IL',
+        dropoff_location='Dallas, TX', current_cycle_used=10, status='ready',
+    )
+    now = timezone.now()
+    for i in range(stops):
+        Stop.objects.create(trip=trip, location=f'Stop {i}', stop_type='fuel', arrival_time=now + timedelta(hours=i),
+                            depature_time=now + timedelta(hours=i, minutes=30), duration=0.5)
+    for day in range(days):
+        log = DailyLog.objects.create(trip=trip, driver=driver, date=date.today() + timedelta(days=day),
+                                      total_driving_time=8, total_on_duty_time=2, total_driving_miles=400)
+        for i in range(events_per_day):
+            start = now + timedelta(days=day, hours=i)
+            DutyEvents.objects.create(daily_log=log, duty_event_status='driving', start_time=start,
+                                      end_time=start + timedelta(minutes=45), location='On Route')
+    return trip
+
+
+class CountingClient:
+    """In-process stand-in for a routing client that answers like fake_ors and counts its calls."""
+
+    def __init__(self):
+        self.calls = Counter()
+
+    def pelias_search(self, text):
+        self.calls['pelias_search'] += 1
+        return {'features': [{'geometry': {'coordinates': fake_coordinates(text)}, 'properties': {'label': text}}]}
+
+    def directions(self, coordinates, **options):
+        self.calls['directions'] += 1
+        return fake_route(coordinates)
+
+    def distance_matrix(self, locations, sources=None, destinations=None, **options):
+        self.calls['distance_matrix'] += 1
+        return fake_matrix(locations, sources, destinations)
+
+
+class AsyncCountingClient:
+    """CountingClient for async callers."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def pelias_search(self, text):
+        return self.client.pelias_search(text)
+
+    async def directions(self, coordinates, **options):
+        return self.client.directions(coordinates, **options)
+
+    async def distance_matrix(self, locations, **options):
+        return self.client.distance_matrix(locations, **options)
+
+
+class QueryCountTests(TestCase):
+    """Listing and detail endpoints must run a constant number of queries, however many rows they return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drivers = [make_driver(f'driver{i}', driver_number=f'10{i}') for i in range(3)]
+        cls.trips = [make_trip(cls.drivers[i % 3]) for i in range(25)]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_trip_list_query_count_is_independent_of_page_size(self):
+        # validator, trips (with annotated driver name), prefetched logs, prefetched stops; no page COUNT
+        for page_size in (1, 5, 20):
+            with mock.patch.object(TripListCreateView.pagination_class, 'page_size', page_size):
+                with self.assertNumQueries(4):
+                    response = self.client.get(reverse('trips:trip-list-create'))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+            first = response.data['results'][0]
+            self.assertEqual(first['driver_name'], 'Jane Doe')
+            self.assertEqual(len(first['daily_logs']), 2)
+            self.assertEqual(first['daily_logs'][0]['driver_name'], 'Jane Doe')
+            self.assertEqual(len(first['stops']), 3)
+
+    def test_trip_list_page_number_mode(self):
+        # ?page= keeps the previous response shape, COUNT included
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('trips:trip-list-create'), {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_trip_detail_query_count(self):
+        trip = make_trip(self.drivers[0], days=10, stops=8)
+        # validator, trip, logs, stops
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('trips:trip-detail', args=[trip.id]))
+        self.assertEqual(len(response.data['daily_logs']), 10)
+        self.assertEqual(len(response.data['stops']), 8)
+
+    def test_daily_log_list_query_count(self):
+        for days in (1, 12):
+            trip = make_trip(self.drivers[1], days=days)
+            # validator and logs with annotated driver name
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('trips:daily-logs', args=[trip.id]))
+            self.assertEqual(len(response.data['results']), days)
+            self.assertEqual(response.data['results'][0]['driver_name'], 'Jane Doe')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        driver = make_driver()
+        for _ in range(7):
+            make_trip(driver, days=0, stops=0)
+        # Ties on updated_at must be broken by id, not skipped or repeated
+        Trip.objects.update(updated_at=timezone.now())
+        self.expected = [str(pk) for pk in Trip.objects.order_by('updated_at', 'id').values_list('id', flat=True)]
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.append([trip['id'] for trip in response.data['results']])
+            url = response.data[link]
+        return ids
+
+    def test_walks_forward_and_back_without_gaps(self):
+        pages = self.walk(reverse('trips:trip-list-create') + '?page_size=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        last_page = self.client.get(reverse('trips:trip-list-create') + '?page_size=3').data
+        last_page = self.client.get(self.client.get(last_page['next']).data['next']).data
+        back = self.walk(last_page['previous'], 'previous')
+        self.assertEqual(back, [self.expected[3:6], self.expected[0:3]])
+
+    def test_child_writes_do_not_move_trips_between_pages(self):
+        first = self.client.get(reverse('trips:trip-list-create') + '?page_size=3').data
+        seen = [trip['id'] for trip in first['results']]
+        # Device ingestion and stop edits on a trip already listed must not bring it back on a later page
+        trip = Trip.objects.get(pk=seen[0])
+        log = DailyLog.objects.create(trip=trip, driver=trip.driver, date=date.today(), total_driving_miles=0)
+        ingest_duty_events([{'daily_log': str(log.id), 'duty_event_status': 'on_duty', 'location': 'Yard',
+                             'start_time': timezone.now() - timedelta(hours=2),
+                             'end_time': timezone.now() - timedelta(hours=1)}])
+        Stop.objects.create(trip=trip, location='Fuel', stop_type='fuel', arrival_time=timezone.now(),
+                            depature_time=timezone.now(), duration=0.5)
+        rest = self.walk(first['next'], 'next')
+        self.assertEqual(seen + sum(rest, []), self.expected)
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('trips:trip-list-create'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = make_trip(make_driver(), days=2, stops=2, events_per_day=2)
+        self.log = self.trip.daily_logs.order_by('date').first()
+
+    def assert_revalidates(self, url, write):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        # A current copy is answered from the validator query alone
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        write()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_trip_detail_follows_stop_writes(self):
+        stop = self.trip.stops.first()
+        stop.location = 'Moved'
+        self.assert_revalidates(reverse('trips:trip-detail', args=[self.trip.id]), stop.save)
+
+    def test_daily_logs_follow_log_deletes(self):
+        url = reverse('trips:daily-logs', args=[self.trip.id])
+        self.assert_revalidates(url, self.trip.daily_logs.order_by('date').last().delete)
+
+    def test_events_follow_event_writes(self):
+        event = DutyEvents.objects.filter(daily_log=self.log).first()
+        event.remarks = 'Edited'
+        self.assert_revalidates(reverse('trips:duty-events', args=[self.log.id]), event.save)
+
+    def test_trip_list_follows_trip_deletes(self):
+        other = make_trip(self.trip.driver, days=0, stops=0)
+        self.assert_revalidates(reverse('trips:trip-list-create'), other.delete)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = make_trip(make_driver(), days=3, stops=2)
+        response_cache.reset_stats()
+
+    def test_hits_skip_serialization_until_a_child_changes(self):
+        url = reverse('trips:trip-detail', args=[self.trip.id])
+        first = self.client.get(url).data
+        # validator only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data, first)
+
+        log = self.trip.daily_logs.order_by('date').first()
+        log.total_driving_miles = 123
+        log.save()
+        fresh = self.client.get(url).data
+        self.assertEqual(fresh['daily_logs'][0]['total_driving_miles'], 123)
+        self.assertEqual(response_cache.stats()['hits'], 1)
+        self.assertEqual(response_cache.stats()['misses'], 2)
+
+    def test_pages_are_cached_separately(self):
+        url = reverse('trips:daily-logs', args=[self.trip.id])
+        first = self.client.get(url, {'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertNotEqual(first['results'], second['results'])
+        self.assertEqual(self.client.get(url, {'page_size': 1}).data, first)
+        self.assertEqual(self.client.get(reverse('trips:metrics')).data['response_cache']['hits'], 1)
+
+
+class HOSPlannerTests(SimpleTestCase):
+    rules = HOSRules()
+
+    def assert_compliant(self, plan, current_cycle_used):
+        """Replays the segments and checks every driving minute against the rules."""
+        driven = since_break = 0.0
+        window_start = None
+        cycle = current_cycle_used
+        for segment in plan.segments:
+            if segment.status in ('off_duty', 'sleeper_berth'):
+                if segment.hours >= self.rules.restart_hours:
+                    cycle = 0.0
+                if segment.hours >= self.rules.required_rest:
+                    driven, window_start = 0.0, None
+                if segment.hours >= self.rules.break_duration:
+                    since_break = 0.0
+                continue
+            if window_start is None:
+                window_start = segment.start
+            cycle += segment.hours
+            self.assertLessEqual(cycle, self.rules.cycle_limit + 1e-6)
+            if segment.status == 'on_duty':
+                if segment.hours >= self.rules.break_duration:
+                    since_break = 0.0
+                continue
+            driven += segment.hours
+            since_break += segment.hours
+            self.assertLessEqual(driven, self.rules.max_driving + 1e-6)
+            self.assertLessEqual(since_break, self.rules.break_after_driving + 1e-6)
+            self.assertLessEqual(segment.end - window_start, self.rules.max_window + 1e-6)
+
+    def test_short_trip_needs_no_rest(self):
+        plan = hos_calculator.plan(trip_tasks(200, 4), self.rules)
+        self.assertEqual([s.status for s in plan.segments], ['on_duty', 'on_duty', 'driving', 'on_duty', 'on_duty'])
+        self.assertAlmostEqual(plan.total_hours, 7.0)
+
+    def test_break_after_eight_hours_of_driving(self):
+        plan = hos_calculator.plan(trip_tasks(500, 10), self.rules)
+        breaks = [s for s in plan.segments if s.remark == '30-minute break']
+        self.assertEqual(len(breaks), 1)
+        self.assertAlmostEqual(breaks[0].start, 1.5 + 8)
+
+    def test_cycle_exhaustion_inserts_restart(self):
+        plan = hos_calculator.plan(trip_tasks(600, 12), self.rules, current_cycle_used=65)
+        self.assertEqual(plan.restarts, 1)
+        self.assert_compliant(plan, 65)
+
+    def test_long_trips_stay_compliant(self):
+        for miles, hours, cycle_used in [(3000, 55, 0), (2500, 45, 60), (1200, 22, 30), (5000, 95, 69)]:
+            plan = hos_calculator.plan(trip_tasks(miles, hours), self.rules, current_cycle_used=cycle_used)
+            self.assertAlmostEqual(plan.driving_hours, hours)
+            self.assertAlmostEqual(sum(s.miles for s in plan.segments), miles)
+            self.assert_compliant(plan, cycle_used)
+
+
+class DriverDaySummaryTests(TestCase):
+    def setUp(self):
+        self.driver = make_driver()
+        self.client = APIClient()
+
+    def summaries(self):
+        # Days whose logs were all deleted keep a zeroed row, which is equivalent to no row
+        rows = DriverDaySummary.objects.order_by('date').values_list('date', 'driving_hours', 'on_duty_hours')
+        return [row for row in rows if row[1] or row[2]]
+
+    def test_summaries_follow_log_edits_and_deletes(self):
+        trip = make_trip(self.driver, days=3)
+        log = trip.daily_logs.order_by('date').first()
+        log.total_driving_time = 10
+        log.date -= timedelta(days=1)
+        log.save()
+        make_trip(self.driver, days=1)
+        trip.daily_logs.order_by('date').last().delete()
+
+        incremental = self.summaries()
+        rebuild_day_summaries()
+        self.assertEqual(incremental, self.summaries())
+
+    def test_stats_use_one_query_for_either_cycle_rule(self):
+        today = date.today()
+        trip = make_trip(self.driver, days=0)
+        for days_ago in range(12):
+            DailyLog.objects.create(trip=trip, driver=self.driver, date=today - timedelta(days=days_ago),
+                                    total_driving_time=5, total_on_duty_time=1, total_driving_miles=250)
+
+        for rule, expected in (('70_8', 48), ('60_7', 42)):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('trips:driver-stats', args=[self.driver.id]), {'rule': rule})
+            self.assertEqual(response.data['current_cycle_hours'], expected)
+
+    def test_fleet_compliance_is_one_aggregate_query(self):
+        today = date.today()
+        other = make_driver('other', driver_number='2002', home_operation_center='Dallas')
+        trip = make_trip(self.driver, days=0)
+        for days_ago in range(8):
+            DailyLog.objects.create(trip=trip, driver=self.driver, date=today - timedelta(days=days_ago),
+                                    total_driving_time=11.5 if days_ago == 0 else 8, total_on_duty_time=1,
+                                    total_driving_miles=400)
+
+        # COUNT and the aggregated page
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('trips:fleet-compliance'))
+        rows = {row['driver_id']: row for row in response.data['results']}
+        self.assertEqual(rows[self.driver.id]['cycle_hours'], 75.5)
+        self.assertEqual(rows[self.driver.id]['remaining_cycle_hours'], 0)
+        self.assertEqual(rows[self.driver.id]['driving_limit_violations'], 1)
+        self.assertEqual(rows[self.driver.id]['risk_rank'], 1)
+        self.assertEqual(rows[other.id]['compliance_status'], 'compliant')
+
+        response = self.client.get(reverse('trips:fleet-compliance'), {'home_operation_center': 'Dallas'})
+        self.assertEqual([row['driver_id'] for row in response.data['results']], [other.id])
+
+
+class TripPlanWriteTests(TestCase):
+    def setUp(self):
+        self.driver = make_driver()
+
+    def route(self, miles):
+        line = [[-87.63, 41.88], [-96.8, 32.78]]
+        return {'distance_miles': miles, 'duration_hours': miles / 55, 'pickup_coords': line[0],
+                'dropoff_coords': line[1], 'geometry': {'type': 'LineString', 'coordinates': line}}
+
+    def planned(self, miles, driver=None):
+        trip = make_trip(driver or self.driver, days=0, stops=0)
+        route_data = self.route(miles)
+        return trip, route_data, build_trip_plan(trip, route_data)
+
+    def test_failure_partway_leaves_nothing_behind(self):
+        trip, route_data, plan = self.planned(1500)
+        with mock.patch.object(DutyEvents.objects, 'bulk_create', side_effect=IntegrityError('boom')):
+            with self.assertRaises(IntegrityError):
+                save_trip_plan(trip, route_data, plan)
+        self.assertFalse(Stop.objects.filter(trip=trip).exists())
+        self.assertFalse(DailyLog.objects.filter(trip=trip).exists())
+        self.assertFalse(DutyEvents.objects.filter(daily_log__trip=trip).exists())
+        self.assertFalse(DriverDaySummary.objects.filter(driver=self.driver).exists())
+        self.assertFalse(Trip.objects.get(pk=trip.pk).has_route)
+
+    def test_query_count_is_independent_of_trip_length(self):
+        counts = []
+        for miles in (300, 3000):
+            # A driver of their own each, so both start without day summaries
+            trip, route_data, plan = self.planned(miles, make_driver(f'driver{miles}'))
+            with CaptureQueriesContext(connection) as queries:
+                save_trip_plan(trip, route_data, plan)
+            counts.append(len(queries))
+            self.assertEqual(DutyEvents.objects.filter(daily_log__trip=trip).count(), len(plan.duty_events))
+        self.assertGreater(len(self.planned(3000)[2].duty_events), len(self.planned(300)[2].duty_events))
+        self.assertEqual(counts[0], counts[1])
+
+
+class QueryPlanTests(TestCase):
+    """The hot lookups must be served by their composite indexes, not by a full scan plus sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        drivers = [make_driver(f'planner{i}', driver_number=f'30{i}') for i in range(20)]
+        now = timezone.now()
+        today = date.today()
+        trips = Trip.objects.bulk_create([
+            Trip(driver=drivers[i % 20], current_location='A', pickup_location='B', dropoff_location='C',
+                 current_cycle_used=0, status='ready')
+            for i in range(400)
+        ])
+        logs = DailyLog.objects.bulk_create([
+            DailyLog(trip=trip, driver=trip.driver, date=today + timedelta(days=i), total_driving_miles=0)
+            for trip in trips for i in range(5)
+        ])
+        Stop.objects.bulk_create([
+            Stop(trip=trip, location='S', stop_type='fuel', arrival_time=now + timedelta(hours=i),
+                 depature_time=now + timedelta(hours=i), duration=0.5)
+            for trip in trips for i in range(5)
+        ])
+        DutyEvents.objects.bulk_create([
+            DutyEvents(daily_log=log, duty_event_status='driving', start_time=now + timedelta(hours=i), location='R')
+            for log in logs for i in range(4)
+        ])
+        cls.trip, cls.log, cls.driver = trips[7], logs[11], drivers[3]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assert_uses_index(self, queryset, table, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        # SQLite: "SCAN <table>" without an index / "TEMP B-TREE" sort. PostgreSQL: "Seq Scan on <table>" / "Sort"
+        self.assertNotRegex(plan, rf'SCAN {table}(?! USING)|Seq Scan on {table}\b')
+        self.assertNotRegex(plan, r'TEMP B-TREE FOR ORDER BY|Sort Key')
+
+    def test_trip_list_walks_updated_at_index(self):
+        queryset = TripListCreateView().get_queryset()[:20]
+        self.assert_uses_index(queryset, 'trips_trip', 'trip_updated_at_id_idx')
+
+    def test_daily_logs_by_trip(self):
+        queryset = DailyLogListView(kwargs={'trip_id': self.trip.id}).get_queryset()
+        self.assert_uses_index(queryset, 'trips_dailylog', 'dailylog_trip_date_idx')
+
+    def test_daily_logs_by_driver_and_date(self):
+        today = date.today()
+        queryset = DailyLog.objects.filter(driver=self.driver, date__range=(today, today + timedelta(days=2)))
+        self.assert_uses_index(queryset, 'trips_dailylog', 'dailylog_driver_date_idx')
+
+    def test_duty_events_by_log(self):
+        queryset = DutyEventListView(kwargs={'daily_log_id': self.log.id}).get_queryset()
+        self.assert_uses_index(queryset, 'trips_dutyevents', 'dutyevent_log_start_idx')
+
+    def test_stops_by_trip(self):
+        queryset = Stop.objects.filter(trip=self.trip).order_by('arrival_time')
+        self.assert_uses_index(queryset, 'trips_stop', 'stop_trip_arrival_idx')
+
+
+def zigzag(points=400):
+    return [[-100 + i * 0.01, 40 + (0.002 if i % 2 else 0) + (i % 50) * 0.001] for i in range(points)]
+
+
+class RouteGeometryTests(TestCase):
+    def test_simplify_keeps_endpoints_and_shrinks_with_tolerance(self):
+        line = zigzag()
+        counts = [len(simplify(line, tolerance)) for tolerance in (0, 0.0015, 0.01, 1)]
+        self.assertEqual(counts[0], len(line))
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(simplify(line, 1), [line[0], line[-1]])
+
+    def test_route_endpoint_serves_precomputed_levels(self):
+        line = zigzag()
+        trip = make_trip(make_driver(), days=0, stops=0)
+        Trip.objects.filter(pk=trip.pk).update(route_polyline=encode_polyline(line), route_levels=zoom_levels(line))
+        url = reverse('trips:route-data', args=[trip.id])
+
+        full = self.client.get(url).json()['geometry']['coordinates']
+        self.assertEqual(len(full), len(line))
+        coarse = self.client.get(url, {'zoom': 8}).json()['geometry']['coordinates']
+        self.assertEqual(coarse, decode_polyline(encode_polyline(simplify(line, zoom_tolerance(8)))))
+        self.assertLess(len(coarse), len(full))
+
+        response = self.client.get(url, {'tolerance': 0.01, 'encoding': 'polyline'})
+        self.assertNotIn('geometry', response.json())
+        self.assertEqual(len(decode_polyline(response.json()['polyline'])), len(simplify(line, 0.01)))
+        self.assertEqual(self.client.get(url, {'zoom': 'far'}).status_code, 400)
+
+
+class RouteStorageTests(TestCase):
+    def setUp(self):
+        geocoding_cache.memory.clear()
+        self.client = CountingClient()
+        self.trip = make_trip(make_driver(), days=0, stops=0)
+        self.url = reverse('trips:route-data', args=[self.trip.id])
+
+    def routing(self):
+        """Patches the routing clients services falls back to with the counting one."""
+        patchers = [mock.patch('trips.services.get_routing_client', return_value=self.client),
+                    mock.patch('trips.services.get_async_routing_client',
+                               side_effect=lambda: AsyncCountingClient(self.client))]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_route_endpoint_serves_the_stored_route_without_routing(self):
+        refresh_route(self.trip, self.client)
+        self.trip.refresh_from_db()
+        routed = sum(self.client.calls.values())
+        self.routing()
+
+        response = APIClient().get(self.url, {'encoding': 'polyline'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['polyline'], self.trip.route_polyline)
+        self.assertEqual(response.json()['summary']['distance_miles'], self.trip.route_distance_miles)
+        self.assertEqual(sum(self.client.calls.values()), routed)
+
+    def test_legacy_trip_is_backfilled_once(self):
+        self.assertFalse(self.trip.has_route)
+        self.routing()
+        first = APIClient().get(self.url, {'encoding': 'polyline'}).json()
+        self.assertEqual(self.client.calls['directions'], 1)
+        self.trip.refresh_from_db()
+        self.assertEqual(first['polyline'], self.trip.route_polyline)
+
+        second = APIClient().get(self.url, {'encoding': 'polyline', 'zoom': 5}).json()
+        self.assertTrue(second['polyline'])
+        self.assertEqual(self.client.calls['directions'], 1)
+
+    def test_update_reroutes_only_when_a_location_changes(self):
+        refresh_route(self.trip, self.client)
+        self.routing()
+        url = reverse('trips:trip-detail', args=[self.trip.id])
+        polyline = Trip.objects.get(pk=self.trip.pk).route_polyline
+
+        response = APIClient().patch(url, {'current_cycle_used': 20}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.calls['directions'], 1)
+
+        response = APIClient().patch(url, {'dropoff_location': 'Denver, CO'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.calls['directions'], 2)
+        trip = Trip.objects.get(pk=self.trip.pk)
+        self.assertNotEqual(trip.route_polyline, polyline)
+        self.assertEqual([trip.dropoff_longitude, trip.dropoff_latitude], fake_coordinates('Denver, CO'))
+
+
+class LogExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = make_driver()
+        self.other = make_driver('other', driver_number='2002', home_operation_center='Dallas')
+        make_trip(self.driver, days=3, events_per_day=4)
+        make_trip(self.other, days=2, events_per_day=0)
+
+    def export(self, **params):
+        response = self.client.get(reverse('trips:log-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_row_per_event(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(output='csv'))))
+        # 12 events plus one row for each of the 2 logs without events
+        self.assertEqual(len(rows), 14)
+        self.assertEqual(rows[0]['driver_name'], 'Jane Doe')
+        self.assertEqual([row['event_status'] for row in rows if row['driver_id'] == str(self.other.id)], ['', ''])
+
+    def test_ndjson_nests_events_and_filters(self):
+        tomorrow = (date.today() + timedelta(days=1)).isoformat()
+        lines = self.export(output='ndjson', home_operation_center='Chicago', start=tomorrow).splitlines()
+        logs = [json.loads(line) for line in lines]
+        self.assertEqual([log['date'] for log in logs], [tomorrow, (date.today() + timedelta(days=2)).isoformat()])
+        self.assertEqual([len(log['events']) for log in logs], [4, 4])
+
+    def test_clients_asking_for_the_file_type_get_it(self):
+        for output, accept in [('csv', 'text/csv'), ('ndjson', 'application/x-ndjson'), ('csv', 'text/plain')]:
+            response = self.client.get(reverse('trips:log-export'), {'output': output}, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200, accept)
+            self.assertTrue(b''.join(response.streaming_content))
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'output': 'xml'}, {'start': '2024-13-01'}, {'driver': 'x'}):
+            self.assertEqual(self.client.get(reverse('trips:log-export'), params).status_code, 400)
+
+    def test_command_rejects_bad_dates(self):
+        for args in (['--start', '2024-13-01'], ['--end', 'yesterday'], ['--start', '2024-02-02', '--end', '2024-02-01']):
+            with self.assertRaises(CommandError):
+                call_command('export_logs', *args, stderr=io.StringIO())
+
+    async def test_streams_without_buffering_under_asgi(self):
+        response = await self.async_client.get(reverse('trips:log-export'), {'output': 'csv'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(body)))), 14)
+        self.assertFalse(self.client.get(reverse('trips:log-export')).is_async)
+
+
+class ELDOutputFileTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = make_driver()
+        make_trip(self.driver, days=2, events_per_day=3)
+
+    def test_check_values(self):
+        # "A" maps to 17 (0x11), rotated left 3 bits is 0x88, XOR 0xC3; punctuation maps to 0
+        self.assertEqual(check_value('A'), 0x4B)
+        self.assertEqual(check_value('A,-:'), 0x4B)
+        # 0x4B rotated left 3 bits in 16 is 0x258, XOR 0x969C
+        self.assertEqual(file_check_value([0x4B]), 0x94C4)
+
+    def test_streams_checked_lines(self):
+        response = self.client.get(reverse('trips:eld-output', args=[self.driver.id]),
+                                   {'comment': 'roadside', 'end': (date.today() + timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="Doe__0000', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('ascii').split('\r\n')[:-1]
+
+        line_checks = []
+        for line in lines[:-1]:
+            if line.endswith(':'):
+                continue  # section headers carry no check value
+            text, check = line.rsplit(',', 1)
+            self.assertEqual(int(check, 16), check_value(text), line)
+            line_checks.append(int(check, 16))
+        self.assertEqual(lines[-2], 'End of File:')
+        self.assertEqual(int(lines[-1], 16), file_check_value(line_checks))
+
+        events = lines[lines.index('ELD Event List:') + 1:lines.index('ELD Event Annotations or Comments:')]
+        self.assertEqual(len(events), 6)
+        self.assertEqual(events[0].split(',')[4], '3')  # driving
+
+    async def test_streams_without_buffering_under_asgi(self):
+        response = await self.async_client.get(reverse('trips:eld-output', args=[self.driver.id]))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('ascii')
+        self.assertIn('\r\nEnd of File:\r\n', body)
+
+    def test_clients_asking_for_the_file_type_get_it(self):
+        url = reverse('trips:eld-output', args=[self.driver.id])
+        for accept in ('text/csv', 'text/plain', 'application/octet-stream'):
+            response = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200, accept)
+            self.assertEqual(response['Content-Type'], 'text/csv')
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'ELD File Header Segment:'))
+
+    def test_rejects_bad_window(self):
+        url = reverse('trips:eld-output', args=[self.driver.id])
+        for params in ({'start': '2024-13-01'}, {'start': '2024-02-02', 'end': '2024-02-01'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class LogGridTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = make_driver()
+        self.trip = make_trip(self.driver, days=2, events_per_day=3)
+        self.log = self.trip.daily_logs.order_by('date').first()
+        grid_renderer.cache.clear()
+
+    def grid(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_svg_sheet_draws_duty_segments(self):
+        log = DailyLog.objects.create(trip=self.trip, driver=self.driver, date=date(2024, 3, 1), total_driving_miles=300)
+        midnight = timezone.make_aware(datetime(2024, 3, 1), timezone.get_fixed_timezone(0))
+        for status, start, end in [('off_duty', 0, 6), ('driving', 6, 10), ('on_duty', 10, 11), ('driving', 12, 13)]:
+            DutyEvents.objects.create(daily_log=log, duty_event_status=status, location='On Route',
+                                      start_time=midnight + timedelta(hours=start),
+                                      end_time=midnight + timedelta(hours=end))
+
+        response = self.grid(reverse('trips:log-grid', args=[log.id]), output='svg')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        svg = response.content.decode()
+        self.assertTrue(svg.startswith('<svg'))
+        # 4 segments and 2 connectors; nothing joins across the 11:00-12:00 gap
+        self.assertEqual(svg.count(f'stroke="{DUTY_LINE_COLOR}"'), 6)
+        self.assertIn('>05:00</text>', svg)  # driving total
+        self.assertIn('>= 12:00</text>', svg)
+
+    def test_trip_pdf_has_a_page_per_log_and_revalidates(self):
+        url = reverse('trips:trip-grid', args=[self.trip.id])
+        response = self.grid(url)
+        self.assertTrue(response.content.startswith(b'%PDF-1.4'))
+        self.assertEqual(response.content.count(b'/Type /Page '), 2)
+        self.assertTrue(response.content.rstrip().endswith(b'%%EOF'))
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        event = DutyEvents.objects.filter(daily_log=self.log).first()
+        event.location = 'Joliet, IL'
+        event.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_reuses_cached_sheets(self):
+        url = reverse('trips:trip-grid', args=[self.trip.id])
+        self.grid(url, output='svg')
+        with mock.patch('trips.log_grid.svg_sheet') as draw:
+            self.grid(url, output='svg')
+        draw.assert_not_called()
+
+    def test_clients_asking_for_the_file_type_get_it(self):
+        url = reverse('trips:log-grid', args=[self.log.id])
+        for accept, output in [('application/pdf', 'pdf'), ('image/svg+xml', 'svg'), ('*/*', 'pdf')]:
+            response = self.client.get(url, {'output': output}, HTTP_ACCEPT=accept)
+            self.assertEqual(response.status_code, 200, accept)
+            self.assertEqual(response['Content-Type'], accept if accept != '*/*' else 'application/pdf')
+        response = self.client.get(reverse('trips:trip-grid', args=[self.trip.id]), HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('trips:driver-grid', args=[self.driver.id]),
+                                   {'month': self.log.date.strftime('%Y-%m'), 'output': 'svg'},
+                                   HTTP_ACCEPT='image/svg+xml')
+        self.assertEqual(response.status_code, 200)
+
+    def test_driver_month_and_bad_parameters(self):
+        url = reverse('trips:driver-grid', args=[self.driver.id])
+        response = self.grid(url, month=self.log.date.strftime('%Y-%m'))
+        self.assertGreaterEqual(response.content.count(b'/Type /Page '), 1)
+        self.assertEqual(self.client.get(url, {'month': '2024-13'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'month': '1999-01'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'output': 'png'}).status_code, 400)
+
+
+class DutyEventIngestionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = make_driver()
+        self.trip = make_trip(self.driver, days=2, events_per_day=0)
+        self.logs = list(self.trip.daily_logs.order_by('date'))
+        self.midnight = timezone.make_aware(datetime.combine(self.logs[0].date, datetime.min.time()))
+
+    def event(self, log, start, end, status='driving', **extra):
+        return {'client_event_id': str(uuid.uuid4()), 'daily_log': str(log.id), 'duty_event_status': status,
+                'start_time': (self.midnight + timedelta(hours=start)).isoformat(),
+                'end_time': (self.midnight + timedelta(hours=end)).isoformat() if end is not None else None,
+                'location': 'On Route', **extra}
+
+    def ingest(self, events):
+        return self.client.post(reverse('trips:duty-event-ingest'), {'events': events}, format='json')
+
+    def test_bulk_ingest_is_idempotent(self):
+        before = Trip.objects.values_list('updated_at', 'changed_at').get(pk=self.trip.pk)
+        events = [self.event(self.logs[1], 30, 31), self.event(self.logs[0], 2, 4), self.event(self.logs[0], 4, None)]
+        response = self.ingest(events)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(DutyEvents.objects.filter(daily_log__trip=self.trip).count(), 3)
+        updated_at, changed_at = Trip.objects.values_list('updated_at', 'changed_at').get(pk=self.trip.pk)
+        self.assertEqual(updated_at, before[0])
+        self.assertGreater(changed_at, before[1])
+
+        retry = self.ingest(events)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual((retry.data['created'], retry.data['duplicates']), (0, 3))
+        self.assertEqual(DutyEvents.objects.filter(daily_log__trip=self.trip).count(), 3)
+
+    def test_rejects_overlaps_and_bad_items(self):
+        self.ingest([self.event(self.logs[0], 2, 4)])
+        response = self.ingest([
+            self.event(self.logs[0], 3, 5),                # overlaps the stored event
+            self.event(self.logs[0], 6, 8),
+            self.event(self.logs[0], 7, 9),                # overlaps the one above, in the same batch
+            self.event(self.logs[0], 10, 9),               # ends before it starts
+            self.event(self.logs[0], 11, 12, daily_log=str(uuid.uuid4())),
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['error', 'created', 'error', 'error', 'error'])
+        self.assertEqual(DutyEvents.objects.filter(daily_log=self.logs[0]).count(), 2)
+
+    def test_per_log_post_creates_one_event(self):
+        url = reverse('trips:duty-events', args=[self.logs[0].id])
+        event = self.event(self.logs[0], 1, 2, status='on_duty')
+        del event['daily_log'], event['client_event_id']
+        response = self.client.post(url, event, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['duty_event_status'], 'on_duty')
+        self.assertEqual(self.client.post(url, event, format='json').status_code, 400)  # same slot again
+
+    def test_recorded_events_cut_into_planner_padding(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        line = [[-87.63, 41.88], [-96.8, 32.78]]
+        route_data = {'distance_miles': 275, 'duration_hours': 5, 'pickup_coords': line[0], 'dropoff_coords': line[1],
+                      'geometry': {'type': 'LineString', 'coordinates': line}}
+        # Eight hours of work from 08:00, so the planner pads the day before and after it
+        save_trip_plan(trip, route_data, build_trip_plan(trip, route_data, self.midnight + timedelta(hours=8)))
+        log = trip.daily_logs.get()
+        padding = DutyEvents.objects.filter(daily_log=log, planner_padding=True).order_by('start_time')
+
+        def hours():
+            return [((row.start_time - self.midnight) / timedelta(hours=1),
+                     (row.end_time - self.midnight) / timedelta(hours=1)) for row in padding.all()]
+
+        self.assertEqual(hours(), [(0, 8), (16, 24)])
+        response = self.client.post(reverse('trips:duty-events', args=[log.id]), {
+            'duty_event_status': 'on_duty', 'location': 'Yard',
+            'start_time': (self.midnight + timedelta(hours=22)).isoformat(),
+            'end_time': (self.midnight + timedelta(hours=22.5)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(hours(), [(0, 8), (16, 22), (22.5, 24)])
+
+        # An event covering a whole padding row replaces it; planned segments still count as overlaps
+        response = self.ingest([self.event(log, 0, 8, status='sleeper_berth'), self.event(log, 9, 10)])
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error'])
+        self.assertEqual(hours(), [(16, 22), (22.5, 24)])
+
+        log.refresh_from_db()
+        self.assertEqual((log.total_off_duty_time, log.total_sleeper_berth_time), (7.5, 8))
+        self.assertEqual(log.total_off_duty_time + log.total_sleeper_berth_time + log.total_driving_time
+                         + log.total_on_duty_time, 24)
+        self.assertEqual([drifted for _, drifted in reconcile_log_totals(trip.daily_logs.all(), repair=False)], [[]])
+
+
+class LogTotalsTests(TestCase):
+    def setUp(self):
+        self.driver = make_driver()
+        self.trip = make_trip(self.driver, days=1, events_per_day=0)
+        self.log = self.trip.daily_logs.get()
+        DailyLog.objects.filter(pk=self.log.pk).update(total_driving_time=0, total_on_duty_time=0)
+        rebuild_day_summaries()
+        self.midnight = timezone.make_aware(datetime.combine(self.log.date, datetime.min.time()))
+
+    def totals(self):
+        log = DailyLog.objects.get(pk=self.log.pk)
+        summary = DriverDaySummary.objects.filter(driver=self.driver, date=self.log.date).first()
+        return (round(log.total_driving_time, 2), round(log.total_on_duty_time, 2),
+                round(summary.driving_hours, 2) if summary else 0.0)
+
+    def add(self, status, start, end):
+        return DutyEvents.objects.create(daily_log=self.log, duty_event_status=status, location='On Route',
+                                         start_time=self.midnight + timedelta(hours=start),
+                                         end_time=self.midnight + timedelta(hours=end) if end else None)
+
+    def test_event_writes_move_totals(self):
+        event = self.add('driving', 6, 9)
+        self.add('on_duty', 9, 10)
+        self.add('driving', 10, None)  # open events count once closed
+        self.assertEqual(self.totals(), (3.0, 1.0, 3.0))
+
+        event.duty_event_status = 'on_duty'
+        event.end_time = self.midnight + timedelta(hours=8)
+        event.save()
+        self.assertEqual(self.totals(), (0.0, 3.0, 0.0))
+
+        event.delete()
+        self.assertEqual(self.totals(), (0.0, 1.0, 0.0))
+
+    def test_bulk_ingestion_moves_totals(self):
+        ingest_duty_events([
+            {'daily_log': str(self.log.pk), 'duty_event_status': 'driving', 'location': 'On Route',
+             'start_time': self.midnight + timedelta(hours=hour), 'end_time': self.midnight + timedelta(hours=hour + 1)}
+            for hour in range(5)
+        ])
+        self.assertEqual(self.totals(), (5.0, 0.0, 5.0))
+
+    def test_reconcile_repairs_drift(self):
+        self.add('driving', 6, 9)
+        DailyLog.objects.filter(pk=self.log.pk).update(total_driving_time=11, total_off_duty_time=2)
+        DriverDaySummary.objects.filter(driver=self.driver).update(driving_hours=11)
+
+        checked = list(reconcile_log_totals(repair=False))
+        self.assertEqual([(count, [log.pk for log in drifted]) for count, drifted in checked], [(1, [self.log.pk])])
+        self.assertEqual(self.totals(), (11.0, 0.0, 11.0))
+
+        list(reconcile_log_totals(chunk_size=1))
+        self.assertEqual(self.totals(), (3.0, 0.0, 3.0))
+        self.assertEqual(DailyLog.objects.get(pk=self.log.pk).total_off_duty_time, 0)
+
+
+class HOSClockTests(SimpleTestCase):
+    rules = HOSRules()
+    zone = ZoneInfo('UTC')
+    start = datetime(2024, 3, 4, tzinfo=ZoneInfo('UTC'))
+
+    def at(self, hours):
+        return self.start + timedelta(hours=hours)
+
+    def replay(self, intervals):
+        state = ClockState()
+        for status, start, end in intervals:
+            consume(state, status, self.at(start), self.at(end) if end is not None else None, self.rules, self.zone)
+        return state
+
+    def test_shift_clocks_while_on_duty(self):
+        state = self.replay([('on_duty', 6, 7), ('driving', 7, 12), ('off_duty', 12, 12.5), ('driving', 12.5, 16.5),
+                             ('on_duty', 16.5, None)])
+        remaining = clocks(state, self.at(16.75), self.rules, self.zone)
+        self.assertAlmostEqual(remaining['drive_left'], 2)
+        self.assertAlmostEqual(remaining['window_left'], 3.25)
+        self.assertAlmostEqual(remaining['break_due_in'], 4)   # the 30-minute stop reset the break clock
+        self.assertAlmostEqual(remaining['cycle_used'], 10.25)
+        self.assertAlmostEqual(remaining['available_driving'], 2)
+        self.assertEqual(state.status, 'on_duty')               # the projection did not close the open status
+
+        # 30 minutes on duty (not driving) also counts as the break
+        self.assertAlmostEqual(clocks(state, self.at(17), self.rules, self.zone)['break_due_in'], 8)
+
+    def test_rest_and_restart_reset_clocks(self):
+        week = [('driving', day * 24 + 6, day * 24 + 16) for day in range(6)]
+        state = self.replay(week)
+        remaining = clocks(state, self.at(5 * 24 + 16), self.rules, self.zone)
+        self.assertAlmostEqual(remaining['cycle_left'], 10)
+        self.assertAlmostEqual(remaining['drive_left'], 1)
+
+        rested = clocks(state, self.at(5 * 24 + 26), self.rules, self.zone)
+        self.assertAlmostEqual(rested['drive_left'], 11)
+        self.assertAlmostEqual(rested['window_left'], 14)
+        self.assertAlmostEqual(rested['cycle_left'], 10)
+
+        restarted = clocks(state, self.at(5 * 24 + 50), self.rules, self.zone)
+        self.assertAlmostEqual(restarted['cycle_left'], 70)
+        self.assertEqual(restarted['last_restart_at'], self.at(5 * 24 + 50))
+
+
+    def test_open_status_closes_at_its_recorded_end(self):
+        state = ClockState()
+        consume(state, 'driving', self.at(6), None, self.rules, self.zone, until=self.at(9))
+        remaining = clocks(state, self.at(12), self.rules, self.zone)
+        self.assertAlmostEqual(remaining['drive_left'], 8)
+        self.assertAlmostEqual(remaining['consecutive_off_duty'], 3)
+
+        # A later event closes it at the recorded end too; the gap is off duty
+        consume(state, 'on_duty', self.at(10), self.at(11), self.rules, self.zone)
+        self.assertAlmostEqual(state.shift_driving, 3)
+        self.assertAlmostEqual(state.cycle_days[self.start.date().isoformat()], 4)
+
+    def test_available_driving_stops_at_the_break(self):
+        state = self.replay([('driving', 0, 7.5)])
+        remaining = clocks(state, self.at(7.5), self.rules, self.zone)
+        self.assertAlmostEqual(remaining['drive_left'], 3.5)
+        self.assertAlmostEqual(remaining['break_due_in'], 0.5)
+        self.assertAlmostEqual(remaining['available_driving'], 0.5)
+
+
+class DriverClockTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver = make_driver()
+        self.trip = make_trip(self.driver, days=1, events_per_day=0)
+        self.log = self.trip.daily_logs.get()
+        self.now = timezone.now()
+
+    def add(self, status, start, end):
+        return DutyEvents.objects.create(daily_log=self.log, duty_event_status=status, location='On Route',
+                                         start_time=self.now - timedelta(hours=start),
+                                         end_time=self.now - timedelta(hours=end) if end is not None else None)
+
+    def test_events_advance_the_stored_clock(self):
+        self.add('driving', 6, 3)
+        state, remaining = driver_clock(self.driver.id)
+        self.assertAlmostEqual(remaining['drive_left'], 8, places=2)
+
+        self.add('on_duty', 3, 2)
+        self.add('driving', 2, None)
+        clock = DriverClock.objects.get(driver=self.driver)
+        self.assertFalse(clock.stale)
+        self.assertEqual(clock.status, 'driving')
+        self.assertAlmostEqual(clock.shift_driving_hours, 3)
+
+        response = self.client.get(reverse('trips:driver-clock', args=[self.driver.id]), {'hours': 9})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'driving')
+        self.assertAlmostEqual(response.data['drive_left'], 6, places=1)
+        self.assertFalse(response.data['can_drive_requested_hours'])
+
+    def test_event_ending_in_the_future_stops_at_its_end(self):
+        driver_clock(self.driver.id, now=self.now)
+        self.add('driving', 1, -1)
+        self.assertEqual(DriverClock.objects.get(driver=self.driver).status, 'driving')
+
+        with mock.patch('trips.views.timezone.now', return_value=self.now + timedelta(hours=3)):
+            response = self.client.get(reverse('trips:driver-clock', args=[self.driver.id]))
+        self.assertEqual(response.data['status'], 'off_duty')
+        self.assertAlmostEqual(response.data['drive_left'], 9, places=2)
+        self.assertAlmostEqual(response.data['consecutive_off_duty'], 2, places=2)
+
+    def test_requested_hours_must_be_finite(self):
+        url = reverse('trips:driver-clock', args=[self.driver.id])
+        for hours in ('nan', 'inf', '-inf', 'abc'):
+            self.assertEqual(self.client.get(url, {'hours': hours}).status_code, 400, hours)
+        self.assertTrue(self.client.get(url, {'hours': '2.5'}).data['can_drive_requested_hours'])
+
+    def test_late_and_edited_events_rebuild_the_clock(self):
+        self.add('driving', 3, 2)
+        driver_clock(self.driver.id)
+        late = self.add('driving', 8, 6)
+        self.assertTrue(DriverClock.objects.get(driver=self.driver).stale)
+        self.assertAlmostEqual(driver_clock(self.driver.id)[1]['drive_left'], 8, places=2)
+
+        late.delete()
+        self.assertTrue(DriverClock.objects.get(driver=self.driver).stale)
+        self.assertAlmostEqual(driver_clock(self.driver.id)[1]['drive_left'], 10, places=2)
+        self.assertEqual(self.client.get(reverse('trips:driver-clock', args=[self.driver.id]),
+                                         {'rule': '80_8'}).status_code, 400)
+
+
+class LiveUpdateTests(TestCase):
+    def setUp(self):
+        self.driver = make_driver()
+        self.trip = make_trip(self.driver, days=1, events_per_day=0)
+        self.log = self.trip.daily_logs.get()
+        patcher = mock.patch.object(broker, 'poll_interval', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def next_chunk(self, stream):
+        return (await asyncio.wait_for(anext(stream), timeout=5)).decode()
+
+    async def test_trip_stream_sends_status_then_published_events(self):
+        response = await self.async_client.get(reverse('trips:trip-live', args=[self.trip.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await self.next_chunk(stream)).startswith('retry: '))
+        self.assertIn('event: status', await self.next_chunk(stream))
+
+        await sync_to_async(publish)(trip_channel(self.trip.id), 'progress', {'progress': 40})
+        await sync_to_async(publish)(trip_channel(uuid.uuid4()), 'progress', {'progress': 99})
+        chunk = await self.next_chunk(stream)
+        self.assertIn('event: progress', chunk)
+        self.assertIn('"progress": 40', chunk)
+
+        # A client disconnect cancels the pending read, as the ASGI handler does
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.subscriber_count, 0)
+
+    async def test_reconnect_replays_missed_events(self):
+        first = await LiveEvent.objects.acreate(channel=driver_channel(self.driver.id), kind='clock', payload={'n': 1})
+        second = await LiveEvent.objects.acreate(channel=driver_channel(self.driver.id), kind='clock', payload={'n': 2})
+        response = await self.async_client.get(reverse('trips:driver-live', args=[self.driver.id]),
+                                               headers={'Last-Event-ID': str(first.pk)})
+        stream = aiter(response.streaming_content)
+        await self.next_chunk(stream)
+        self.assertIn(f'id: {second.pk}', await self.next_chunk(stream))
+
+    def test_late_commits_behind_the_last_id_are_delivered(self):
+        poller = Broker(poll_interval=0, queue_size=10, gap_timeout=60)
+        poller.last_id = LiveEvent.objects.create(channel='trip:x', kind='progress').pk
+        ahead = LiveEvent.objects.create(pk=poller.last_id + 2, channel='trip:x', kind='progress')
+        self.assertEqual([row.pk for row in poller.fetch()], [ahead.pk])
+
+        late = LiveEvent.objects.create(pk=poller.last_id - 1, channel='trip:x', kind='progress')
+        self.assertEqual([row.pk for row in poller.fetch()], [late.pk])
+        self.assertEqual(poller.fetch(), [])
+
+    def test_ingestion_publishes_events_to_trip_and_driver(self):
+        start = timezone.now() - timedelta(hours=3)
+        ingest_duty_events([
+            {'daily_log': str(self.log.id), 'duty_event_status': 'driving', 'location': 'On Route',
+             'start_time': start + timedelta(hours=hour), 'end_time': start + timedelta(hours=hour + 1)}
+            for hour in range(2)
+        ])
+        published = {row.channel: row for row in LiveEvent.objects.filter(kind='duty_events')}
+        self.assertEqual(set(published), {trip_channel(self.trip.id), driver_channel(self.driver.id)})
+        self.assertEqual(len(published[trip_channel(self.trip.id)].payload['events']), 2)
+
+
+    def test_publishers_prune_expired_events_without_any_stream(self):
+        self.assertEqual(broker.subscriber_count, 0)
+        publish_many([(trip_channel(self.trip.id), 'progress', {'progress': n}) for n in range(3)])
+        LiveEvent.objects.update(created_at=timezone.now() - timedelta(
+            seconds=settings.LIVE_EVENTS['RETENTION_SECONDS'] + 1))
+        self.addCleanup(setattr, live, '_last_prune', live._last_prune)
+        live._last_prune = 0.0
+        with self.captureOnCommitCallbacks(execute=True):
+            publish(trip_channel(self.trip.id), 'status', {'status': 'ready'})
+        self.assertEqual(list(LiveEvent.objects.values_list('kind', flat=True)), ['status'])
+
+        # At most once per PRUNE_INTERVAL_SECONDS per process
+        LiveEvent.objects.update(created_at=timezone.now() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            publish(trip_channel(self.trip.id), 'status', {'status': 'ready'})
+        self.assertEqual(LiveEvent.objects.count(), 2)
+
+
+class AsyncRoutingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server(latency=0.5)
+        cls.settings = override_settings(ORS={**settings.ORS, 'BASE_URL': start_in_thread(cls.server)})
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        geocoding_cache.memory.clear()
+
+    async def test_locations_are_geocoded_concurrently(self):
+        trip = Trip(current_location='Chicago, IL', pickup_location='Chicago, IL', dropoff_location='Dallas, TX')
+        started = asyncio.get_running_loop().time()
+        route_data = await aget_route_data(trip, get_async_ors_client())
+        # Two geocodes side by side, then directions: two round trips of latency, not three
+        self.assertLess(asyncio.get_running_loop().time() - started, 1.4)
+        self.assertEqual(route_data['pickup_coords'], fake_coordinates('Chicago, IL'))
+        self.assertGreater(route_data['distance_miles'], 0)
+        self.assertEqual(await GeocodeCache.objects.acount(), 2)
+
+    def test_route_endpoint_backfills_through_the_async_client(self):
+        trip = make_trip(make_driver(), days=0, stops=0)
+        response = APIClient().get(reverse('trips:route-data', args=[trip.id]), {'encoding': 'polyline'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['polyline'])
+        trip.refresh_from_db()
+        self.assertTrue(trip.has_route)
+
+        url = reverse('trips:route-data', args=[trip.id])
+        etag = APIClient().get(url)['ETag']
+        self.assertEqual(APIClient().get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_route_endpoint_degrades_while_ors_is_down(self):
+        trip = make_trip(make_driver(), days=0, stops=0)
+        breaker = get_ors_guard().breaker
+        self.addCleanup(breaker.record, True)
+        for _ in range(breaker.threshold):
+            breaker.record(False)
+
+        response = APIClient().get(reverse('trips:route-data', args=[trip.id]))
+        self.assertEqual(response.status_code, 503)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(APIClient().get(reverse('trips:metrics')).data['ors']['circuit'], 'open')
+
+
+class GeocodingCacheTests(TestCase):
+    def setUp(self):
+        self.cache = GeocodingCache(max_entries=100, ttl_seconds=60, db_ttl_days=90)
+        self.client = CountingClient()
+
+    def test_addresses_are_normalized_in_any_script(self):
+        self.assertEqual(normalize_address(' Chicago,  IL '), 'chicago il')
+        self.assertEqual(normalize_address('Montréal, QC'), 'montréal qc')
+        self.assertEqual(normalize_address('ＣＨＩＣＡＧＯ_IL'), 'chicago il')
+        self.assertEqual(normalize_address('東京都 千代田区'), '東京都 千代田区')
+        self.assertEqual(normalize_address('Straße'), normalize_address('STRASSE'))
+        self.assertEqual(normalize_address(' -- '), '')
+
+    def test_non_latin_addresses_are_geocoded_and_cached(self):
+        coords = self.cache.geocode(self.client, 'Москва')
+        self.assertEqual(coords, fake_coordinates('Москва'))
+        self.assertEqual(GeocodeCache.objects.get().normalized_query, 'москва')
+        self.assertEqual(self.cache.geocode(self.client, 'МОСКВА'), coords)
+        self.assertEqual(self.client.calls['pelias_search'], 1)
+
+    def test_addresses_without_a_key_are_geocoded_uncached(self):
+        self.assertEqual(self.cache.geocode(self.client, '#'), fake_coordinates('#'))
+        self.cache.geocode(self.client, '#')
+        self.assertEqual(self.client.calls['pelias_search'], 2)
+        self.assertFalse(GeocodeCache.objects.exists())
+        self.assertIsNone(self.cache.geocode(self.client, '  '))
+        self.assertEqual(self.client.calls['pelias_search'], 2)
+
+        found = async_to_sync(self.cache.ageocode_many)(AsyncCountingClient(self.client), ['#', 'Dallas, TX'])
+        self.assertEqual(found, {'#': fake_coordinates('#'), 'Dallas, TX': fake_coordinates('Dallas, TX')})
+        self.assertEqual(list(GeocodeCache.objects.values_list('normalized_query', flat=True)), ['dallas tx'])
+
+    def test_unresolvable_addresses_are_logged_and_not_cached(self):
+        with mock.patch.object(self.client, 'pelias_search', return_value={'features': []}), \
+                self.assertLogs('eld_tracker', 'INFO') as logs:
+            self.assertIsNone(self.cache.geocode(self.client, 'Nowhere, XX'))
+        self.assertIn("no match for 'Nowhere, XX'", logs.output[0])
+        self.assertFalse(GeocodeCache.objects.exists())
+
+    def test_memory_entries_expire_and_least_recently_used_are_evicted(self):
+        memory = LRUCache(max_entries=2, ttl_seconds=60)
+        with mock.patch('trips.geocoding.time.monotonic', return_value=1000):
+            memory.set('a', 1)
+            memory.set('b', 2)
+            self.assertEqual(memory.get('a'), 1)  # 'b' is now the least recently used
+            memory.set('c', 3)
+            self.assertEqual((memory.get('a'), memory.get('b'), memory.get('c')), (1, None, 3))
+        with mock.patch('trips.geocoding.time.monotonic', return_value=1061):
+            self.assertIsNone(memory.get('a'))
+        self.assertEqual(len(memory), 1)
+
+    def test_hits_and_misses_are_counted_per_level(self):
+        self.cache.geocode(self.client, 'Chicago, IL')
+        self.cache.geocode(self.client, 'chicago il')
+        self.cache.memory.clear()
+        self.cache.geocode(self.client, 'CHICAGO IL')
+        stats = self.cache.stats()
+        self.assertEqual((stats['misses'], stats['memory_hits'], stats['db_hits']), (1, 1, 1))
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+        self.assertEqual(self.client.calls['pelias_search'], 1)
+
+        # Rows older than DB_TTL_DAYS are fetched again
+        self.cache.memory.clear()
+        GeocodeCache.objects.update(updated_at=timezone.now() - timedelta(days=91))
+        self.cache.geocode(self.client, 'Chicago, IL')
+        self.assertEqual(self.client.calls['pelias_search'], 2)
+
+    def test_a_repeated_lane_makes_no_geocoding_calls(self):
+        make_driver()
+        geocoding_cache.memory.clear()
+        item = {'current_location': 'Joliet, IL', 'pickup_location': 'Chicago, IL',
+                'dropoff_location': 'Dallas, TX', 'current_cycle_used': 10}
+        create_trips_in_bulk([item], client=self.client)
+        self.assertEqual(self.client.calls['pelias_search'], 3)
+
+        geocoding_cache.memory.clear()  # another process: only the table is shared
+        create_trips_in_bulk([item, {**item, 'pickup_location': 'chicago,il'}], client=self.client)
+        trip = Trip(current_location='Joliet, IL', pickup_location='CHICAGO IL', dropoff_location='Dallas, TX')
+        async_to_sync(aget_route_data)(trip, AsyncCountingClient(self.client))
+        self.assertEqual(self.client.calls['pelias_search'], 3)
+        self.assertEqual(Trip.objects.count(), 3)
+
+
+class ORSClientTests(SimpleTestCase):
+    def client_for(self, responses, **config):
+        """An AsyncORSClient answering from a list of (status, body) and counting the requests made."""
+        config = {**settings.ORS, 'BACKOFF_BASE_SECONDS': 0.001, 'BACKOFF_MAX_SECONDS': 0.001,
+                  'BREAKER_FAILURES': 3, 'RATE_LIMITS_PER_MINUTE': {}, **config}
+        self.requests = 0
+
+        def handler(request):
+            status, body = responses[min(self.requests, len(responses) - 1)]
+            self.requests += 1
+            return httpx.Response(status, json=body)
+        return AsyncORSClient(config, ORSGuard(config), transport=httpx.MockTransport(handler))
+
+    async def test_retries_server_errors_then_succeeds(self):
+        client = self.client_for([(503, {}), (429, {}), (200, {'features': []})])
+        self.assertEqual(await client.pelias_search('Chicago'), {'features': []})
+        self.assertEqual(self.requests, 3)
+        stats = client.guard.stats()['endpoints']['geocode']
+        self.assertEqual((stats['calls'], stats['retries'], stats['errors']), (1, 2, {}))
+
+    async def test_circuit_opens_and_fails_fast(self):
+        client = self.client_for([(502, {})], MAX_RETRIES=1, BREAKER_RESET_SECONDS=60)
+        with self.assertRaises(exceptions.ApiError):
+            await client.pelias_search('Chicago')
+        with self.assertRaises(exceptions.ApiError):
+            await client.pelias_search('Dallas')
+        self.assertEqual(client.guard.breaker.state, 'open')
+        self.assertEqual(self.requests, 3)
+
+        with self.assertRaises(ORSUnavailable) as raised:
+            await client.directions([[0, 0], [1, 1]])
+        self.assertEqual(self.requests, 3)
+        self.assertGreater(raised.exception.retry_after, 0)
+
+    async def test_client_errors_are_not_retried(self):
+        client = self.client_for([(400, {'error': 'bad'})])
+        with self.assertRaises(exceptions.ApiError):
+            await client.pelias_search('')
+        self.assertEqual((self.requests, client.guard.breaker.state), (1, 'closed'))
+
+    def test_token_bucket_queues_then_refuses(self):
+        bucket = TokenBucket(rate_per_second=10, capacity=2)
+        self.assertEqual([bucket.reserve(), bucket.reserve()], [0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertIsNone(bucket.reserve(max_wait=0.1))
+
+
+CHICAGO, DALLAS, MEMPHIS = (-87.6298, 41.8781), (-96.797, 32.7767), (-90.049, 35.1495)
+
+OSM_EXTRACT = """<osm version="0.6">
+  <node id="1" lat="41.0" lon="-87.0"><tag k="place" v="city"/><tag k="name" v="Gary"/></node>
+  <node id="2" lat="41.0" lon="-86.99"/>
+  <node id="3" lat="41.01" lon="-86.99"/>
+  <node id="4" lat="41.5" lon="-86.5"/>
+  <node id="5" lat="41.5" lon="-86.49"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="primary"/></way>
+  <way id="11"><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="1"/><nd ref="3"/><tag k="highway" v="residential"/><tag k="hgv" v="no"/></way>
+  <way id="13"><nd ref="4"/><nd ref="5"/><tag k="highway" v="primary"/></way>
+  <way id="14"><nd ref="3"/><nd ref="1"/><tag k="footway" v="sidewalk"/><tag k="highway" v="footway"/></way>
+</osm>"""
+
+
+class OfflineRoutingTests(TestCase):
+    """A three-node graph: a short slow road from Chicago to Dallas and a faster highway via Memphis."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'graph.bin')
+        direct, via_1, via_2 = haversine_m(*CHICAGO, *DALLAS), haversine_m(*CHICAGO, *MEMPHIS), haversine_m(*MEMPHIS, *DALLAS)
+        edges = [(0, 1, direct, 10), (0, 2, via_1, 30), (2, 1, via_2, 30)]
+        edges += [(target, source, meters, speed) for source, target, meters, speed in edges]
+        write_graph(
+            cls.path, [CHICAGO[0], DALLAS[0], MEMPHIS[0]], [CHICAGO[1], DALLAS[1], MEMPHIS[1]],
+            [edge[0] for edge in edges], [edge[1] for edge in edges],
+            [edge[2] / edge[3] for edge in edges], [edge[2] for edge in edges],
+            places=[('Chicago', *CHICAGO, 2_700_000), ('Dallas', *DALLAS, 1_300_000)],
+        )
+        cls.settings = override_settings(ROUTING={'BACKEND': 'ors_then_offline', 'GRAPH_PATH': cls.path})
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        geocoding_cache.memory.clear()
+
+    def test_fastest_path_and_snapping(self):
+        graph = RoadGraph(self.path)
+        self.addCleanup(graph.close)
+        self.assertEqual(graph.nearest(-87.7, 41.9), 0)
+        nodes, deciseconds, meters = graph.shortest_path(0, 1)
+        self.assertEqual(nodes, [0, 2, 1])
+        self.assertAlmostEqual(meters, haversine_m(*CHICAGO, *MEMPHIS) + haversine_m(*MEMPHIS, *DALLAS), delta=2)
+
+        route = graph.directions([[-87.7, 41.9], list(DALLAS)])
+        self.assertEqual(len(route['features'][0]['geometry']['coordinates']), 3)
+        self.assertAlmostEqual(route['features'][0]['properties']['summary']['duration'], deciseconds / 10)
+        self.assertEqual(graph.search_place('Chicago, IL')[0], 'Chicago')
+        self.assertIsNone(graph.search_place('Springfield, IL'))
+
+    def test_route_falls_back_to_the_graph_while_ors_is_down(self):
+        trip = make_trip(make_driver(), days=0, stops=0)
+        breaker = get_ors_guard().breaker
+        self.addCleanup(breaker.record, True)
+        for _ in range(breaker.threshold):
+            breaker.record(False)
+
+        response = APIClient().get(reverse('trips:route-data', args=[trip.id]))
+        self.assertEqual(response.status_code, 200)
+        trip.refresh_from_db()
+        self.assertEqual([trip.pickup_longitude, trip.pickup_latitude], list(CHICAGO))
+        self.assertEqual(GeocodeCache.objects.get(normalized_query='chicago il').label, 'Chicago')
+
+    def test_build_from_osm_keeps_the_truck_network(self):
+        source = os.path.join(self.directory.name, 'extract.osm')
+        with open(source, 'w') as handle:
+            handle.write(OSM_EXTRACT)
+        output = os.path.join(self.directory.name, 'extract.bin')
+        # The hgv=no road and footway are dropped, and so is the disconnected way 13
+        self.assertEqual(build_from_osm(source, output), (3, 3, 1))
+        graph = RoadGraph(output)
+        self.addCleanup(graph.close)
+        self.assertIsNone(graph.shortest_path(2, 1))  # against the one-way
+        self.assertEqual(graph.shortest_path(0, 2)[0], [0, 1, 2])
+        self.assertEqual(graph.search_place('Gary, IN'), ('Gary', -87.0, 41.0))
+
+
+class StopOrderTests(SimpleTestCase):
+    def test_order_respects_loads_and_beats_the_greedy_tour(self):
+        # Points on a line; nearest neighbour from 0 goes to 1 first and then doubles back
+        positions = [0, 1, -1.5, 5, -2]
+        cost = [[abs(a - b) for b in positions] for a in positions]
+        stops = [{'type': 'current'}, {'type': 'pickup', 'load': 'a'}, {'type': 'pickup', 'load': 'b'},
+                 {'type': 'dropoff', 'load': 'a'}, {'type': 'dropoff', 'load': 'b'}]
+        order = optimize_order(cost, stops)
+        self.assertEqual(order, [0, 2, 4, 1, 3])
+        self.assertEqual(path_cost(order, cost), 9)
+
+        # Without labels every pickup precedes every dropoff
+        stops = [{'type': 'current'}, {'type': 'dropoff'}, {'type': 'pickup'}, {'type': 'pickup'}, {'type': 'dropoff'}]
+        order = optimize_order(cost, stops)
+        self.assertLess(max(order.index(2), order.index(3)), min(order.index(1), order.index(4)))
+
+
+class MultiStopTripTests(TestCase):
+    """Stops on one east-west line, so the best order is the west to east sweep."""
+    POINTS = {'Yard': [-100.0, 40.0], 'Pick A': [-99.0, 40.0], 'Pick B': [-98.0, 40.0],
+              'Drop B': [-95.0, 40.0], 'Drop A': [-90.0, 40.0]}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server()
+        cls.settings = override_settings(ORS={**settings.ORS, 'BASE_URL': start_in_thread(cls.server),
+                                              'RATE_LIMITS_PER_MINUTE': {}})
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        geocoding_cache.memory.clear()
+        travel_matrix.memory.clear()
+        travel_matrix.reset_stats()
+        geocoding_cache.store_many([(text.lower(), text, coords, text) for text, coords in self.POINTS.items()])
+        self.driver = make_driver()
+
+    def create_trip(self, **data):
+        payload = {'current_location': 'Yard', 'current_cycle_used': 0, **data}
+        with mock.patch('trips.views.enqueue_trip_generation'):
+            return APIClient().post(reverse('trips:trip-list-create'), payload, format='json')
+
+    def test_stops_are_reordered_and_matrix_pairs_cached(self):
+        waypoints = [{'location': 'Drop A', 'type': 'dropoff', 'load': 'a'},
+                     {'location': 'Drop B', 'type': 'dropoff', 'load': 'b'},
+                     {'location': 'Pick B', 'type': 'pickup', 'load': 'b'},
+                     {'location': 'Pick A', 'type': 'pickup', 'load': 'a'}]
+        response = self.create_trip(waypoints=waypoints, optimize_stop_order=True)
+        self.assertEqual(response.status_code, 201, response.data)
+        trip = Trip.objects.get(id=response.data['id'])
+
+        route_data = refresh_route(trip, get_ors_client())
+        trip.refresh_from_db()
+        self.assertEqual([stop['location'] for stop in trip.waypoints], ['Pick A', 'Pick B', 'Drop B', 'Drop A'])
+        self.assertEqual((trip.pickup_location, trip.dropoff_location), ('Pick A', 'Drop A'))
+        # The deadhead leg from the yard is part of the trip
+        self.assertEqual(len(route_data['legs']), 4)
+        self.assertAlmostEqual(route_data['distance_miles'], sum(leg['distance_miles'] for leg in route_data['legs']),
+                               delta=0.05)
+        self.assertGreater(route_data['legs'][0]['distance_miles'], 0)
+        self.assertEqual(TravelMatrixCache.objects.count(), 5 * 4)
+        self.assertEqual(travel_matrix.requests, 1)
+
+        plan = build_trip_plan(trip, route_data)
+        self.assertEqual([stop.location for stop in plan.stops if stop.stop_type in ('pickup', 'dropoff')],
+                         ['Pick A', 'Pick B', 'Drop B', 'Drop A'])
+
+        # The same stops in another order are the same lane: no new matrix call
+        travel_matrix.memory.clear()
+        trip.waypoints = list(reversed(waypoints))
+        refresh_route(trip, get_ors_client())
+        self.assertEqual(travel_matrix.requests, 1)
+
+    def test_ordered_stops_are_kept_and_checked(self):
+        response = self.create_trip(waypoints=[{'location': 'Drop A', 'type': 'dropoff', 'load': 'a'},
+                                               {'location': 'Pick A', 'type': 'pickup', 'load': 'a'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('waypoints', response.data)
+
+        response = self.create_trip(pickup_location='Pick A', dropoff_location='Drop A')
+        trip = Trip.objects.get(id=response.data['id'])
+        route_data = refresh_route(trip, get_ors_client())
+        self.assertEqual([stop['type'] for stop in route_data['waypoints']], ['current', 'pickup', 'dropoff'])
+        self.assertEqual(travel_matrix.requests, 0)
+        self.assertEqual(trip.waypoints, [])
+
+
+@mock.patch('trips.batch.get_routing_client')
+class BatchTripTests(TestCase):
+    def setUp(self):
+        geocoding_cache.memory.clear()
+        self.driver = make_driver()
+        self.other = make_driver('other', driver_number='1002')
+        self.client = CountingClient()
+
+    def post(self, items):
+        return APIClient().post(reverse('trips:trip-batch-create'), {'trips': items}, format='json')
+
+    def item(self, pickup='Chicago, IL', dropoff='Dallas, TX', **extra):
+        return {'current_location': 'Joliet, IL', 'pickup_location': pickup, 'dropoff_location': dropoff,
+                'current_cycle_used': 10, **extra}
+
+    def test_addresses_and_lanes_are_deduplicated(self, get_client):
+        get_client.return_value = self.client
+        response = self.post([self.item(), self.item(pickup='chicago il'), self.item(dropoff='Denver, CO')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        # Joliet, Chicago, Dallas, Denver; "chicago il" is the same address and the same lane
+        self.assertEqual(self.client.calls['pelias_search'], 4)
+        self.assertEqual(self.client.calls['directions'], 2)
+        self.assertEqual(Trip.objects.filter(status='ready').count(), 3)
+        self.assertTrue(Stop.objects.filter(trip__pickup_location='chicago il').exists())
+
+    def test_outcomes_are_reported_per_item(self, get_client):
+        get_client.return_value = self.client
+        response = self.post([self.item(driver_id=self.other.id), {'pickup_location': 'x'}])
+        self.assertEqual(response.status_code, 207)
+        first, second = response.data['results']
+        self.assertEqual(first['status'], 'created')
+        self.assertEqual(Trip.objects.get(id=first['trip_id']).driver, self.other)
+        self.assertEqual((second['index'], second['status']), (1, 'error'))
+        self.assertIn('current_location', second['errors'])
+
+        response = self.post([{'pickup_location': 'x'}])
+        self.assertEqual((response.status_code, response.data['created']), (400, 0))
+        self.assertEqual(self.post([]).status_code, 400)
+
+    def test_bad_driver_ids_fail_only_their_item(self, get_client):
+        get_client.return_value = self.client
+        response = self.post([self.item(driver_id='abc'), self.item(driver_id=[1]), self.item(driver_id=999),
+                              self.item(driver_id=str(self.other.id))])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['error', 'error', 'error', 'created'])
+        self.assertIn('driver_id', results[0]['errors'])
+        self.assertIn('driver_id', results[1]['errors'])
+        self.assertEqual(results[2]['errors'], {'driver_id': ['Unknown driver.']})
+        self.assertEqual(Trip.objects.get(id=results[3]['trip_id']).driver, self.other)
+
+
+class TripJobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server()
+        cls.settings = override_settings(ORS={**settings.ORS, 'BASE_URL': start_in_thread(cls.server),
+                                              'RATE_LIMITS_PER_MINUTE': {}})
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        geocoding_cache.memory.clear()
+        self.driver = make_driver()
+
+    def create_trip(self):
+        return APIClient().post(reverse('trips:trip-list-create'), {
+            'current_location': 'Joliet, IL', 'pickup_location': 'Chicago, IL', 'dropoff_location': 'Dallas, TX',
+            'current_cycle_used': 10,
+        }, format='json')
+
+    def run_worker(self):
+        # The command installs its own SIGTERM/SIGINT handlers; keep the test runner's
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        call_command('run_trip_worker', '--once', stdout=io.StringIO())
+
+    def test_create_enqueues_one_job_and_a_worker_pass_marks_the_trip_ready(self):
+        response = self.create_trip()
+        self.assertEqual(response.status_code, 201)
+        trip = Trip.objects.get(id=response.data['id'])
+        self.assertEqual(trip.status, 'pending')
+        job = TripJob.objects.get(trip=trip)
+        self.assertEqual((job.kind, job.status, job.attempts), ('generate_trip', 'queued', 0))
+
+        self.run_worker()
+        trip.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(trip.status, 'ready')
+        self.assertTrue(trip.has_route)
+        self.assertTrue(trip.daily_logs.exists())
+        self.assertEqual((job.status, job.attempts, job.progress, job.locked_at), ('succeeded', 1, 100, None))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(claim_next_job('test'))
+
+    def test_location_edit_replans_the_trip(self):
+        trip = Trip.objects.get(id=self.create_trip().data['id'])
+        self.run_worker()
+        before = (set(trip.stops.values_list('id', flat=True)), set(trip.daily_logs.values_list('id', flat=True)))
+
+        response = APIClient().patch(reverse('trips:trip-detail', args=[trip.id]),
+                                     {'dropoff_location': 'Denver, CO'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        trip.refresh_from_db()
+        self.assertEqual(trip.status, 'pending')
+        self.assertEqual(TripJob.objects.filter(trip=trip, status='queued').count(), 1)
+
+        self.run_worker()
+        trip.refresh_from_db()
+        self.assertEqual(trip.status, 'ready')
+        self.assertEqual(trip.stops.get(stop_type='dropoff').location, 'Denver, CO')
+        self.assertTrue(before[0].isdisjoint(trip.stops.values_list('id', flat=True)))
+        self.assertTrue(before[1].isdisjoint(trip.daily_logs.values_list('id', flat=True)))
+        self.assertTrue(trip.daily_logs.exists())
+
+        # Other edits keep the plan
+        APIClient().patch(reverse('trips:trip-detail', args=[trip.id]), {'current_cycle_used': 20}, format='json')
+        self.assertFalse(TripJob.objects.filter(trip=trip, status='queued').exists())
+
+    def test_failing_job_is_retried_with_backoff_then_failed(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        job = enqueue_trip_generation(trip)
+        job.max_attempts = 2
+        job.save()
+
+        def fail(job):
+            raise exceptions.ApiError(502, {'error': 'Bad gateway'})
+
+        with mock.patch.dict(JOB_HANDLERS, {'generate_trip': fail}), \
+                mock.patch('trips.jobs.random.uniform', side_effect=lambda low, high: high), \
+                self.assertLogs('eld_tracker', 'WARNING'):
+            claimed = claim_next_job('test')
+            self.assertEqual((claimed.pk, claimed.status, claimed.locked_by), (job.pk, 'running', 'test'))
+            before = timezone.now()
+            self.assertFalse(run_job(claimed))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), ('queued', 1, ''))
+            self.assertIn('ApiError', job.last_error)
+            delay = (job.run_after - before).total_seconds()
+            self.assertAlmostEqual(delay, settings.TRIP_JOBS['BACKOFF_BASE_SECONDS'], delta=1)
+            trip.refresh_from_db()
+            self.assertEqual(trip.status, 'pending')
+
+            # Not runnable again until the backoff has passed
+            self.assertIsNone(claim_next_job('test'))
+            TripJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertFalse(run_job(claim_next_job('test')))
+
+        job.refresh_from_db()
+        trip.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(trip.status, 'failed')
+        self.assertIsNone(claim_next_job('test'))
+
+    def test_backoff_grows_exponentially_up_to_the_cap(self):
+        with mock.patch('trips.jobs.random.uniform', side_effect=lambda low, high: high):
+            delays = [backoff_delay(attempts) for attempts in (1, 2, 3, 20)]
+        base = settings.TRIP_JOBS['BACKOFF_BASE_SECONDS']
+        self.assertEqual(delays, [base, base * 2, base * 4, settings.TRIP_JOBS['BACKOFF_MAX_SECONDS']])
+
+    def test_stale_locks_are_requeued(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        stale = enqueue_trip_generation(trip)
+        fresh = enqueue_trip_generation(trip)
+        timeout = timedelta(seconds=settings.TRIP_JOBS['LOCK_TIMEOUT_SECONDS'])
+        TripJob.objects.filter(pk=stale.pk).update(status='running', locked_by='gone:1',
+                                                   locked_at=timezone.now() - timeout - timedelta(minutes=1))
+        TripJob.objects.filter(pk=fresh.pk).update(status='running', locked_by='alive:2', locked_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by, stale.locked_at), ('queued', '', None))
+        self.assertEqual((fresh.status, fresh.locked_by), ('running', 'alive:2'))
+        self.assertEqual(claim_next_job('test').pk, stale.pk)
+
+    def test_stale_jobs_out_of_attempts_are_failed(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        job = enqueue_trip_generation(trip)
+        timeout = timedelta(seconds=settings.TRIP_JOBS['LOCK_TIMEOUT_SECONDS'])
+        TripJob.objects.filter(pk=job.pk).update(status='running', attempts=job.max_attempts, locked_by='gone:1',
+                                                 locked_at=timezone.now() - timeout - timedelta(minutes=1))
+
+        with self.assertLogs('eld_tracker', 'ERROR'):
+            self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        trip.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.locked_at), ('failed', '', None))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(trip.status, 'failed')
+        self.assertIsNone(claim_next_job('test'))
+
+    def test_clients_cannot_set_the_status(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        Trip.objects.filter(pk=trip.pk).update(status='pending', drive_time=None)
+        response = APIClient().patch(reverse('trips:trip-detail', args=[trip.id]),
+                                     {'status': 'completed', 'drive_time': 3, 'current_cycle_used': 20}, format='json')
+        self.assertEqual(response.status_code, 200)
+        trip.refresh_from_db()
+        self.assertEqual((trip.status, trip.drive_time, trip.current_cycle_used), ('pending', None, 20))
+
+    def test_status_endpoint_reports_the_latest_job(self):
+        trip = make_trip(self.driver, days=0, stops=0)
+        url = reverse('trips:trip-status', args=[trip.id])
+        self.assertEqual(APIClient().get(url).data, {'trip_id': str(trip.id), 'status': 'ready', 'job': None})
+
+        enqueue_trip_generation(trip)
+        latest = enqueue_trip_generation(trip)
+        TripJob.objects.filter(pk=latest.pk).update(progress=50, progress_message='Planning stops and daily logs')
+        data = APIClient().get(url).data
+        self.assertEqual((data['trip_id'], data['status']), (str(trip.id), 'pending'))
+        self.assertEqual(data['job']['id'], latest.pk)
+        self.assertEqual((data['job']['status'], data['job']['progress'], data['job']['progress_message']),
+                         ('queued', 50, 'Planning stops and daily logs'))
+        self.assertEqual(APIClient().get(reverse('trips:trip-status', args=[uuid.uuid4()])).status_code, 404)
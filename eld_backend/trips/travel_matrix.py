@@ -0,0 +1,150 @@
+"""Truck distance/duration matrix between geocoded points, cached per location pair.
+
+Entries live in an in-process LRU in front of the TravelMatrixCache table, like geocoding. A
+matrix request looks every pair up in one query and asks the routing client only for the block
+of origins x destinations that still has gaps, so a lane that was planned before costs nothing.
+"""
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .geocoding import LRUCache
+from .models import TravelMatrixCache
+
+
+def location_key(coords):
+    """Cache key of a [lon, lat] point, rounded to about a metre."""
+    return f"{coords[0]:.5f},{coords[1]:.5f}"
+
+
+class TravelMatrix:
+    def __init__(self, max_entries, ttl_seconds, db_ttl_days):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.db_ttl_days = db_ttl_days
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def lookup_many(self, pairs):
+        """Returns {(origin, destination): (meters, seconds)} for key pairs found in memory or the table."""
+        found = {}
+        missing = []
+        for pair in pairs:
+            entry = self.memory.get(pair)
+            if entry is not None:
+                self._count('memory_hits')
+                found[pair] = entry
+            else:
+                missing.append(pair)
+
+        if missing:
+            cutoff = timezone.now() - timedelta(days=self.db_ttl_days)
+            origins = {origin for origin, destination in missing}
+            destinations = {destination for origin, destination in missing}
+            rows = TravelMatrixCache.objects.filter(
+                origin__in=origins, destination__in=destinations, updated_at__gte=cutoff,
+            ).values_list('origin', 'destination', 'distance_meters', 'duration_seconds')
+            wanted = set(missing)
+            for origin, destination, meters, seconds in rows:
+                if (origin, destination) not in wanted:
+                    continue
+                self._count('db_hits')
+                found[origin, destination] = (meters, seconds)
+                self.memory.set((origin, destination), (meters, seconds))
+        return found
+
+    def store_many(self, entries):
+        """Saves fresh entries [(origin, destination, meters, seconds)] with a single upsert."""
+        TravelMatrixCache.objects.bulk_create(
+            [TravelMatrixCache(origin=origin, destination=destination, distance_meters=meters,
+                               duration_seconds=seconds)
+             for origin, destination, meters, seconds in entries],
+            update_conflicts=True,
+            unique_fields=['origin', 'destination'],
+            update_fields=['distance_meters', 'duration_seconds', 'updated_at'],
+        )
+        for origin, destination, meters, seconds in entries:
+            self.memory.set((origin, destination), (meters, seconds))
+
+    def _lookup(self, keys):
+        pairs = {(a, b) for a in keys for b in keys if a != b}
+        found = self.lookup_many(list(pairs))
+        self._count('misses', len(pairs) - len(found))
+        # Only origins and destinations with a gap are requested
+        sources = sorted({i for i, a in enumerate(keys) for b in keys if a != b and (a, b) not in found})
+        destinations = sorted({j for j, b in enumerate(keys) for a in keys if a != b and (a, b) not in found})
+        return found, sources, destinations
+
+    def _fresh(self, keys, response, sources, destinations):
+        entries = {}
+        for row, i in enumerate(sources):
+            for column, j in enumerate(destinations):
+                if keys[i] != keys[j]:
+                    entries[keys[i], keys[j]] = (response['distances'][row][column],
+                                                 response['durations'][row][column])
+        return entries
+
+    @staticmethod
+    def _assemble(keys, found):
+        """(distances, durations) as square lists of lists; None where there is no route."""
+        def entry(a, b):
+            return (0.0, 0.0) if a == b else found[a, b]
+        distances = [[entry(a, b)[0] for b in keys] for a in keys]
+        durations = [[entry(a, b)[1] for b in keys] for a in keys]
+        return distances, durations
+
+    def matrix(self, client, coords):
+        """Distance (meters) and duration (seconds) matrices between [lon, lat] points."""
+        keys = [location_key(point) for point in coords]
+        found, sources, destinations = self._lookup(keys)
+        if sources:
+            self._count('requests')
+            response = client.distance_matrix(locations=coords, sources=sources, destinations=destinations,
+                                              profile='driving-hgv', metrics=['distance', 'duration'])
+            fresh = self._fresh(keys, response, sources, destinations)
+            self.store_many([(*pair, *entry) for pair, entry in fresh.items()])
+            found.update(fresh)
+        return self._assemble(keys, found)
+
+    async def amatrix(self, client, coords):
+        """matrix() with an async routing client."""
+        keys = [location_key(point) for point in coords]
+        found, sources, destinations = await sync_to_async(self._lookup)(keys)
+        if sources:
+            self._count('requests')
+            response = await client.distance_matrix(locations=coords, sources=sources, destinations=destinations,
+                                                    profile='driving-hgv', metrics=['distance', 'duration'])
+            fresh = self._fresh(keys, response, sources, destinations)
+            await sync_to_async(self.store_many)([(*pair, *entry) for pair, entry in fresh.items()])
+            found.update(fresh)
+        return self._assemble(keys, found)
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.memory_hits + self.db_hits) / lookups, 4) if lookups else None,
+            'matrix_requests': self.requests,
+            'memory_entries': len(self.memory),
+        }
+
+
+travel_matrix = TravelMatrix(
+    max_entries=settings.TRAVEL_MATRIX['MEMORY_MAX_ENTRIES'],
+    ttl_seconds=settings.TRAVEL_MATRIX['MEMORY_TTL_SECONDS'],
+    db_ttl_days=settings.TRAVEL_MATRIX['DB_TTL_DAYS'],
+)
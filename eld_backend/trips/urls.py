@@ -6,17 +6,38 @@ app_name = 'trips'
 urlpatterns = [
     # Trip management
     path('api/trips/', views.TripListCreateView.as_view(), name='trip-list-create'),
+    path('api/trips/batch/', views.trip_batch_create_view, name='trip-batch-create'),
     path('api/trips/<uuid:pk>/', views.TripDetailView.as_view(), name='trip-detail'),
+    path('api/trips/<uuid:trip_id>/status/', views.trip_status_view, name='trip-status'),
     
     # Daily logs
     path('api/trips/<uuid:trip_id>/logs/', views.DailyLogListView.as_view(), name='daily-logs'),
     
     # Duty events
     path('api/logs/<uuid:daily_log_id>/events/', views.DutyEventListView.as_view(), name='duty-events'),
+    path('api/events/bulk/', views.duty_event_ingest_view, name='duty-event-ingest'),
+
+    # Rendered log sheets (SVG/PDF)
+    path('api/logs/<uuid:daily_log_id>/grid/', views.log_grid_view, name='log-grid'),
+    path('api/trips/<uuid:trip_id>/grid/', views.trip_grid_view, name='trip-grid'),
+    path('api/drivers/<int:driver_id>/grid/', views.driver_grid_view, name='driver-grid'),
     
     # Route and mapping
     path('api/trips/<uuid:trip_id>/route/', views.route_data_view, name='route-data'),
     
     # Driver statistics
     path('api/drivers/<int:driver_id>/stats/', views.driver_stats_view, name='driver-stats'),
+    path('api/drivers/<int:driver_id>/clock/', views.driver_clock_view, name='driver-clock'),
+    path('api/drivers/compliance/', views.FleetComplianceView.as_view(), name='fleet-compliance'),
+    path('api/drivers/<int:driver_id>/eld-output/', views.eld_output_view, name='eld-output'),
+
+    # Bulk exports
+    path('api/exports/logs/', views.log_export_view, name='log-export'),
+
+    # Live updates (server-sent events, ASGI)
+    path('api/live/trips/<uuid:trip_id>/', views.trip_live_view, name='trip-live'),
+    path('api/live/drivers/<int:driver_id>/', views.driver_live_view, name='driver-live'),
+
+    # Operational metrics
+    path('api/metrics/', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
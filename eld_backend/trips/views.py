@@ -1,342 +1,579 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render,get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-from .models import DailyLog,DutyEvents,Stop,Driver, Trip
-from .serializers import TripsSerializer, CreateTripSerializer, DailyLogSerializer, DutyEventSerializer, StopsSerializer, DriverSerializer
+from django.core.handlers.asgi import ASGIRequest
+from .models import DailyLog,DutyEvents,Stop,Driver, Trip, driver_name_expression
+from .serializers import TripsSerializer, CreateTripSerializer, DailyLogSerializer, DutyEventSerializer, StopsSerializer, DriverSerializer, TripJobSerializer, FleetComplianceSerializer
 from rest_framework import generics, status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from datetime import timedelta,datetime, time
+from zoneinfo import ZoneInfo
 import requests
 import math
+from itertools import islice
 from django.utils import timezone
-from decouple import config
-import openrouteservice
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET, require_safe
+from .geocoding import geocoding_cache
+from .eld_output import build_output_file, default_window
+from .exports import EXPORT_FORMATS, export_chunks, export_rows
+from .log_grid import GRID_FORMATS, grid_logs, grid_renderer
+from .geometry import POLYLINE_PRECISION, decode_polyline, encode_polyline, linestring, simplify
+from .batch import create_trips_in_bulk
+from .ingestion import ingest_duty_events
+from .jobs import enqueue_trip_generation
+from .clocks import clock_data, driver_clock
+from .live import driver_channel, event_stream, trip_channel
+from .conditional import (
+    log_trip_etag, log_trip_last_modified, revalidate, trip_etag, trip_last_modified,
+    trip_list_etag, trip_list_last_modified,
+)
+from .pagination import DailyLogPagination, DutyEventPagination, TripPagination
+from .response_cache import response_cache
+from .ors import ORSUnavailable, get_ors_guard
+from .services import ROUTE_LOCATION_FIELDS, arefresh_route, clear_route, refresh_route
+from .travel_matrix import travel_matrix
+from .summaries import cycle_hours_subquery, cycle_rule, cycle_window, fleet_compliance_queryset
 
 # Create your views here.
+@method_decorator(revalidate(trip_list_etag, trip_list_last_modified), name='get')
 class TripListCreateView(generics.ListCreateAPIView):
     """List all trips or create a new trip"""
-    queryset = Trip.objects.all()
+    queryset = Trip.objects.with_details()
+    pagination_class = TripPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateTripSerializer
         return TripsSerializer
     
+    @transaction.atomic
     def perform_create(self, serializer):
         driver = Driver.objects.first()
         trip = serializer.save(driver=driver)
         
-        # Generate route and ELD logs after trip creation
-        self.generate_trip_route_and_logs(trip)
-    
-    def generate_trip_route_and_logs(self, trip):
-        """Generate route information and ELD logs for the trip"""
-        try:
-            # Calculate route using OpenRouteService API
-            route_data = self.get_route_data(trip)
-            
-            if route_data:
-                self.create_trip_stops(trip, route_data)
-                self.generate_daily_logs(trip, route_data)
-                
-        except Exception as e:
-            print(f"Error generating trip data: {e}")
-    
-    def get_route_data(self, trip):
-        """Get route data from OpenRouteService API"""
-        api_key = config("ORS_API_KEY")
-        client = openrouteservice.Client(key=api_key)
-
-        # Get coordinates for all locations
-        pickup = client.pelias_search(text=trip.pickup_location)
-        dropoff = client.pelias_search(text=trip.dropoff_location)
-
-        if not pickup['features'] or not dropoff['features']:
-            raise ValueError("Could not geocode addresses")
-
-        pickup_coords = pickup['features'][0]['geometry']['coordinates']  # [lon, lat]
-        dropoff_coords = dropoff['features'][0]['geometry']['coordinates']
-
-        # Step 2: Request driving directions
-        route = client.directions(
-            coordinates=[pickup_coords, dropoff_coords],
-            profile='driving-hgv',   # 'driving-car' also works
-            format='geojson'
-        )
-
-        # Extract distance and duration
-        summary = route['features'][0]['properties']['summary']
-        distance_miles = summary['distance'] / 1609.34
-        duration_hours = summary['duration'] / 3600
-
-        return {
-            'distance_miles': round(distance_miles, 2),
-            'duration_hours': round(duration_hours, 2),
-            'waypoints': [
-                {'location': trip.pickup_location, 'type': 'pickup'},
-                {'location': trip.dropoff_location, 'type': 'dropoff'}
-            ],
-            'geometry': route['features'][0]['geometry'] 
-        }
-        
-    def create_trip_stops(self, trip, route_data):
-        """Create stops based on route data"""
-        distance_miles = route_data['distance_miles']
-        current_time = timezone.now()
-        
-        stops = []
-        
-        # Pre-trip inspection
-        stops.append({
-            'location': trip.current_location,
-            'stop_type': 'pretrip',
-            'arrival_time': current_time,
-            'departure_time': current_time + timedelta(minutes=30),
-            'duration': 0.5
-        })
-        
-        # Fuel stops every 1000
-        fuel_stops = max(1, distance_miles // 1000)
-        for i in range(fuel_stops):
-            fuel_time = current_time + timedelta(hours=4 * (i + 1))
-            stops.append({
-                'location': f'Fuel Stop {i + 1}',
-                'stop_type': 'fuel',
-                'arrival_time': fuel_time,
-                'departure_time': fuel_time + timedelta(minutes=30),
-                'duration': 0.5
-            })
-        
-        # Pickup stop
-        pickup_time = current_time + timedelta(hours=2)
-        stops.append({
-            'location': trip.pickup_location,
-            'stop_type': 'pickup',
-            'arrival_time': pickup_time,
-            'departure_time': pickup_time + timedelta(hours=1),
-            'duration': 1.0
-        })
-        
-        # Dropoff stop
-        dropoff_time = current_time + timedelta(hours=route_data['duration_hours'] - 1)
-        stops.append({
-            'location': trip.dropoff_location,
-            'stop_type': 'dropoff',
-            'arrival_time': dropoff_time,
-            'departure_time': dropoff_time + timedelta(hours=1),
-            'duration': 1.0
-        })
-        
-        # Post-trip inspection
-        stops.append({
-            'location': trip.dropoff_location,
-            'stop_type': 'posttrip',
-            'arrival_time': dropoff_time + timedelta(hours=1),
-            'departure_time': dropoff_time + timedelta(hours=1.5),
-            'duration': 0.5
-        })
-        
-        # Create stop objects
-        for stop_data in stops:
-            Stop.objects.create(trip=trip, **stop_data)
-    
-    def generate_daily_logs(self, trip, route_data):
-        """Generate daily ELD logs based on trip data"""
-        total_hours = route_data['duration_hours']
-        total_miles = route_data['distance_miles']
-
-        current_date = timezone.now().date()
-        remaining_hours = total_hours
-        remaining_miles = total_miles
-        day_count = 0
-
-        # Load constants from settings
-        MAX_DRIVING_HOURS = settings.ELD_SETTINGS['MAX_DRIVING_HOURS_PER_DAY']
-        REQUIRED_REST = settings.ELD_SETTINGS['REQUIRED_REST_PERIOD_HOURS']
-        BREAK_DURATION = settings.ELD_SETTINGS['MANDATORY_BREAK_DURATION']
-        DEFAULT_ON_DUTY = 2.0   # inspections, fueling, misc
-        DEFAULT_OFF_DUTY = BREAK_DURATION
-
-        while remaining_hours > 0:
-            # Respect max driving per day
-            daily_driving_hours = min(MAX_DRIVING_HOURS, remaining_hours)
-
-            # Distribute miles proportionally
-            daily_miles = (remaining_miles / remaining_hours) * daily_driving_hours if remaining_hours > 0 else 0
-
-            # Create daily log
-            daily_log = DailyLog.objects.create(
-                trip=trip,
-                driver=trip.driver,
-                date=current_date + timedelta(days=day_count),
-                total_driving_time=daily_driving_hours,
-                total_on_duty_time=DEFAULT_ON_DUTY,
-                total_off_duty_time=DEFAULT_OFF_DUTY,
-                total_sleeper_berth_time=REQUIRED_REST,
-                total_driving_miles=daily_miles,
-                vehicle_number=f"T{trip.driver.driver_number}"
-            )
-
-            # Generate duty events for this day
-            self.generate_duty_events(daily_log, daily_driving_hours)
-
-            remaining_hours -= daily_driving_hours
-            remaining_miles -= daily_miles
-            day_count += 1
-    
-    def generate_duty_events(self, daily_log, driving_hours):
-        """Generate duty events for a daily log"""
-        start_time = timezone.make_aware(
-            datetime.combine(daily_log.date, time(6, 0))  # Start at 6 AM
-        )
-        
-        events = [
-            # Pre-trip inspection
-            {
-                'duty_event_status': 'on_duty',
-                'start_time': start_time,
-                'end_time': start_time + timedelta(minutes=30),
-                'location': 'Terminal',
-                'remarks': 'Pre-trip inspection',
-                'truck_moved': False
-            },
-            # Driving
-            {
-                'duty_event_status': 'driving',
-                'start_time': start_time + timedelta(minutes=30),
-                'end_time': start_time + timedelta(hours=driving_hours + 0.5),
-                'location': 'On Route',
-                'remarks': 'Driving',
-                'truck_moved': True
-            },
-            # 30-minute break
-            {
-                'duty_event_status': 'off_duty',
-                'start_time': start_time + timedelta(hours=4),
-                'end_time': start_time + timedelta(hours=4.5),
-                'location': 'Rest Area',
-                'remarks': '30-minute break',
-                'truck_moved': False
-            },
-            # Sleeper berth
-            {
-                'duty_event_status': 'sleeper_berth',
-                'start_time': start_time + timedelta(hours=driving_hours + 2),
-                'end_time': start_time + timedelta(hours=24),
-                'location': 'Truck Stop',
-                'remarks': '10-hour rest period',
-                'truck_moved': False
-            }
-        ]
-        
-        for event_data in events:
-            DutyEvents.objects.create(daily_log=daily_log, **event_data)
+        # Route and ELD logs are generated by the trip worker (manage.py run_trip_worker)
+        enqueue_trip_generation(trip)
 
 
+@method_decorator(revalidate(trip_etag, trip_last_modified), name='get')
 class TripDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a specific trip"""
-    queryset = Trip.objects.all()
+    queryset = Trip.objects.with_details()
     serializer_class = TripsSerializer
 
-
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        version = trip_last_modified(request, pk=kwargs['pk'])
+        return Response(response_cache.get_or_build(
+            request, 'trip-detail', kwargs['pk'], version, lambda: build(request, *args, **kwargs).data))
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous = {field: getattr(serializer.instance, field) for field in ROUTE_LOCATION_FIELDS}
+        trip = serializer.save()
+
+        # Only re-route when a location actually changed
+        if any(getattr(trip, field) != value for field, value in previous.items()):
+            try:
+                refresh_route(trip)
+            except ValueError as e:
+                raise ValidationError({'error': str(e)})
+            except ORSUnavailable:
+                # Keep the edit; the route endpoint backfills the route once ORS is back
+                clear_route(trip)
+            # The stops, logs and events were planned for the old route; the worker replaces them
+            enqueue_trip_generation(trip)
+
+
+@method_decorator(revalidate(trip_etag, trip_last_modified), name='get')
 class DailyLogListView(generics.ListAPIView):
     """List daily logs for a specific trip"""
     serializer_class = DailyLogSerializer
+    pagination_class = DailyLogPagination
     
     def get_queryset(self):
         trip_id = self.kwargs.get('trip_id')
-        return DailyLog.objects.filter(trip_id=trip_id).order_by('date')
+        return DailyLog.objects.with_driver_name().filter(trip_id=trip_id).order_by('date')
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        version = trip_last_modified(request, trip_id=kwargs['trip_id'])
+        return Response(response_cache.get_or_build(
+            request, 'daily-logs', kwargs['trip_id'], version, lambda: build(request, *args, **kwargs).data))
 
 
-class DutyEventListView(generics.ListAPIView):
-    """List duty events for a specific daily log"""
+@method_decorator(revalidate(log_trip_etag, log_trip_last_modified), name='get')
+class DutyEventListView(generics.ListCreateAPIView):
+    """List duty events for a specific daily log, or add one (or a list of) events to it"""
     serializer_class = DutyEventSerializer
+    pagination_class = DutyEventPagination
     
     def get_queryset(self):
         daily_log_id = self.kwargs.get('daily_log_id')
         return DutyEvents.objects.filter(daily_log_id=daily_log_id).order_by('start_time')
 
-
-@api_view(['GET'])
-def route_data_view(request, trip_id):
-    """Get route data with geometry and geocoded coordinates from ORS"""
-    trip = get_object_or_404(Trip, id=trip_id)
-    stops = Stop.objects.filter(trip=trip).order_by('arrival_time')
-
-    api_key = config("ORS_API_KEY")
-    client = openrouteservice.Client(key=api_key)
-
-    # Geocode pickup + dropoff addresses
-    pickup = client.pelias_search(text=trip.pickup_location)
-    dropoff = client.pelias_search(text=trip.dropoff_location)
-
-    if not pickup['features'] or not dropoff['features']:
-        return Response({"error": "Could not geocode addresses"}, status=400)
-
-    pickup_coords = pickup['features'][0]['geometry']['coordinates']  # [lon, lat]
-    dropoff_coords = dropoff['features'][0]['geometry']['coordinates']
-
-    # Request driving route
-    route = client.directions(
-        coordinates=[pickup_coords, dropoff_coords],
-        profile="driving-hgv",  # use truck routing
-        format="geojson"
-    )
-
-    summary = route['features'][0]['properties']['summary']
-    distance_miles = summary['distance'] / 1609.34
-    duration_hours = summary['duration'] / 3600
-    geometry = route['features'][0]['geometry']  # LineString coords
+    def create(self, request, *args, **kwargs):
+        get_object_or_404(DailyLog.objects.only('pk'), pk=self.kwargs['daily_log_id'])
+        if isinstance(request.data, list):
+            return _ingest_response(request.data, daily_log_id=self.kwargs['daily_log_id'])
+
+        outcomes, created = ingest_duty_events([request.data], daily_log_id=self.kwargs['daily_log_id'])
+        outcome = outcomes[0]
+        if outcome['status'] == 'error':
+            return Response(outcome['errors'], status=status.HTTP_400_BAD_REQUEST)
+        if outcome['status'] == 'duplicate':
+            return Response(outcome, status=status.HTTP_200_OK)
+        return Response(DutyEventSerializer(created[0]).data, status=status.HTTP_201_CREATED)
+
+
+def _ingest_response(items, daily_log_id=None):
+    """Ingest a list of duty events, reporting an outcome per item"""
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty list of events"}, status=status.HTTP_400_BAD_REQUEST)
+    max_events = settings.EVENT_INGEST['MAX_EVENTS']
+    if len(items) > max_events:
+        return Response({"error": f"At most {max_events} events per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+    results, created = ingest_duty_events(items, daily_log_id=daily_log_id)
+    duplicates = sum(1 for result in results if result['status'] == 'duplicate')
+    failed = len(results) - len(created) - duplicates
+
+    if not failed:
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    elif created or duplicates:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({'created': len(created), 'duplicates': duplicates, 'failed': failed, 'results': results},
+                    status=response_status)
+
+
+@api_view(['POST'])
+def duty_event_ingest_view(request):
+    """Ingest duty events for many daily logs at once; retries are safe with client_event_id"""
+    items = request.data.get('events') if isinstance(request.data, dict) else request.data
+    return _ingest_response(items)
+
+
+@require_safe
+async def route_data_view(request, trip_id):
+    """Get stored route data with geometry and geocoded coordinates
+
+    Optional query params: zoom (web map zoom, served from precomputed levels) or tolerance
+    (Douglas-Peucker tolerance in degrees) to simplify the line, and encoding=polyline to return
+    an encoded polyline instead of a GeoJSON coordinate array. Async: a trip without a stored
+    route is routed through ORS without holding a worker thread.
+    """
+    try:
+        options = _route_geometry_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    version = await sync_to_async(trip_last_modified)(request, trip_id=trip_id)
+    if version is None:
+        raise Http404("No Trip matches the given query.")
+    etag = quote_etag(trip_etag(request, trip_id=trip_id))  # reuses the changed_at read above
+    response = get_conditional_response(request, etag=etag, last_modified=int(version.timestamp()))
+    if response is None:
+        try:
+            route_data = await response_cache.aget_or_build(
+                request, 'route', trip_id, version, lambda: _route_data(trip_id, **options))
+        except ValueError:
+            return JsonResponse({"error": "Could not geocode addresses"}, status=400)
+        except ORSUnavailable as e:
+            # The trip has no stored route and ORS is down: say when to come back instead of waiting on it
+            response = JsonResponse({"error": "Routing is temporarily unavailable", "trip_id": str(trip_id)},
+                                    status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+        response = JsonResponse(route_data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(version.timestamp())
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _route_geometry_options(params):
+    zoom = params.get('zoom')
+    tolerance = params.get('tolerance')
+    encoding = params.get('encoding', 'geojson')
+    if zoom is not None and tolerance is not None:
+        raise ValueError("Pass either zoom or tolerance, not both")
+    if zoom is not None:
+        if not zoom.isdigit() or int(zoom) > 22:
+            raise ValueError("zoom must be an integer between 0 and 22")
+        zoom = int(zoom)
+    if tolerance is not None:
+        try:
+            tolerance = float(tolerance)
+        except ValueError:
+            tolerance = -1
+        if not 0 <= tolerance < 180:
+            raise ValueError("tolerance must be a number of degrees between 0 and 180")
+    if encoding not in ('geojson', 'polyline'):
+        raise ValueError("encoding must be 'geojson' or 'polyline'")
+    return {'zoom': zoom, 'tolerance': tolerance, 'encoding': encoding}
+
+
+def _route_geometry(trip, zoom=None, tolerance=None, encoding='geojson'):
+    if zoom is not None:
+        # Levels stop once simplification stops paying off; deeper zooms get the full route
+        polyline = trip.route_levels.get(str(zoom), trip.route_polyline)
+    elif tolerance:
+        polyline = encode_polyline(simplify(decode_polyline(trip.route_polyline), tolerance))
+    else:
+        polyline = trip.route_polyline
+
+    if encoding == 'polyline':
+        return {"polyline": polyline, "polyline_precision": POLYLINE_PRECISION}
+    return {"geometry": linestring(decode_polyline(polyline))}  # map drawing
+
+
+async def _route_data(trip_id, **options):
+    trip = await Trip.objects.aget(id=trip_id)
+    stops = [stop async for stop in Stop.objects.filter(trip=trip).order_by('arrival_time')]
+
+    # Trips created before routes were stored are routed once and backfilled
+    if not trip.has_route:
+        await arefresh_route(trip)
 
     # response
-    route_data = {
+    return {
         "trip_id": str(trip.id),
         "start_location": trip.current_location,
         "pickup_location": trip.pickup_location,
         "dropoff_location": trip.dropoff_location,
+        "waypoints": trip.waypoints,
         "stops": StopsSerializer(stops, many=True).data,
         "summary": {
-            "distance_miles": round(distance_miles, 2),
-            "duration_hours": round(duration_hours, 2),
+            "distance_miles": trip.route_distance_miles,
+            "duration_hours": trip.route_duration_hours,
         },
         "coordinates": {
-            "pickup": {"lat": pickup_coords[1], "lng": pickup_coords[0]},
-            "dropoff": {"lat": dropoff_coords[1], "lng": dropoff_coords[0]},
+            "pickup": {"lat": trip.pickup_latitude, "lng": trip.pickup_longitude},
+            "dropoff": {"lat": trip.dropoff_latitude, "lng": trip.dropoff_longitude},
         },
-        "geometry": geometry  # full map drawing
+        **_route_geometry(trip, **options),
     }
 
-    return Response(route_data)
+
+@api_view(['POST'])
+def trip_batch_create_view(request):
+    """Create many trips in one request, reporting an outcome per item"""
+    items = request.data.get('trips') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({"error": "Expected a non-empty list of trips"}, status=status.HTTP_400_BAD_REQUEST)
+
+    max_trips = settings.BATCH_TRIPS['MAX_TRIPS']
+    if len(items) > max_trips:
+        return Response({"error": f"At most {max_trips} trips per batch"}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = create_trips_in_bulk(items)
+    created = sum(1 for result in results if result['status'] == 'created')
+
+    if created == len(results):
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({'created': created, 'failed': len(results) - created, 'results': results}, status=response_status)
+
+
+@api_view(['GET'])
+def trip_status_view(request, trip_id):
+    """Report route/log generation progress and errors for a trip"""
+    trip = get_object_or_404(Trip, id=trip_id)
+    job = trip.jobs.order_by('-created_at').first()
+
+    return Response({
+        'trip_id': str(trip.id),
+        'status': trip.status,
+        'job': TripJobSerializer(job).data if job else None,
+    })
+
+
+def _last_event_id(request):
+    try:
+        return int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _live_response(request, channels, snapshot):
+    response = StreamingHttpResponse(
+        event_stream(channels, snapshot, _last_event_id(request)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx must pass events through as they are written
+    return response
+
+
+@require_GET
+async def trip_live_view(request, trip_id):
+    """Server-sent events for a trip: generation status and progress, then duty events as recorded.
+
+    Serve through the ASGI application; a client that reconnects with Last-Event-ID gets what it missed.
+    """
+    if not await Trip.objects.filter(pk=trip_id).aexists():
+        raise Http404("No Trip matches the given query.")
+
+    def snapshot():
+        trip = Trip.objects.only('status').get(pk=trip_id)
+        job = trip.jobs.order_by('-created_at').first()
+        return [('status', {'trip_id': str(trip_id), 'status': trip.status,
+                            'job': TripJobSerializer(job).data if job else None})]
+
+    return _live_response(request, [trip_channel(trip_id)], snapshot)
+
+
+@require_GET
+async def driver_live_view(request, driver_id):
+    """Server-sent events for a driver: HOS clocks now and after every recorded duty event, and the events."""
+    if not await Driver.objects.filter(pk=driver_id).aexists():
+        raise Http404("No Driver matches the given query.")
+
+    def snapshot():
+        now = timezone.now()
+        state, remaining = driver_clock(driver_id, now=now)
+        return [('clock', {'driver_id': driver_id, **clock_data(state, remaining, now)})]
+
+    return _live_response(request, [driver_channel(driver_id)], snapshot)
 
 
 @api_view(['GET'])
 def driver_stats_view(request, driver_id):
-    """Get driver statistics and compliance info"""
-    driver = get_object_or_404(Driver, id=driver_id)
-    
-    # Calculate current cycle hours (last 8 days)
-    eight_days_ago = timezone.now().date() - timedelta(days=8)
-    recent_logs = DailyLog.objects.filter(
-        driver=driver,
-        date__gte=eight_days_ago
+    """Get driver statistics and compliance info (?rule=70_8 or 60_7) in a single query"""
+    try:
+        window_days, max_cycle_hours = cycle_rule(request.query_params.get('rule', '70_8'))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Current cycle hours come from the per-day summary table: at most window_days indexed rows
+    window = cycle_window(window_days)
+    recent_trips = (
+        Trip.objects.filter(driver=OuterRef('pk'), created_at__date__gte=window[0])
+        .order_by().values('driver').annotate(count=Count('id')).values('count')
     )
-    
-    total_cycle_hours = sum(
-        log.total_driving_time + log.total_on_duty_time 
-        for log in recent_logs
+    driver = get_object_or_404(
+        Driver.objects.annotate(
+            driver_name=driver_name_expression(prefix=''),
+            current_cycle_hours=cycle_hours_subquery(window),
+            recent_trips=Coalesce(Subquery(recent_trips), 0),
+        ).values('driver_name', 'driver_number', 'current_cycle_hours', 'recent_trips'),
+        id=driver_id,
     )
-    
+
     # Calculate available hours
-    max_cycle_hours = 70  # 70-hour/8-day cycle
+    total_cycle_hours = round(driver['current_cycle_hours'], 2)
     available_hours = max_cycle_hours - total_cycle_hours
     
     stats = {
-        'driver_name': f"{driver.user.first_name} {driver.user.last_name}",
-        'driver_number': driver.driver_number,
+        'driver_name': driver['driver_name'],
+        'driver_number': driver['driver_number'],
+        'cycle_rule': f"{max_cycle_hours}/{window_days}",
         'current_cycle_hours': total_cycle_hours,
         'available_hours': max(0, available_hours),
         'compliance_status': 'compliant' if available_hours > 0 else 'violation',
-        'recent_trips': Trip.objects.filter(driver=driver).count()
+        'recent_trips': driver['recent_trips']
     }
     
-    return Response(stats)
\ No newline at end of file
+    return Response(stats)
+
+
+@api_view(['GET'])
+def driver_clock_view(request, driver_id):
+    """Hours left right now on each HOS clock (11-hour, 14-hour, 8-hour break, cycle) for a driver
+
+    Query params: rule (70_8 or 60_7), hours (optional: can the driver drive this many hours now?).
+    """
+    get_object_or_404(Driver.objects.only('pk'), pk=driver_id)
+    now = timezone.now()
+    try:
+        hours = float(request.query_params['hours']) if request.query_params.get('hours') else None
+        if hours is not None and not math.isfinite(hours):
+            raise ValueError("hours must be a finite number")
+        state, remaining = driver_clock(driver_id, request.query_params.get('rule', '70_8'), now)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = {
+        'driver_id': driver_id,
+        'rule': request.query_params.get('rule', '70_8'),
+        **clock_data(state, remaining, now),
+    }
+    if hours is not None:
+        data['requested_hours'] = hours
+        data['can_drive_requested_hours'] = remaining['available_driving'] >= hours
+    return Response(data)
+
+
+class FleetComplianceView(generics.ListAPIView):
+    """Cycle hours and daily HOS violations for every driver, aggregated in the database.
+
+    Query params: rule (70_8 or 60_7), days (violation lookback, at least the cycle window),
+    home_operation_center, status (compliant or violation).
+    """
+    serializer_class = FleetComplianceSerializer
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            lookback_days = int(params['days']) if params.get('days') else None
+            queryset = fleet_compliance_queryset(params.get('rule', '70_8'), lookback_days)
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+
+        if params.get('home_operation_center'):
+            queryset = queryset.filter(home_operation_center=params['home_operation_center'])
+        if params.get('status'):
+            queryset = queryset.filter(compliance_status=params['status'])
+        return queryset
+
+
+async def _async_chunks(chunks, per_hop):
+    """Pulls per_hop chunks at a time from a sync generator in the sync thread (it may read the database)."""
+    next_batch = sync_to_async(lambda: list(islice(chunks, per_hop)))
+    try:
+        while batch := await next_batch():
+            yield b''.join(batch)
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def _streaming_response(request, chunks, content_type, per_hop=1):
+    """A StreamingHttpResponse for a sync generator of byte chunks that streams under WSGI and ASGI.
+
+    Given a sync iterator, Django's ASGI handler reads the whole response into memory before
+    sending it, so ASGI requests get an async iterator over the same generator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks, per_hop)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+@require_safe
+def log_export_view(request):
+    """Stream daily logs with their duty events as CSV (one row per event) or NDJSON (one log per line)
+
+    Query params: output (csv or ndjson), driver (repeatable), home_operation_center, start and end dates.
+    A plain Django view, so clients asking for the file (Accept: text/csv) are not refused by DRF.
+    """
+    params = request.GET
+    output = params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    try:
+        driver_ids = [int(driver_id) for driver_id in params.getlist('driver')]
+        start, end = (parse_date(params[key]) if params.get(key) else None for key in ('start', 'end'))
+        if (params.get('start') and not start) or (params.get('end') and not end):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "driver must be an id and start/end dates YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    rows = export_rows(driver_ids, params.get('home_operation_center'), start, end)
+    response = _streaming_response(request, export_chunks(output, rows), EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="duty-status-export.{output}"'
+    return response
+
+
+@require_safe
+def eld_output_view(request, driver_id):
+    """Stream a driver's ELD output file (49 CFR 395 Subpart B) for roadside data transfer
+
+    Query params: start and end dates (default: today and the previous 7 days), comment. A plain
+    Django view, so clients asking for the file (Accept: text/csv) are not refused by DRF.
+    """
+    driver = get_object_or_404(Driver.objects.select_related('user'), pk=driver_id)
+    zone = ZoneInfo(settings.ELD_OUTPUT['CARRIER_TIME_ZONE'])
+    params = request.GET
+    try:
+        start, end = (parse_date(params[key]) if params.get(key) else default
+                      for key, default in zip(('start', 'end'), default_window(zone)))
+    except ValueError:
+        start = end = None
+    if not start or not end or start > end:
+        return JsonResponse({"error": "start and end must be dates YYYY-MM-DD, start first"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+    output = build_output_file(driver, start, end, params.get('comment', ''))
+    # Lines are short, so ASGI sends them a few hundred at a time
+    response = _streaming_response(request, (line.encode('ascii', 'replace') for line in output.write_lines()),
+                                   'text/csv', per_hop=500)
+    response['Content-Disposition'] = f'attachment; filename="{output.filename()}"'
+    return response
+
+
+def _grid_response(request, logs, filename):
+    """Render daily log sheets as SVG or PDF (?output=), answering 304 by content hash before drawing
+
+    The grid views are plain Django views: DRF content negotiation would answer a client asking
+    for the file it wants (Accept: application/pdf or image/svg+xml) with 406.
+    """
+    output = request.GET.get('output', 'pdf')
+    if output not in GRID_FORMATS:
+        return JsonResponse({"error": f"output must be one of: {', '.join(GRID_FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    sheets = grid_renderer.sheets(grid_logs(logs), output)
+    if not sheets:
+        return JsonResponse({"error": "No daily logs found"}, status=status.HTTP_404_NOT_FOUND)
+
+    etag = quote_etag(grid_renderer.digest(sheets))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(grid_renderer.render(sheets, output), content_type=GRID_FORMATS[output])
+        response['Content-Disposition'] = f'inline; filename="{filename}.{output}"'
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_safe
+def log_grid_view(request, daily_log_id):
+    """Render one daily log's graph grid sheet"""
+    return _grid_response(request, DailyLog.objects.filter(pk=daily_log_id), f'daily-log-{daily_log_id}')
+
+
+@require_safe
+def trip_grid_view(request, trip_id):
+    """Render every daily log sheet of a trip, one page each"""
+    get_object_or_404(Trip.objects.only('pk'), pk=trip_id)
+    return _grid_response(request, DailyLog.objects.filter(trip_id=trip_id), f'trip-{trip_id}-logs')
+
+
+@require_safe
+def driver_grid_view(request, driver_id):
+    """Render a driver's daily log sheets for a month (?month=YYYY-MM, default: current month)"""
+    get_object_or_404(Driver.objects.only('pk'), pk=driver_id)
+    month = request.GET.get('month') or timezone.localdate().strftime('%Y-%m')
+    try:
+        first_day = parse_date(f'{month}-01') if len(month) == 7 else None
+    except ValueError:
+        first_day = None
+    if first_day is None:
+        return JsonResponse({"error": "month must be YYYY-MM"}, status=status.HTTP_400_BAD_REQUEST)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    logs = DailyLog.objects.filter(driver_id=driver_id, date__gte=first_day, date__lt=next_month)
+    return _grid_response(request, logs, f'driver-{driver_id}-{month}-logs')
+
+
+@api_view(['GET'])
+def metrics_view(request):
+    """Expose in-process cache counters for this worker"""
+    return Response({
+        'geocoding': geocoding_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'ors': get_ors_guard().stats(),
+        'travel_matrix': travel_matrix.stats(),
+    })